@@ -2,7 +2,7 @@ from flask import Flask,  url_for, current_app
 from pathlib import Path
 from .database import db, login_manager
 from config import Settings
-from .models import seed_default_admin
+from .models import init_db
 
 def create_app():
     base_dir = Path(__file__).resolve().parent  # .../agromax-app/app
@@ -17,22 +17,35 @@ def create_app():
     db.init_app(app)
     login_manager.init_app(app)
 
+    from .cli import register_cli
+    register_cli(app)
+
+    from .utils.instrumentation import init_instrumentation
+    init_instrumentation(app)
+
     with app.app_context():
         from .routes.core.auth import core_auth_bp
         from .routes.core.main import core_main_bp
+        from .routes.core.metrics import core_metrics_bp
         from .routes.ruteo.endpoints import ruteo_bp
         from .routes.abm_locales.endpoints import abm_locales_bp
+        from .routes.tiles.endpoints import tiles_bp
+        from .routes.capas.endpoints import capas_bp
+        from .routes.jobs.endpoints import jobs_bp
 
         app.register_blueprint(core_auth_bp)
         app.register_blueprint(core_main_bp)
+        app.register_blueprint(core_metrics_bp)
         app.register_blueprint(ruteo_bp, url_prefix="/ruteo")
         app.register_blueprint(abm_locales_bp, url_prefix="/locales")
+        app.register_blueprint(tiles_bp, url_prefix="/tiles")
+        app.register_blueprint(capas_bp, url_prefix="/capas")
+        app.register_blueprint(jobs_bp, url_prefix="/jobs")
 
-        db.create_all()
-        seed_default_admin()
-
-        # Debug: ver dónde está buscando Jinja
-        print("[JINJA SEARCHPATH]", app.jinja_loader.searchpath)
+        # el esquema y el admin se crean una vez con `flask init-db` (release); crear la app
+        # no toca la base, así gunicorn --preload puede cargarla antes de hacer fork
+        if app.config["AUTO_INIT_DB"]:
+            init_db()
 
     @app.context_processor
     def jinja_helpers():
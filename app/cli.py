@@ -0,0 +1,183 @@
+"""Comandos de mantenimiento: `flask <comando>`."""
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, func, select, update
+from .database import db
+from .models import Local, Ruta, User, bump_data_version, init_db
+from .utils.ruteo.geo import geohash_encode_many, parse_bbox
+from .utils import areas, tiles
+from .utils.jobs import purge_expired
+from .utils.text import normalize_search
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+    """Crea las tablas que falten y el admin por defecto (una vez por deploy)."""
+    init_db()
+    click.echo("Base inicializada.")
+
+@click.command("usuario-empresa")
+@click.argument("email")
+@click.argument("empresa")
+@click.option("--plataforma/--no-plataforma", default=False,
+              help="Usuario de plataforma: trabaja sobre la empresa del host (EMPRESA queda como la suya).")
+@with_appcontext
+def usuario_empresa(email, empresa, plataforma):
+    """Asigna el usuario a una empresa y define si es usuario de plataforma."""
+    user = User.query.filter(func.lower(User.email) == email.strip().lower()).first()
+    if user is None:
+        raise click.ClickException(f"No existe el usuario {email}.")
+    user.company_slug = empresa
+    user.plataforma = plataforma
+    db.session.commit()
+    click.echo(f"{user.email}: {user.company_slug}" + (" (plataforma: empresa según el host)" if plataforma else ""))
+
+@click.command("locales-geohash")
+@click.option("--todos", is_flag=True, help="Recalcular también los que ya tienen geohash.")
+@with_appcontext
+def locales_geohash(todos):
+    """Completa la columna geohash de locales (vectorizado, en lotes)."""
+    q = select(Local.id, Local.lat, Local.lon)
+    if not todos:
+        q = q.where(Local.geohash.is_(None))
+    rows = db.session.execute(q).all()
+    if not rows:
+        click.echo("Nada para actualizar.")
+        return
+    ids, lats, lons = zip(*rows)
+    hashes = geohash_encode_many(lats, lons)
+    stmt = update(Local.__table__).where(Local.__table__.c.id == bindparam("b_id")).values(geohash=bindparam("b_gh"))
+    lote = 1000
+    for i in range(0, len(ids), lote):
+        db.session.execute(stmt, [
+            {"b_id": id_, "b_gh": str(gh)} for id_, gh in zip(ids[i:i + lote], hashes[i:i + lote])
+        ])
+    db.session.commit()
+    click.echo(f"{len(ids)} locales actualizados.")
+
+@click.command("locales-busqueda")
+@click.option("--todos", is_flag=True, help="Recalcular también los que ya tienen texto de búsqueda.")
+@with_appcontext
+def locales_busqueda(todos):
+    """Completa la columna de búsqueda (nombre + ciudad + id sin acentos) en lotes."""
+    q = select(Local.id, Local.name, Local.city)
+    if not todos:
+        q = q.where(Local.busqueda.is_(None))
+    rows = db.session.execute(q).all()
+    if not rows:
+        click.echo("Nada para actualizar.")
+        return
+    stmt = update(Local.__table__).where(Local.__table__.c.id == bindparam("b_id")).values(busqueda=bindparam("b_txt"))
+    lote = 1000
+    for i in range(0, len(rows), lote):
+        db.session.execute(stmt, [
+            {"b_id": id_, "b_txt": normalize_search(name, city, id_)} for id_, name, city in rows[i:i + lote]
+        ])
+    db.session.commit()
+    click.echo(f"{len(rows)} locales actualizados.")
+
+@click.command("locales-areas")
+@click.option("--todos", is_flag=True, help="Recalcular también los que ya tienen áreas asignadas.")
+@with_appcontext
+def locales_areas(todos):
+    """Asigna departamento/distrito/barrio a los locales (punto-en-polígono con STRtree)."""
+    niveles = areas.available_levels()
+    if not niveles:
+        raise click.ClickException("No hay capas de áreas en build/ (ver AREAS_ADMIN).")
+    click.echo("Capas: " + ", ".join(niveles))
+    q = select(Local.id, Local.company_slug, Local.lat, Local.lon)
+    if not todos:
+        q = q.where(Local.dpto_cod.is_(None))
+    rows = db.session.execute(q).all()
+    if not rows:
+        click.echo("Nada para actualizar.")
+        return
+    ids, companies, lats, lons = zip(*rows)
+    codes = areas.assign_areas(lats, lons)
+    stmt = (
+        update(Local.__table__).where(Local.__table__.c.id == bindparam("b_id"))
+        .values(dpto_cod=bindparam("b_dpto"), distrito_cod=bindparam("b_dist"), barrio_cod=bindparam("b_barrio"))
+    )
+    lote = 1000
+    for i in range(0, len(ids), lote):
+        db.session.execute(stmt, [
+            {"b_id": ids[j], "b_dpto": codes["dpto"][j], "b_dist": codes["distrito"][j],
+             "b_barrio": codes["barrio"][j]}
+            for j in range(i, min(i + lote, len(ids)))
+        ])
+    for company in set(companies):
+        bump_data_version(company)
+    db.session.commit()
+    sin = int(sum(c is None for c in codes["dpto"]))
+    click.echo(f"{len(ids)} locales actualizados ({sin} fuera de todo departamento).")
+
+@click.command("red-vial-build")
+@click.argument("pbf", type=click.Path(exists=True, dir_okay=False))
+@click.option("--salida", default=None, help="Archivo .npz (por defecto, Settings.RED_VIAL_ARCHIVO).")
+@with_appcontext
+def red_vial_build(pbf, salida):
+    """Arma el grafo de la red vial offline a partir de un extracto OSM (.osm.pbf)."""
+    import os
+    from pathlib import Path
+    import numpy as np
+    from config import Settings
+    from .utils.ruteo import roads
+
+    try:
+        ways = roads.read_osm(pbf)
+    except ImportError:
+        raise click.ClickException("Falta pyosmium: pip install osmium")
+    click.echo(f"{len(ways)} vías transitables")
+    arrays = roads.build_graph(ways)
+    if not len(arrays["lat"]):
+        raise click.ClickException("El extracto no tiene vías transitables.")
+
+    destino = Path(salida or Settings.RED_VIAL_ARCHIVO)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destino.with_name(destino.name + ".tmp.npz")
+    np.savez_compressed(tmp, **arrays)
+    os.replace(tmp, destino)  # los workers recargan al ver el archivo nuevo
+
+    # las métricas cacheadas se calcularon con la red anterior (o en línea recta)
+    db.session.execute(update(Ruta).values(metricas_version=None))
+    db.session.commit()
+    click.echo(f"{destino}: {len(arrays['lat'])} nodos, {len(arrays['indices'])} aristas.")
+
+@click.command("tiles-seed")
+@click.argument("capa")
+@click.option("--zmin", type=int, default=None, help="Zoom mínimo (por defecto, el de la capa).")
+@click.option("--zmax", type=int, default=None, help="Zoom máximo (por defecto, el de la capa).")
+@click.option("--bbox", default=None, help="min_lon,min_lat,max_lon,max_lat (por defecto, toda la capa).")
+@with_appcontext
+def tiles_seed(capa, zmin, zmax, bbox):
+    """Pre-genera los vector tiles de una capa en la caché de disco."""
+    layer = tiles.get_layer(capa)
+    if layer is None:
+        raise click.ClickException(f"Capa desconocida o sin archivo en build/: {capa}")
+    bounds = None
+    if bbox:
+        parsed = parse_bbox(bbox)
+        if parsed is None:
+            raise click.BadParameter("bbox inválido", param_hint="--bbox")
+        bounds = tiles.bbox_to_mercator(parsed)
+    zmin = layer.minzoom if zmin is None else zmin
+    zmax = layer.maxzoom if zmax is None else zmax
+    total = tiles.seed(layer, zmin, zmax, bounds,
+                       progress=lambda z, n: click.echo(f"  z{z}: {n} tiles con datos"))
+    click.echo(f"{capa}: {total} tiles generados.")
+
+@click.command("jobs-purge")
+@with_appcontext
+def jobs_purge():
+    """Borra los trabajos en segundo plano vencidos (fila y archivo) y cierra los colgados."""
+    click.echo(f"{purge_expired()} trabajos vencidos borrados.")
+
+def register_cli(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(usuario_empresa)
+    app.cli.add_command(locales_geohash)
+    app.cli.add_command(locales_busqueda)
+    app.cli.add_command(locales_areas)
+    app.cli.add_command(red_vial_build)
+    app.cli.add_command(tiles_seed)
+    app.cli.add_command(jobs_purge)
@@ -1,10 +1,57 @@
-from sqlalchemy import func
+from sqlalchemy import event, func, or_
+from config import Settings
+from .database import db
 from .models import User
+from .utils.cache import TTLCache
+
+# ---------- usuario de la sesión ----------
+# Flask-Login rehidrata el usuario en cada request; se cachea por worker (desacoplado de
+# la sesión SQLAlchemy) y se invalida al confirmar cambios del usuario en este worker.
+# En los demás workers el cambio se ve como mucho USER_CACHE_TTL_S segundos después.
+_users = TTLCache(maxsize=Settings.USER_CACHE_MAX, ttl=Settings.USER_CACHE_TTL_S)
+
+def get_session_user(user_id):
+    """Usuario activo por id (caché con TTL) o None."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    user = _users.get(user_id)
+    if user is None:
+        if db.session.identity_key(User, user_id) in db.session.identity_map:
+            # ya lo usa este request: no sacarlo de la sesión (perdería sus cambios)
+            user = db.session.get(User, user_id)
+            return user if user.is_active else None
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        db.session.expunge(user)  # los commits de otros requests no lo expiran
+        _users[user_id] = user
+    return user if user.is_active else None
+
+def invalidate_user(user_id):
+    _users.pop(int(user_id))
+
+@event.listens_for(db.session, "after_flush")
+def _users_touched(session, flush_context):
+    ids = session.info.setdefault("_users_invalidar", set())
+    ids.update(o.id for o in (*session.dirty, *session.deleted) if isinstance(o, User) and o.id is not None)
+
+@event.listens_for(db.session, "after_commit")
+def _invalidate_users(session):
+    for user_id in session.info.pop("_users_invalidar", ()):
+        invalidate_user(user_id)
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_users(session):
+    session.info.pop("_users_invalidar", None)
+
+# ---------- login ----------
 
 def load_user_by_email(email: str):
     if not email:
         return None
-    return User.query.filter(func.lower(User.email) == email.lower()).first()
+    return User.query.filter(func.lower(User.email) == email.strip().lower()).first()
 
 def load_user_by_username(username: str):
     if not username:
@@ -1,18 +1,42 @@
 from datetime import datetime
+from flask import g, has_request_context, request
 from flask_login import UserMixin
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
 from .database import db
+from .utils.ruteo.geo import geohash_encode
+from .utils.text import normalize_search
 from config import Settings
 
-# Multi-marca por company_slug (PROJECT_SLUG por defecto)
+# Multi-marca por company_slug: un mismo proceso atiende a todas las empresas
+def company_for_host(host: str | None):
+    """Empresa asignada al host (TENANT_HOSTS), o None."""
+    return Settings.TENANT_HOSTS.get((host or "").split(":")[0].lower())
+
 def current_company_slug():
-    return Settings.PROJECT_SLUG
+    """
+    Empresa del request: la del usuario logueado, salvo los usuarios de plataforma
+    (User.plataforma, opt-in explícito) y los anónimos, que usan la del host; si no,
+    PROJECT_SLUG. Fuera de un request (CLI, scripts), PROJECT_SLUG.
+    """
+    if not has_request_context():
+        return Settings.PROJECT_SLUG
+    if "company_slug" not in g:
+        from flask_login import current_user
+        if getattr(current_user, "is_authenticated", False) and not current_user.plataforma:
+            g.company_slug = current_user.company_slug or Settings.PROJECT_SLUG
+        else:
+            g.company_slug = company_for_host(request.host) or Settings.PROJECT_SLUG
+    return g.company_slug
 
 class User(UserMixin, db.Model):
     __tablename__ = "usuarios"
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
+    company_slug = db.Column(db.String(64), nullable=False, default=lambda: Settings.PROJECT_SLUG)
+    plataforma = db.Column(db.Boolean, nullable=False, default=False)  # True = empresa según el host
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -22,6 +46,13 @@ class User(UserMixin, db.Model):
     def check_password(self, raw: str) -> bool:
         return check_password_hash(self.password_hash, raw)
 
+    @property
+    def is_admin(self) -> bool:
+        return (self.email or "").lower() in Settings.ADMIN_EMAILS
+
+# login por email sin distinguir mayúsculas (core.load_user_by_login) usa este índice
+db.Index("idx_usuarios_email_lower", func.lower(User.email))
+
 class Depot(db.Model):
     __tablename__ = "centros_logisticos"
     id = db.Column(db.Integer, primary_key=True)
@@ -34,7 +65,8 @@ class Depot(db.Model):
 class Local(db.Model):
     __tablename__ = "locales"
     id = db.Column(db.String(64), primary_key=True)  # admite códigos/strings
-    company_slug = db.Column(db.String(64), index=True, nullable=False, default=current_company_slug)
+    # sin índice propio: todos los índices compuestos de locales empiezan por company_slug
+    company_slug = db.Column(db.String(64), nullable=False, default=current_company_slug)
     name = db.Column(db.String(255), nullable=False)
     city = db.Column(db.String(120))
     lat = db.Column(db.Float, nullable=False)
@@ -43,35 +75,181 @@ class Local(db.Model):
     venta_por_dia = db.Column(db.Numeric(14,2))
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    geohash = db.Column(db.String(12))  # índice espacial (consultas por bbox / clusters)
+    busqueda = db.Column(db.String(400))  # nombre + ciudad + id sin acentos, en minúsculas
+    # áreas administrativas INE (flask locales-areas / al crear o mover el local)
+    dpto_cod = db.Column(db.String(16))
+    distrito_cod = db.Column(db.String(16))
+    barrio_cod = db.Column(db.String(24))
+    territorio = db.Column(db.Integer)  # número de Territorio (particiones balanceadas)
+
+    __table_args__ = (
+        # locales activos de la empresa por id (mapa, árbol de cercanos, planificador)
+        db.Index("idx_locales_company_active_id", "company_slug", "active", "id"),
+        db.Index("idx_locales_company_geohash", "company_slug", "geohash"),
+        db.Index("idx_locales_company_busqueda", "company_slug", "busqueda"),
+        # orden del listado paginado (keyset: columna + id)
+        db.Index("idx_locales_company_name_id", "company_slug", "name", "id"),
+        db.Index("idx_locales_company_rank_id", "company_slug", "rank", "id"),
+        db.Index("idx_locales_company_venta_id", "company_slug", "venta_por_dia", "id"),
+        db.Index("idx_locales_company_dpto", "company_slug", "dpto_cod"),
+        db.Index("idx_locales_company_distrito", "company_slug", "distrito_cod"),
+        db.Index("idx_locales_company_barrio", "company_slug", "barrio_cod"),
+        db.Index("idx_locales_company_territorio", "company_slug", "territorio"),
+    )
+
+@event.listens_for(Local, "before_insert")
+@event.listens_for(Local, "before_update")
+def _set_local_geohash(mapper, connection, target):
+    target.geohash = geohash_encode(target.lat, target.lon)
+    target.busqueda = normalize_search(target.name, target.city, target.id)
 
 class Ruta(db.Model):
     __tablename__ = "rutas"
     id = db.Column(db.Integer, primary_key=True)
-    company_slug = db.Column(db.String(64), index=True, nullable=False, default=current_company_slug)
+    company_slug = db.Column(db.String(64), nullable=False, default=current_company_slug)
     fecha = db.Column(db.Date, nullable=False)
     turno = db.Column(db.String(2), nullable=False)  # 'AM' | 'PM'
     cerrado = db.Column(db.Boolean, default=False)
     depot_id = db.Column(db.Integer, db.ForeignKey("centros_logisticos.id"))
     creado_por = db.Column(db.Integer, db.ForeignKey("usuarios.id"))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # se incrementa en cada escritura de la ruta (utils/ruteo/edits.py): control optimista
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    # métricas cacheadas (utils/ruteo/metrics.py); válidas mientras metricas_version sea
+    # la versión de datos de la empresa. None = hay que recalcular.
+    metricas_km = db.Column(db.Float)
+    metricas_paradas = db.Column(db.Integer)
+    metricas_venta = db.Column(db.Numeric(16,2))
+    metricas_version = db.Column(db.Integer)
 
     detalles = db.relationship("RutaDetalle", backref="ruta", cascade="all,delete-orphan", order_by="RutaDetalle.orden")
 
+    __table_args__ = (
+        # rango de fechas de la empresa y ruta de un (fecha, turno)
+        db.Index("idx_rutas_company_fecha_turno", "company_slug", "fecha", "turno"),
+    )
+
 class RutaDetalle(db.Model):
     __tablename__ = "rutas_detalles"
     id = db.Column(db.Integer, primary_key=True)
+    # copia de rutas.company_slug: las consultas por empresa no necesitan pasar por rutas
+    company_slug = db.Column(db.String(64), nullable=False, default=current_company_slug)
     ruta_id = db.Column(db.Integer, db.ForeignKey("rutas.id", ondelete="CASCADE"))
     orden = db.Column(db.Integer, nullable=False)  # 1..N
     local_id = db.Column(db.String(64), db.ForeignKey("locales.id"))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index("idx_rutas_detalles_company_ruta", "company_slug", "ruta_id", "orden"),
+        db.Index("idx_rutas_detalles_company_local", "company_slug", "local_id"),
+    )
+
+class Territorio(db.Model):
+    """Territorio de reparto: centroide y criterio de la última partición de la empresa."""
+    __tablename__ = "territorios"
+    id = db.Column(db.Integer, primary_key=True)
+    company_slug = db.Column(db.String(64), nullable=False, default=current_company_slug)
+    numero = db.Column(db.Integer, nullable=False)  # 1..K (= Local.territorio)
+    lat = db.Column(db.Float, nullable=False)
+    lon = db.Column(db.Float, nullable=False)
+    criterio = db.Column(db.String(16), nullable=False, default="paradas")  # 'paradas' | 'venta'
+    capacidad = db.Column(db.Float)  # tope de paradas o de venta por territorio
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("company_slug", "numero", name="uq_territorios_company_numero"),
+    )
+
+class Job(db.Model):
+    """Trabajo en segundo plano (utils/jobs.py): estado, progreso y resultado."""
+    __tablename__ = "jobs"
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    company_slug = db.Column(db.String(64), nullable=False, default=current_company_slug)
+    tipo = db.Column(db.String(32), nullable=False)
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    estado = db.Column(db.String(16), nullable=False, default="pendiente")  # pendiente | corriendo | listo | error
+    progreso = db.Column(db.Float, nullable=False, default=0.0)  # 0..1
+    mensaje = db.Column(db.String(255))
+    resultado = db.Column(db.JSON)            # respuesta JSON (chica) del trabajo
+    archivo = db.Column(db.String(512))       # archivo de resultado en JOBS_DIR
+    nombre_archivo = db.Column(db.String(255))
+    mimetype = db.Column(db.String(128))
+    creado_por = db.Column(db.Integer, db.ForeignKey("usuarios.id"))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)       # después se borran la fila y el archivo
+
+    __table_args__ = (
+        # trabajos activos por empresa (tope) y vencidos (limpieza)
+        db.Index("idx_jobs_company_estado", "company_slug", "estado"),
+        db.Index("idx_jobs_expires", "expires_at"),
+    )
+
+class DataVersion(db.Model):
+    """Versión de datos por empresa: cambia con cada alta/baja/modificación de Local o Depot."""
+    __tablename__ = "versiones_datos"
+    company_slug = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+def get_data_version(company_slug: str) -> int:
+    v = db.session.execute(
+        select(DataVersion.version).where(DataVersion.company_slug == company_slug)
+    ).scalar()
+    return v or 0
+
+def bump_data_version(company_slug: str, connection=None):
+    """
+    Incrementa la versión de la empresa. Para escrituras masivas (Core/bulk) que no
+    pasan por el ORM hay que llamarla explícitamente antes del commit.
+    """
+    conn = connection if connection is not None else db.session.connection()
+    res = conn.execute(
+        update(DataVersion)
+        .where(DataVersion.company_slug == company_slug)
+        .values(version=DataVersion.version + 1, updated_at=datetime.utcnow())
+    )
+    if res.rowcount == 0:
+        try:
+            with conn.begin_nested():
+                conn.execute(insert(DataVersion).values(company_slug=company_slug, version=1,
+                                                        updated_at=datetime.utcnow()))
+        except IntegrityError:
+            bump_data_version(company_slug, conn)
+
+_VERSIONED = (Local, Depot)
+
+@event.listens_for(db.session, "after_flush")
+def _bump_versions_on_flush(session, flush_context):
+    companies = {
+        obj.company_slug
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, _VERSIONED) and obj.company_slug
+        and (obj in session.new or obj in session.deleted or session.is_modified(obj))
+    }
+    conn = session.connection()
+    for company in companies:
+        bump_data_version(company, conn)
+
 def seed_default_admin():
     from .database import db
     from flask import current_app
     email = Settings.DEFAULT_ADMIN_EMAIL
     pwd = Settings.DEFAULT_ADMIN_PASSWORD
     if not User.query.filter_by(email=email).first():
-        u = User(email=email)
+        u = User(email=email, company_slug=Settings.PROJECT_SLUG)
         u.set_password(pwd)
         db.session.add(u)
         db.session.commit()
+
+def init_db():
+    """Crea las tablas que falten y el admin por defecto (flask init-db)."""
+    from .database import db
+    db.create_all()
+    # usuarios de antes del multi-tenant: quedan en la empresa del deploy, no de plataforma
+    db.session.execute(update(User).where(User.company_slug.is_(None)).values(company_slug=Settings.PROJECT_SLUG))
+    db.session.commit()
+    seed_default_admin()
@@ -1,11 +1,18 @@
 from decimal import Decimal, InvalidOperation
-from flask import render_template, request, redirect, url_for, flash
+from flask import abort, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required
-from sqlalchemy import func
+from sqlalchemy import func, select
 from sqlalchemy.exc import IntegrityError
 from . import abm_locales_bp
 from ...database import db
-from ...models import Local, Depot
+from ...models import Local, Depot, current_company_slug
+from ...utils.abm_locales.importer import ArchivoInvalido, normalize, read_table, upsert
+from ...utils.areas import set_local_areas
+from ...utils.capas import map_layer_urls
+from ...utils.pagination import decode_cursor, encode_cursor, keyset_after, keyset_order
+from ...utils.ruteo.matrix import refresh_local, drop_local
+from ...utils.ruteo.territories import assign_pending
+from ...utils.text import normalize_search
 from config import Settings
 import re
 
@@ -23,11 +30,11 @@ def _slugify(s: str) -> str:
 
 def _unique_local_id(base_name: str) -> str:
     """
-    Genera un ID único con prefijo del proyecto (Settings.PROJECT_SLUG) en minúsculas,
+    Genera un ID único con prefijo de la empresa (current_company_slug) en minúsculas,
     más el nombre slugificado. Ej: "<tenant>_<nombre_local>", con sufijos -1, -2 si choca.
     """
     # slug del proyecto, en minúsculas y saneado (sin espacios/acentos/símbolos)
-    proj = _slugify((Settings.PROJECT_SLUG or "").lower()) or "tenant"
+    proj = _slugify((current_company_slug() or "").lower()) or "tenant"
 
     # slug del nombre del local
     name_slug = _slugify(base_name)
@@ -42,6 +49,13 @@ def _unique_local_id(base_name: str) -> str:
         i += 1
     return candidate
 
+def _local_or_404(id) -> Local:
+    """Local de la empresa del request (los de otras empresas dan 404)."""
+    item = db.session.get(Local, id)
+    if item is None or item.company_slug != current_company_slug():
+        abort(404)
+    return item
+
 def _to_float(v, default=None):
     try:
         return float(str(v).replace(",", "."))
@@ -64,18 +78,65 @@ def _to_decimal(v, default=Decimal("0")):
     
 # ---------- Rutas ----------
 
+ORDENES = {"nombre": Local.name, "rank": Local.rank, "venta": Local.venta_por_dia}
+
+def _cursor_value(item, orden):
+    v = getattr(item, ORDENES[orden].key)
+    return float(v) if isinstance(v, Decimal) else v
+
 @abm_locales_bp.route("/")
 @login_required
 def list_locales():
-    q = Local.query.filter_by(company_slug=Settings.PROJECT_SLUG).order_by(Local.name.asc())
-    items = q.all()
-    return render_template("abm_locales/list.html", items=items)
+    """
+    Listado paginado por keyset. Parámetros: q (busca en nombre/ciudad/id, sin acentos),
+    orden (nombre|rank|venta), dir (asc|desc), despues / antes (cursor de página).
+    """
+    q_txt = (request.args.get("q") or "").strip()
+    orden = request.args.get("orden") if request.args.get("orden") in ORDENES else "nombre"
+    desc = request.args.get("dir") == "desc"
+    col = ORDENES[orden]
+    por_pagina = Settings.LOCALES_POR_PAGINA
+
+    filtros = [Local.company_slug == current_company_slug()]
+    for term in normalize_search(q_txt).split():
+        term = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        filtros.append(Local.busqueda.like(f"%{term}%", escape="\\"))
+
+    despues = decode_cursor(request.args.get("despues"))
+    antes = None if despues else decode_cursor(request.args.get("antes"))
+    cursor = despues or antes
+    stmt = select(Local).where(*filtros)
+    if cursor and len(cursor) == 2:
+        stmt = stmt.where(keyset_after(col, Local.id, cursor[0], cursor[1], desc, reverse=bool(antes)))
+    stmt = stmt.order_by(*keyset_order(col, Local.id, desc, reverse=bool(antes))).limit(por_pagina + 1)
+    items = db.session.execute(stmt).scalars().all()
+
+    hay_mas = len(items) > por_pagina
+    items = items[:por_pagina]
+    if antes:
+        items.reverse()
+    hay_siguiente = hay_mas if not antes else True
+    hay_anterior = bool(despues) or (bool(antes) and hay_mas)
+
+    total = db.session.execute(select(func.count()).select_from(Local).where(*filtros)).scalar()
+    base = {"q": q_txt or None, "orden": orden, "dir": "desc" if desc else "asc"}
+    return render_template(
+        "abm_locales/list.html",
+        items=items,
+        total=total,
+        q=q_txt,
+        orden=orden,
+        desc=desc,
+        base_args=base,
+        siguiente=encode_cursor(_cursor_value(items[-1], orden), items[-1].id) if items and hay_siguiente else None,
+        anterior=encode_cursor(_cursor_value(items[0], orden), items[0].id) if items and hay_anterior else None,
+    )
 
 @abm_locales_bp.route("/nuevo", methods=["GET", "POST"])
 @login_required
 def nuevo():
     # rank sugerido
-    max_rank = db.session.query(func.max(Local.rank)).scalar() or 0
+    max_rank = db.session.query(func.max(Local.rank)).filter(Local.company_slug == current_company_slug()).scalar() or 0
     next_rank = max_rank + 1
 
     if request.method == "POST":
@@ -111,8 +172,12 @@ def nuevo():
                 venta_por_dia=venta_por_dia,
                 active=True,
             )
+            set_local_areas(l)
             db.session.add(l)
+            db.session.flush()
+            assign_pending(l.company_slug)
             db.session.commit()
+            refresh_local(l)
             flash("Local creado correctamente.", "success")
             return redirect(url_for("abm_locales.list_locales"))
         except IntegrityError:
@@ -124,19 +189,19 @@ def nuevo():
             return render_template("abm_locales/edit.html", item=temp_item, next_rank=next_rank)
     
     # GET
-    depot = Depot.query.filter_by(company_slug=Settings.PROJECT_SLUG, active=True).first()
+    depot = Depot.query.filter_by(company_slug=current_company_slug(), active=True).first()
     return render_template(
         "abm_locales/edit.html",
         item=None,
         next_rank=next_rank,
         depot={"name": depot.name, "lat": float(depot.lat), "lon": float(depot.lon)} if depot else None,
-        layer_urls=Settings.SUPABASE_ASSETS,
+        layer_urls=map_layer_urls(),
     )
 
 @abm_locales_bp.route("/editar/<id>", methods=["GET", "POST"])
 @login_required
 def editar(id):
-    item = Local.query.get_or_404(id)
+    item = _local_or_404(id)
 
     if request.method == "POST":
         name = (request.form.get("name") or "").strip()
@@ -159,6 +224,7 @@ def editar(id):
             item.active = active
             return render_template("abm_locales/edit.html", item=item)
 
+        movido = (lat, lon) != (item.lat, item.lon)
         item.name = name
         item.city = city
         item.lat = lat
@@ -166,25 +232,80 @@ def editar(id):
         item.rank = rank
         item.venta_por_dia = venta_por_dia
         item.active = active
+        if movido or item.dpto_cod is None:
+            set_local_areas(item)
 
         db.session.commit()
+        refresh_local(item)
         flash("Local actualizado.", "success")
         return redirect(url_for("abm_locales.list_locales"))
 
-    depot = Depot.query.filter_by(company_slug=Settings.PROJECT_SLUG, active=True).first()
+    depot = Depot.query.filter_by(company_slug=current_company_slug(), active=True).first()
     return render_template(
         "abm_locales/edit.html",
         item=item,
         next_rank=item.rank,
         depot={"name": depot.name, "lat": float(depot.lat), "lon": float(depot.lon)} if depot else None,
-        layer_urls=Settings.SUPABASE_ASSETS,
+        layer_urls=map_layer_urls(),
     )
 
 @abm_locales_bp.route("/eliminar/<id>", methods=["POST"])
 @login_required
 def eliminar(id):
-    item = Local.query.get_or_404(id)
+    item = _local_or_404(id)
+    company = item.company_slug
     db.session.delete(item)
     db.session.commit()
+    drop_local(company, id)
     flash("Local eliminado.", "success")
     return redirect(url_for("abm_locales.list_locales"))
+
+@abm_locales_bp.route("/importar", methods=["GET", "POST"])
+@login_required
+def importar():
+    """
+    Alta/actualización masiva desde CSV o XLSX (columnas: id opcional, nombre, ciudad,
+    lat, lon, rank, venta_por_dia, activo). Con "validar" sólo se revisa el archivo.
+    Responde JSON si se pide con ?formato=json.
+    """
+    quiere_json = request.args.get("formato") == "json"
+    if request.method == "GET":
+        return render_template("abm_locales/importar.html", reporte=None)
+
+    archivo = request.files.get("archivo")
+    solo_validar = bool(request.form.get("validar"))
+    company = current_company_slug()
+    try:
+        if archivo is None or not archivo.filename:
+            raise ArchivoInvalido("Seleccioná un archivo .csv o .xlsx")
+        df = read_table(archivo.stream, archivo.filename, Settings.IMPORT_MAX_FILAS)
+        max_rank = db.session.query(func.max(Local.rank)).filter(Local.company_slug == company).scalar() or 0
+        validas, errores = normalize(df, company, max_rank + 1)
+        prefijo = _slugify(company.lower()) or "tenant"
+        res = upsert(validas, errores, company, prefijo, columnas=set(df.columns),
+                     guardar=not solo_validar)
+        if solo_validar:
+            db.session.rollback()
+        else:
+            assign_pending(company)
+            db.session.commit()
+    except ArchivoInvalido as e:
+        db.session.rollback()
+        if quiere_json:
+            return jsonify({"ok": False, "error": str(e)}), 400
+        flash(str(e), "danger")
+        return render_template("abm_locales/importar.html", reporte=None), 400
+
+    reporte = {
+        "ok": True,
+        "validado": solo_validar,
+        "filas": int(len(df)),
+        "insertados": res["insertados"],
+        "actualizados": res["actualizados"],
+        "errores": [{"fila": f, "errores": msgs} for f, msgs in sorted(errores.items())],
+    }
+    if quiere_json:
+        return jsonify(reporte)
+    if not solo_validar and not errores:
+        flash(f"Importación completa: {res['insertados']} nuevos, {res['actualizados']} actualizados.", "success")
+    return render_template("abm_locales/importar.html", reporte=reporte)
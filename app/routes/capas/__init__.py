@@ -0,0 +1,2 @@
+from flask import Blueprint
+capas_bp = Blueprint("capas", __name__)
@@ -0,0 +1,45 @@
+from flask import abort, jsonify, request, send_file
+from flask_login import login_required
+from . import capas_bp
+from ...utils.capas import FORMATOS, capa_path, content_hash, layer_index
+
+INMUTABLE = "private, max-age=31536000, immutable"
+
+def _gz_vigente(p, gz) -> bool:
+    try:
+        return gz.stat().st_mtime_ns >= p.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+@capas_bp.route("/")
+@login_required
+def indice():
+    """{capa: {formato: url}} de los archivos de capas disponibles (fgb, parquet, topo.json, geojson)."""
+    return jsonify({"ok": True, "capas": layer_index()})
+
+@capas_bp.route("/<capa>/<archivo>")
+@login_required
+def archivo(capa, archivo):
+    """
+    /capas/<capa>/<hash>.<formato>: archivo de build/ con soporte de Range (lectura por
+    partes de FlatGeobuf/GeoParquet) y caché inmutable. Un hash viejo da 404.
+    """
+    hash_, _, formato = archivo.partition(".")
+    p = capa_path(capa, formato)
+    if p is None or content_hash(p) != hash_:
+        abort(404)
+
+    mimetype = FORMATOS[formato][1]
+    # GeoJSON/TopoJSON: el .gz del build si el cliente lo acepta (sin Range: se piden enteros).
+    # Sólo si no es anterior al archivo: uno viejo no corresponde al hash de la URL
+    gz = p.with_name(p.name + ".gz")
+    if (formato in ("geojson", "topo.json") and "Range" not in request.headers and _gz_vigente(p, gz)
+            and request.accept_encodings["gzip"]):
+        resp = send_file(gz, mimetype=mimetype, conditional=True, etag=f"{hash_}-gz")
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = send_file(p, mimetype=mimetype, conditional=True, etag=hash_)
+    resp.headers["Cache-Control"] = INMUTABLE
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Accept-Ranges"] = "bytes"
+    return resp
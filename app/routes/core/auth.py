@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user
-from ...core import load_user_by_login 
+from ...core import load_user_by_login
+from ...models import company_for_host
 
 core_auth_bp = Blueprint("core_auth", __name__, template_folder="../../templates/core")
 
@@ -12,6 +13,10 @@ def login():
         remember = bool(request.form.get("remember"))
 
         user = load_user_by_login(login_str)
+        # un usuario de empresa (todos salvo los de plataforma) no entra por el host de otra
+        host_company = company_for_host(request.host)
+        if user and not user.plataforma and host_company and user.company_slug != host_company:
+            user = None
         if user and user.check_password(password):
             login_user(user, remember=remember)
             return redirect(url_for("core_main.landing"))
@@ -0,0 +1,30 @@
+import hmac
+from flask import Blueprint, Response, abort, request
+from flask_login import current_user
+from config import Settings
+from ...utils.instrumentation import perfiles, render_prometheus
+
+core_metrics_bp = Blueprint("core_metrics", __name__)
+
+def _es_admin() -> bool:
+    return bool(current_user.is_authenticated and current_user.is_admin)
+
+@core_metrics_bp.route("/metrics")
+def metrics():
+    """Métricas del worker en texto Prometheus (Bearer METRICS_TOKEN o sesión de admin)."""
+    token = Settings.METRICS_TOKEN
+    auth = request.headers.get("Authorization", "")
+    if not ((token and hmac.compare_digest(auth, f"Bearer {token}")) or _es_admin()):
+        abort(403)
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@core_metrics_bp.route("/metrics/perfiles/<pid>")
+def perfil(pid):
+    """Stacks muestreados de un request con X-Profile: 1 (formato collapsed)."""
+    if not _es_admin():
+        abort(403)
+    texto = perfiles.get(pid)
+    if texto is None:
+        abort(404)
+    return Response(texto, mimetype="text/plain",
+                    headers={"Content-Disposition": f'inline; filename="perfil-{pid}.txt"'})
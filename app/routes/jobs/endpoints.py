@@ -0,0 +1,83 @@
+from pathlib import Path
+from flask import jsonify, request, send_file
+from flask_login import current_user, login_required
+from sqlalchemy import select
+from . import jobs_bp
+from ...database import db
+from ...models import Job, current_company_slug
+from ...utils.jobs import TAREAS, LimiteTrabajos, enqueue, job_status
+
+def encolar(tipo: str, params: dict):
+    """Valida y encola `tipo` para la empresa del request: 202 con el estado, 400 o 429."""
+    if not isinstance(params, dict):
+        return jsonify({"ok": False, "error": "Los parámetros deben ser un objeto JSON"}), 400
+    _, validar = TAREAS[tipo]
+    try:
+        params = validar(params)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    try:
+        job = enqueue(current_company_slug(), tipo, params, creado_por=current_user.id)
+    except LimiteTrabajos as e:
+        return jsonify({"ok": False, "error": str(e)}), 429, {"Retry-After": "10"}
+    estado = job_status(job)
+    return jsonify({"ok": True, "job_id": job.id, **estado}), 202, {"Location": estado["estado_url"]}
+
+def _job_de_empresa(job_id: str) -> Job | None:
+    """El trabajo si es de la empresa del request (los de otra empresa no existen)."""
+    job = db.session.get(Job, job_id)
+    if job is None or job.company_slug != current_company_slug():
+        return None
+    return job
+
+@jobs_bp.route("/", methods=["GET"])
+@login_required
+def listado():
+    """Últimos trabajos de la empresa (?estado=pendiente|corriendo|listo|error)."""
+    q = select(Job).where(Job.company_slug == current_company_slug())
+    if request.args.get("estado"):
+        q = q.where(Job.estado == request.args["estado"])
+    jobs = db.session.execute(q.order_by(Job.created_at.desc()).limit(50)).scalars()
+    return jsonify({"ok": True, "jobs": [job_status(j) for j in jobs]})
+
+@jobs_bp.route("/", methods=["POST"])
+@login_required
+def crear():
+    """
+    Encola un trabajo. Espera JSON: {"tipo": "exportar"|"planificar-semana"|..., "params": {...}}
+    Responde 202 con el id y la URL de estado; 429 si la empresa ya está al tope.
+    """
+    data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return jsonify({"ok": False, "error": "Se espera un objeto JSON"}), 400
+    tipo = data.get("tipo")
+    if tipo not in TAREAS:
+        return jsonify({"ok": False, "error": f"Tipo inválido: {tipo}", "tipos": sorted(TAREAS)}), 400
+    return encolar(tipo, data.get("params") or {})
+
+@jobs_bp.route("/<job_id>", methods=["GET"])
+@login_required
+def estado(job_id):
+    """Estado y progreso (0..1) del trabajo; con estado "listo", resultado_url."""
+    job = _job_de_empresa(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Trabajo inexistente"}), 404
+    return jsonify({"ok": True, **job_status(job)}), 200, {"Cache-Control": "no-store"}
+
+@jobs_bp.route("/<job_id>/resultado", methods=["GET"])
+@login_required
+def resultado(job_id):
+    """El archivo del trabajo (descarga) o su resultado JSON. 409 si no terminó, 410 si venció."""
+    job = _job_de_empresa(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Trabajo inexistente"}), 404
+    if job.estado != "listo":
+        return jsonify({"ok": False, "error": job.mensaje or "El trabajo no terminó", **job_status(job)}), 409
+    if job.archivo:
+        if not Path(job.archivo).exists():
+            return jsonify({"ok": False, "error": "El resultado venció"}), 410
+        resp = send_file(job.archivo, mimetype=job.mimetype, as_attachment=True,
+                         download_name=job.nombre_archivo, conditional=True)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+    return jsonify({"ok": True, "resultado": job.resultado})
@@ -1,49 +1,267 @@
-from datetime import date, timedelta
-from flask import jsonify, render_template, request, send_file
+from datetime import date
+from pathlib import Path
+import numpy as np
+from flask import jsonify, render_template, request
 from flask_login import login_required, current_user
-from sqlalchemy import select
+from sqlalchemy import and_, func, or_, select
 from . import ruteo_bp
 from ...database import db
-from ...models import Depot, Local, Ruta, RutaDetalle
-from ...utils.ruteo.excel import build_excel_bytes
+from ...models import Depot, Local, Ruta, RutaDetalle, current_company_slug, get_data_version
+from ...utils.cache import TenantCache
+from ...utils.capas import fgb_urls, map_layer_urls
+from ..jobs.endpoints import encolar
+from ..tiles.endpoints import tile_url_templates
+from ...utils.http import cached_response, dumps, strong_etag
+from ...utils.ruteo.edits import (OperacionInvalida, apply_ops, bump_version, load_stops, match_stops,
+                                  replace_week, write_stops)
+from ...utils.ruteo.geo import bbox_ranges, cluster_precision, parse_bbox
+from ...utils.ruteo.matrix import route_matrix
+from ...utils.ruteo.metrics import refresh_metrics, route_metrics, summarize
+from ...utils.ruteo.nearby import get_store_tree
+from ...utils.ruteo.optimizer import optimize_order, path_length
+from ...utils.ruteo.planner import TURNOS, week_days
+from ...utils.ruteo.roads import get_road_graph
+from ...utils.ruteo import tareas  # registra los trabajos exportar y planificar-semana
+from ...utils.ruteo.territories import CRITERIOS, assign_pending, build_territories, territory_summary
 from config import Settings
 
-def week_days(d=None):
-    d = d or date.today()
-    # Lunes a Sábado (como tu UI)
-    monday = d - timedelta(days=(d.weekday() % 7))
-    days = [monday + timedelta(days=i) for i in range(6)]
-    out = {}
-    for di in days:
-        out[di.isoformat()] = {"weekday": ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"][di.weekday()]}
-    return out
-
 @ruteo_bp.route("/mapa")
 @login_required
 def mapa():
     return render_template(
         "ruteo/mapa.html", 
         project_name=Settings.PROJECT_NAME, 
-        layer_urls=Settings.SUPABASE_ASSETS,
+        layer_urls=map_layer_urls(),
+        tile_urls=tile_url_templates(),
+        fgb_urls=fgb_urls(),
+        red_vial=Settings.RED_VIAL_USAR and Path(Settings.RED_VIAL_ARCHIVO).exists(),
+    )
+
+_map_data_cache = TenantCache(Settings.MAP_DATA_CACHE_POR_EMPRESA, Settings.TENANT_CACHE_MAX)
+
+def _bbox_filter(bbox):
+    """Condición sobre el índice (company_slug, geohash) + recorte exacto por lat/lon."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    rangos = or_(*[and_(Local.geohash >= desde, Local.geohash < hasta) for desde, hasta in bbox_ranges(bbox)])
+    return and_(rangos, Local.lat.between(min_lat, max_lat), Local.lon.between(min_lon, max_lon))
+
+AREA_COLS = {"dpto": Local.dpto_cod, "distrito": Local.distrito_cod, "barrio": Local.barrio_cod,
+             "territorio": Local.territorio}
+
+def _area_args() -> dict:
+    """{filtro: valor} desde ?dpto=&distrito=&barrio=&territorio= (columnas indexadas)."""
+    out = {k: request.args[k] for k in ("dpto", "distrito", "barrio") if request.args.get(k)}
+    territorio = request.args.get("territorio", type=int)
+    if territorio is not None:
+        out["territorio"] = territorio
+    return out
+
+def _area_filter(areas: dict | None) -> list:
+    return [AREA_COLS[k] == v for k, v in (areas or {}).items()]
+
+def _stores_columns(company: str, bbox=None, areas=None) -> dict:
+    q = (
+        select(Local.id, Local.name, Local.city, Local.lat, Local.lon, Local.rank, Local.venta_por_dia,
+               Local.dpto_cod, Local.distrito_cod, Local.barrio_cod, Local.territorio)
+        .where(Local.company_slug == company, Local.active.is_(True), *_area_filter(areas))
+    )
+    if bbox:
+        q = q.where(_bbox_filter(bbox))
+    rows = db.session.execute(q).all()
+    ids, names, cities, lats, lons, ranks, ventas, dptos, dists, barrios, territorios = (
+        (list(c) for c in zip(*rows)) if rows else ([],) * 11
+    )
+    return {
+        "id": ids, "name": names, "city": cities,
+        "lat": [float(x) for x in lats], "lon": [float(x) for x in lons],
+        "rank": ranks, "venta_por_dia": [float(x or 0) for x in ventas],
+        "dpto": dptos, "distrito": dists, "barrio": barrios, "territorio": territorios,
+    }
+
+def _store_clusters(company: str, bbox, zoom: int, areas=None) -> dict:
+    """Agrupa por prefijo de geohash (según zoom): cantidad, centroide y venta sumada."""
+    celda = func.substr(Local.geohash, 1, cluster_precision(zoom))
+    q = (
+        select(celda, func.count(), func.avg(Local.lat), func.avg(Local.lon), func.sum(Local.venta_por_dia))
+        .where(Local.company_slug == company, Local.active.is_(True), *_area_filter(areas))
+        .group_by(celda)
     )
+    if bbox:
+        q = q.where(_bbox_filter(bbox))
+    rows = db.session.execute(q).all()
+    celdas, cant, lats, lons, ventas = (list(c) for c in zip(*rows)) if rows else ([],) * 5
+    return {
+        "celda": celdas, "n": cant,
+        "lat": [float(x) for x in lats], "lon": [float(x) for x in lons],
+        "venta_por_dia": [float(x or 0) for x in ventas],
+    }
+
+def _viewport_args():
+    """(bbox, zoom, agrupar) desde ?bbox=min_lon,min_lat,max_lon,max_lat&zoom=Z."""
+    bbox = parse_bbox(request.args.get("bbox"))
+    zoom = request.args.get("zoom", type=int)
+    agrupar = bbox is not None and zoom is not None and zoom < Settings.STORES_CLUSTER_ZOOM
+    return bbox, zoom, agrupar
+
+def _map_data_payload(company: str, columnar: bool, bbox=None, zoom=None, agrupar=False, areas=None) -> bytes:
+    depot = Depot.query.filter_by(company_slug=company, active=True).first()
+    resp = {
+        "depot": ({"id": depot.id, "name": depot.name, "lat": depot.lat, "lon": depot.lon} if depot else None),
+        "days": week_days(),
+    }
+    if agrupar:
+        resp["clusters"] = _store_clusters(company, bbox, zoom, areas)
+        return dumps(resp)
+
+    cols = _stores_columns(company, bbox, areas)
+    if columnar:
+        # arrays paralelos: mismo contenido que all_stores sin repetir las claves
+        resp["stores"] = cols
+    else:
+        keys = list(cols)
+        resp["all_stores"] = [dict(zip(keys, vals)) for vals in zip(*cols.values())]
+    return dumps(resp)
 
 @ruteo_bp.route("/map-data")
 @login_required
 def map_data():
-    company = Settings.PROJECT_SLUG
-    depot = Depot.query.filter_by(company_slug=company, active=True).first()
-    all_loc = Local.query.filter_by(company_slug=company, active=True).all()
+    """
+    ?formato=columnar devuelve "stores" como arrays paralelos en lugar de "all_stores".
+    ?bbox=min_lon,min_lat,max_lon,max_lat limita a la vista; con ?zoom bajo devuelve "clusters".
+    ?dpto=, ?distrito=, ?barrio= filtran por área administrativa y ?territorio= por territorio.
+    Responde 304 si el ETag (versión de datos de la empresa + semana + vista) no cambió.
+    """
+    company = current_company_slug()
+    columnar = request.args.get("formato") == "columnar"
+    bbox, zoom, agrupar = _viewport_args()
+    areas = _area_args()
+    lunes = next(iter(week_days()))
+    etag = strong_etag("map-data", company, get_data_version(company), lunes, int(columnar),
+                       bbox, zoom if agrupar else None, sorted(areas.items()))
+    # las vistas casi no se repiten; sin bbox, caché propia de la empresa
+    cache = _map_data_cache.for_company(company) if bbox is None else None
+    return cached_response(etag, lambda: _map_data_payload(company, columnar, bbox, zoom, agrupar, areas), cache)
 
-    resp = {
-        "depot": ({"name": depot.name, "lat": depot.lat, "lon": depot.lon} if depot else None),
-        "all_stores": [{
-            "id": l.id, "name": l.name, "city": l.city,
-            "lat": float(l.lat), "lon": float(l.lon),
-            "rank": l.rank, "venta_por_dia": float(l.venta_por_dia or 0)
-        } for l in all_loc],
-        "days": week_days()
+@ruteo_bp.route("/stores")
+@login_required
+def stores():
+    """
+    Locales dentro del bbox (?bbox=min_lon,min_lat,max_lon,max_lat&zoom=Z).
+    Con zoom menor a STORES_CLUSTER_ZOOM devuelve clusters agregados en el servidor.
+    """
+    company = current_company_slug()
+    bbox, zoom, agrupar = _viewport_args()
+    areas = _area_args()
+    if bbox is None:
+        return jsonify({"ok": False, "error": "bbox inválido (min_lon,min_lat,max_lon,max_lat)"}), 400
+
+    def build():
+        if agrupar:
+            return dumps({"tipo": "clusters", "clusters": _store_clusters(company, bbox, zoom, areas)})
+        return dumps({"tipo": "locales", "stores": _stores_columns(company, bbox, areas)})
+
+    etag = strong_etag("stores", company, get_data_version(company), bbox, zoom if agrupar else None,
+                       sorted(areas.items()))
+    return cached_response(etag, build)
+
+@ruteo_bp.route("/cercanos")
+@login_required
+def cercanos():
+    """
+    Locales activos más cercanos a un punto: ?lat=&lon= o ?local_id= (o ?depot=1 para el CL).
+    ?k= vecinos (por defecto 10), ?radio_km= límite de distancia (sólo radio si k=0),
+    ?excluir=id1,id2 para saltear los que ya están en la ruta.
+    """
+    company = current_company_slug()
+    excluir = [x for x in (request.args.get("excluir") or "").split(",") if x]
+    lat, lon = request.args.get("lat", type=float), request.args.get("lon", type=float)
+    local_id = request.args.get("local_id")
+    if local_id:
+        l = db.session.get(Local, local_id)
+        if l is None or l.company_slug != company:
+            return jsonify({"ok": False, "error": "Local inexistente"}), 404
+        lat, lon = l.lat, l.lon
+        excluir.append(l.id)
+    elif request.args.get("depot"):
+        depot = Depot.query.filter_by(company_slug=company, active=True).first()
+        if depot is None:
+            return jsonify({"ok": False, "error": "No hay centro logístico activo"}), 404
+        lat, lon = float(depot.lat), float(depot.lon)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({"ok": False, "error": "Indicá lat/lon, local_id o depot"}), 400
+
+    k = request.args.get("k", default=10, type=int)
+    radio_km = request.args.get("radio_km", type=float)
+    if k < 0 or (radio_km is not None and radio_km <= 0) or (not k and not radio_km):
+        return jsonify({"ok": False, "error": "k o radio_km inválidos"}), 400
+    k = min(k, Settings.CERCANOS_MAX) if k else None
+    limite = Settings.CERCANOS_MAX
+
+    tree = get_store_tree(company)
+    locales = tree.query(lat, lon, k=k, radio_km=radio_km, excluir=excluir)[:limite]
+    return jsonify({"ok": True, "centro": {"lat": lat, "lon": lon}, "locales": locales})
+
+@ruteo_bp.route("/territorios", methods=["GET"])
+@login_required
+def territorios():
+    """Territorios de la empresa con cantidad de locales activos y venta sumada."""
+    company = current_company_slug()
+    sin_asignar = db.session.execute(
+        select(func.count()).select_from(Local)
+        .where(Local.company_slug == company, Local.active.is_(True), Local.territorio.is_(None))
+    ).scalar()
+    return jsonify({"ok": True, "territorios": territory_summary(company), "sin_asignar": sin_asignar})
+
+@ruteo_bp.route("/territorios", methods=["POST"])
+@login_required
+def particionar():
+    """
+    Espera JSON:
+    {
+      "k": 5,                       # cantidad de territorios
+      "criterio": "paradas"|"venta",  # qué se balancea
+      "tolerancia": 0.05            # desbalance máximo sobre el promedio
     }
-    return jsonify(resp)
+    Recalcula la partición de todos los locales activos (reemplaza la anterior).
+    """
+    data = request.get_json() or {}
+    try:
+        k = int(data.get("k") or 0)
+        tolerancia = float(data.get("tolerancia", 0.05))
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "k/tolerancia inválidos"}), 400
+    criterio = data.get("criterio") or "paradas"
+    if not 1 <= k <= Settings.TERRITORIOS_MAX or criterio not in CRITERIOS or not 0 <= tolerancia <= 1:
+        return jsonify({"ok": False, "error": f"k entre 1 y {Settings.TERRITORIOS_MAX}, "
+                                              f"criterio {'/'.join(CRITERIOS)}, tolerancia entre 0 y 1"}), 400
+
+    company = current_company_slug()
+    build_territories(company, k, criterio, tolerancia)
+    db.session.commit()
+    return jsonify({"ok": True, "territorios": territory_summary(company)})
+
+@ruteo_bp.route("/territorios/asignar", methods=["POST"])
+@login_required
+def asignar_territorios():
+    """Asigna los locales nuevos (sin territorio) sin recalcular la partición."""
+    company = current_company_slug()
+    n = assign_pending(company)
+    db.session.commit()
+    return jsonify({"ok": True, "asignados": n, "territorios": territory_summary(company)})
+
+def _faltantes(company: str, ids) -> list:
+    """IDs de `ids` que no son locales de la empresa (inexistentes o de otra)."""
+    ids = set(ids)
+    existentes = set(db.session.execute(
+        select(Local.id).where(Local.company_slug == company, Local.id.in_(ids))
+    ).scalars()) if ids else set()
+    return sorted(ids - existentes)
+
+def _depot_ajeno(company: str, depot_id) -> bool:
+    """True si viene un depot_id que no es un centro logístico de la empresa."""
+    return bool(depot_id) and db.session.execute(
+        select(Depot.id).where(Depot.company_slug == company, Depot.id == depot_id)
+    ).scalar() is None
 
 @ruteo_bp.route("/guardar", methods=["POST"])
 @login_required
@@ -55,48 +273,395 @@ def guardar():
       "turno": "AM"|"PM",
       "cerrado": true|false,
       "depot_id": <id opcional>,
-      "paradas": ["local_id1","local_id2", ...]
+      "paradas": ["local_id1","local_id2", ...],
+      "version": <n opcional: la leída; si la ruta cambió desde entonces responde 409>
     }
+    Sólo se escriben las paradas que cambian de posición, se agregan o se quitan.
     """
     data = request.get_json() or {}
-    fecha = data.get("fecha")
+    try:
+        fecha = date.fromisoformat(data.get("fecha") or "")
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "Fecha inválida"}), 400
     turno = data.get("turno","AM")
+    if turno not in TURNOS:
+        return jsonify({"ok": False, "error": f"Turno inválido: {turno}"}), 400
+    cerrado = bool(data.get("cerrado", False))
+    depot_id = data.get("depot_id")
+    paradas = [str(pid) for pid in (data.get("paradas") or [])]
+    try:
+        version = int(data["version"]) if data.get("version") is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "Versión inválida"}), 400
+
+    company = current_company_slug()
+    faltantes = _faltantes(company, paradas)
+    if faltantes:
+        return jsonify({"ok": False, "error": "Locales inexistentes", "faltantes": faltantes}), 400
+    if _depot_ajeno(company, depot_id):
+        return jsonify({"ok": False, "error": "Centro logístico inexistente"}), 404
+    ruta = db.session.execute(
+        select(Ruta.id, Ruta.version).where(Ruta.company_slug == company, Ruta.fecha == fecha, Ruta.turno == turno)
+    ).first()
+    if ruta is None:
+        nueva = Ruta(company_slug=company, fecha=fecha, turno=turno, cerrado=cerrado,
+                     depot_id=depot_id or None, creado_por=current_user.id)
+        db.session.add(nueva)
+        db.session.flush()
+        ruta_id, version, antes = nueva.id, 0, []
+    else:
+        ruta_id, version = ruta.id, ruta.version if version is None else version
+        valores = {"cerrado": cerrado, **({"depot_id": depot_id} if depot_id else {})}
+        if not bump_version(company, ruta_id, version, **valores):
+            db.session.rollback()
+            return _conflicto(company, ruta_id)
+        antes = load_stops(company, ruta_id)
+
+    escritas = write_stops(company, ruta_id, antes, match_stops(antes, paradas))
+    refresh_metrics(company, ruta_ids=[ruta_id])
+    db.session.commit()
+    return jsonify({"ok": True, "ruta_id": ruta_id, "version": version + 1, "escritas": escritas})
+
+def _conflicto(company: str, ruta_id: int):
+    """409 con la versión y las paradas vigentes (o 404 si la ruta ya no existe)."""
+    actual = db.session.execute(
+        select(Ruta.version).where(Ruta.id == ruta_id, Ruta.company_slug == company)
+    ).scalar()
+    if actual is None:
+        return jsonify({"ok": False, "error": "Ruta inexistente"}), 404
+    return jsonify({
+        "ok": False, "error": "La ruta fue modificada por otro usuario",
+        "version": actual, "paradas": [local_id for _, local_id in load_stops(company, ruta_id)],
+    }), 409
+
+@ruteo_bp.route("/rutas/<int:ruta_id>", methods=["PATCH"])
+@login_required
+def editar_ruta(ruta_id: int):
+    """
+    Edición incremental de una ruta guardada. Espera JSON:
+    {
+      "version": n,            # la leída (GET /semana, guardar o el PATCH anterior)
+      "ops": [{"op": "insert", "local_id": "x", "pos": p},
+              {"op": "remove", "pos": p},
+              {"op": "move", "desde": p, "hasta": q}, ...],   # posiciones 1..N
+      "cerrado": true|false    # opcional
+    }
+    Escribe sólo las filas afectadas. Si la ruta cambió desde `version` responde 409 con la
+    versión y las paradas actuales.
+    """
+    data = request.get_json() or {}
+    ops = data.get("ops") or []
+    try:
+        version = int(data["version"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"ok": False, "error": "Falta la versión de la ruta"}), 400
+    if not isinstance(ops, list):
+        return jsonify({"ok": False, "error": "ops debe ser una lista"}), 400
+
+    company = current_company_slug()
+    valores = {"cerrado": bool(data["cerrado"])} if "cerrado" in data else {}
+    # primero la versión: deja la fila de la ruta bloqueada hasta el commit
+    if not bump_version(company, ruta_id, version, **valores):
+        db.session.rollback()
+        return _conflicto(company, ruta_id)
+
+    antes = load_stops(company, ruta_id)
+    try:
+        despues = apply_ops(antes, ops)
+    except OperacionInvalida as e:
+        db.session.rollback()
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    faltantes = _faltantes(company, (local_id for detalle_id, local_id in despues if detalle_id is None))
+    if faltantes:
+        db.session.rollback()
+        return jsonify({"ok": False, "error": "Locales inexistentes", "faltantes": faltantes}), 400
+
+    escritas = write_stops(company, ruta_id, antes, despues)
+    refresh_metrics(company, ruta_ids=[ruta_id])
+    db.session.commit()
+    return jsonify({
+        "ok": True, "ruta_id": ruta_id, "version": version + 1,
+        "paradas": [local_id for _, local_id in despues], "escritas": escritas,
+    })
+
+@ruteo_bp.route("/optimizar", methods=["POST"])
+@login_required
+def optimizar():
+    """
+    Espera JSON:
+    {
+      "depot_id": <id opcional, por defecto el CL activo>,
+      "paradas": ["local_id1","local_id2", ...],
+      "cerrado": true|false,
+      "tiempo_ms": <opcional>
+    }
+    Devuelve las mismas paradas en el orden optimizado (no guarda nada).
+    """
+    data = request.get_json() or {}
+    company = current_company_slug()
     cerrado = bool(data.get("cerrado", False))
+    paradas = [str(x) for x in (data.get("paradas") or [])]
+    paradas = list(dict.fromkeys(paradas))  # sin duplicados, conservando el orden
+    try:
+        tiempo_ms = min(
+            int(data.get("tiempo_ms") or Settings.OPTIMIZADOR_TIEMPO_MS),
+            Settings.OPTIMIZADOR_TIEMPO_MAX_MS,
+        )
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "tiempo_ms debe ser un entero"}), 400
+
     depot_id = data.get("depot_id")
-    paradas = data.get("paradas") or []
+    q = Depot.query.filter_by(company_slug=company)
+    depot = q.filter_by(id=depot_id).first() if depot_id else q.filter_by(active=True).first()
+    if depot_id and not depot:
+        return jsonify({"ok": False, "error": "Centro logístico inexistente"}), 404
+
+    locs = Local.query.filter(Local.company_slug == company, Local.id.in_(paradas)).all() if paradas else []
+    by_id = {l.id: l for l in locs}
+    faltantes = [pid for pid in paradas if pid not in by_id]
+    if faltantes:
+        return jsonify({"ok": False, "error": "Locales inexistentes", "faltantes": faltantes}), 400
+
+    stores = [by_id[pid] for pid in paradas]
+    # sin CL, el nodo 0 queda a distancia 0 de todos (el inicio queda libre)
+    dist = route_matrix(company, depot, stores)
+
+    inicial = list(range(1, len(stores) + 1))
+    orden = optimize_order(dist, cerrado=cerrado, tiempo_ms=tiempo_ms)
+    return jsonify({
+        "ok": True,
+        "paradas": [stores[i - 1].id for i in orden],
+        "cerrado": cerrado,
+        "depot_id": depot.id if depot else None,
+        "distancia_inicial_km": round(path_length(dist, inicial, cerrado), 3),
+        "distancia_km": round(path_length(dist, orden, cerrado), 3),
+    })
+
+def _red_puntos(data: dict):
+    """
+    (red, claves, lats, lons, error) para los endpoints de red vial. Puntos en el orden
+    del JSON: centro logístico (si viene depot_id) + paradas (ids de locales), o "puntos"
+    [[lat, lon], ...] sueltos. error es una respuesta lista para devolver, o None.
+    """
+    red = get_road_graph()
+    if red is None:
+        return None, None, None, None, (jsonify({"ok": False, "error": "Red vial no disponible"}), 503)
+    company = current_company_slug()
+    claves, lats, lons = [], [], []
+    if data.get("depot_id"):
+        depot = Depot.query.filter_by(company_slug=company, id=data["depot_id"]).first()
+        if depot is None:
+            return None, None, None, None, (jsonify({"ok": False, "error": "Centro logístico inexistente"}), 404)
+        claves.append(f"D:{depot.id}"); lats.append(float(depot.lat)); lons.append(float(depot.lon))
+
+    paradas = [str(x) for x in (data.get("paradas") or [])]
+    if paradas:
+        by_id = {i: (la, lo) for i, la, lo in db.session.execute(
+            select(Local.id, Local.lat, Local.lon).where(Local.company_slug == company, Local.id.in_(paradas))
+        ).all()}
+        faltantes = [pid for pid in paradas if pid not in by_id]
+        if faltantes:
+            return None, None, None, None, (jsonify({"ok": False, "error": "Locales inexistentes",
+                                                     "faltantes": faltantes}), 400)
+        for pid in paradas:
+            claves.append(pid); lats.append(float(by_id[pid][0])); lons.append(float(by_id[pid][1]))
+    try:
+        for i, (la, lo) in enumerate(data.get("puntos") or []):
+            claves.append(f"P:{i}"); lats.append(float(la)); lons.append(float(lo))
+    except (TypeError, ValueError):
+        return None, None, None, None, (jsonify({"ok": False, "error": "puntos debe ser [[lat, lon], ...]"}), 400)
+
+    if len(claves) > Settings.RED_VIAL_MAX_PUNTOS:
+        return None, None, None, None, (jsonify({"ok": False, "error": f"Máximo {Settings.RED_VIAL_MAX_PUNTOS} puntos"}), 400)
+    return red, claves, lats, lons, None
+
+@ruteo_bp.route("/red/matriz", methods=["POST"])
+@login_required
+def red_matriz():
+    """
+    Matrices muchos-a-muchos por la red vial (km y minutos) en una sola llamada.
+    Espera JSON: {"depot_id": <opcional>, "paradas": [...], "puntos": [[lat, lon], ...]}
+    """
+    red, claves, lats, lons, error = _red_puntos(request.get_json() or {})
+    if error:
+        return error
+    km = red.matrix(lats, lons, "distancia")
+    minutos = red.matrix(lats, lons, "tiempo")
+    return jsonify({"ok": True, "claves": claves,
+                    "km": np.round(km, 3).tolist(), "min": np.round(minutos, 2).tolist()})
+
+@ruteo_bp.route("/red/ruta", methods=["POST"])
+@login_required
+def red_ruta():
+    """
+    Recorrido por calle (camino más rápido) de una ruta: km, minutos, tramos y geometría.
+    Espera JSON: {"depot_id": <opcional>, "paradas": [...], "cerrado": true|false}
+    """
+    data = request.get_json() or {}
+    red, claves, lats, lons, error = _red_puntos(data)
+    if error:
+        return error
+    if data.get("cerrado") and data.get("depot_id") and len(claves) > 1:
+        claves, lats, lons = claves + claves[:1], lats + lats[:1], lons + lons[:1]
+    tramos = red.route(lats, lons)
+
+    coords = []
+    for t in tramos:
+        coords.extend(t["coords"] if not coords else t["coords"][1:])
+    return jsonify({
+        "ok": True,
+        "km": round(sum(t["km"] for t in tramos), 3),
+        "min": round(sum(t["min"] for t in tramos), 2),
+        "tramos": [{"desde": claves[i], "hasta": claves[i + 1], "km": t["km"], "min": t["min"]}
+                   for i, t in enumerate(tramos)],
+        "geometria": {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in coords]},
+    })
+
+@ruteo_bp.route("/semana", methods=["GET"])
+@login_required
+def semana():
+    """
+    Rutas guardadas de la semana de ?fecha (por defecto la actual), en una sola consulta:
+    {"dias": [...], "rutas": {"YYYY-MM-DD": {"AM": {"id", "version", "cerrado", "depot_id", "paradas"}, ...}}}
+    """
+    try:
+        base = date.fromisoformat(request.args["fecha"]) if request.args.get("fecha") else None
+    except ValueError:
+        return jsonify({"ok": False, "error": "Fecha inválida"}), 400
+    dias = list(week_days(base).keys())
+    company = current_company_slug()
 
-    ruta = Ruta.query.filter_by(company_slug=Settings.PROJECT_SLUG, fecha=fecha, turno=turno).first()
-    if not ruta:
-        ruta = Ruta(company_slug=Settings.PROJECT_SLUG, fecha=fecha, turno=turno, creado_por=current_user.id)
-        db.session.add(ruta)
+    filas = db.session.execute(
+        select(Ruta.id, Ruta.version, Ruta.fecha, Ruta.turno, Ruta.cerrado, Ruta.depot_id, RutaDetalle.local_id)
+        .outerjoin(RutaDetalle, and_(RutaDetalle.company_slug == Ruta.company_slug, RutaDetalle.ruta_id == Ruta.id))
+        .where(Ruta.company_slug == company,
+               Ruta.fecha.in_([date.fromisoformat(d) for d in dias]))
+        .order_by(Ruta.fecha, Ruta.turno, RutaDetalle.orden)
+    ).all()
 
-    ruta.cerrado = cerrado
-    if depot_id:
-        ruta.depot_id = depot_id
+    rutas = {}
+    for ruta_id, version, fecha, turno, cerrado, depot_id, local_id in filas:
+        r = rutas.setdefault(fecha.isoformat(), {}).setdefault(turno, {
+            "id": ruta_id, "version": version, "cerrado": bool(cerrado), "depot_id": depot_id, "paradas": [],
+        })
+        if local_id is not None:
+            r["paradas"].append(local_id)
+    return jsonify({"ok": True, "dias": dias, "rutas": rutas})
+
+@ruteo_bp.route("/semana", methods=["PUT"])
+@login_required
+def guardar_semana():
+    """
+    Reemplaza todas las rutas (Lunes a Sábado, AM/PM) de la semana en una transacción.
+    Espera JSON:
+    {
+      "fecha": "YYYY-MM-DD",   # cualquier día de la semana
+      "rutas": {"YYYY-MM-DD": {"AM": {"cerrado": bool, "depot_id": id, "paradas": [...]}, ...}}
+    }
+    Los turnos que no vienen quedan sin ruta.
+    """
+    data = request.get_json() or {}
+    try:
+        base = date.fromisoformat(data["fecha"]) if data.get("fecha") else None
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "Fecha inválida"}), 400
+    dias = [date.fromisoformat(d) for d in week_days(base)]
+    por_iso = {d.isoformat(): d for d in dias}
 
-    # limpiar detalles previos
-    RutaDetalle.query.filter_by(ruta_id=ruta.id).delete() if ruta.id else None
-    db.session.flush()
+    plan, opciones = {}, {}
+    for fecha, turnos in (data.get("rutas") or {}).items():
+        if fecha not in por_iso:
+            return jsonify({"ok": False, "error": f"{fecha} no pertenece a la semana"}), 400
+        for turno, ruta in (turnos or {}).items():
+            if turno not in TURNOS or not isinstance(ruta, dict):
+                return jsonify({"ok": False, "error": f"Turno inválido: {turno}"}), 400
+            key = (por_iso[fecha], turno)
+            plan[key] = [str(pid) for pid in (ruta.get("paradas") or [])]
+            opciones[key] = {"cerrado": bool(ruta.get("cerrado", False)), "depot_id": ruta.get("depot_id")}
 
-    for i, local_id in enumerate(paradas, start=1):
-        db.session.add(RutaDetalle(ruta=ruta, orden=i, local_id=str(local_id)))
+    company = current_company_slug()
+    faltantes = _faltantes(company, (pid for paradas in plan.values() for pid in paradas))
+    if faltantes:
+        return jsonify({"ok": False, "error": "Locales inexistentes", "faltantes": faltantes}), 400
+    if any(_depot_ajeno(company, d) for d in {o["depot_id"] for o in opciones.values()}):
+        return jsonify({"ok": False, "error": "Centro logístico inexistente"}), 404
 
+    rutas = replace_week(company, dias, plan, False, None, current_user.id, opciones)
+    refresh_metrics(company, dias[0], dias[-1])
     db.session.commit()
-    return jsonify({"ok": True, "ruta_id": ruta.id})
+    return jsonify({
+        "ok": True,
+        "rutas": {f"{f.isoformat()}_{t}": ruta_id for (f, t), ruta_id in rutas.items()},
+        "paradas": sum(len(p) for p in plan.values()),
+    })
+
+@ruteo_bp.route("/planificar-semana", methods=["POST"])
+@login_required
+def planificar_semana():
+    """
+    Encola el plan semanal (trabajo "planificar-semana"). Espera JSON (todo opcional):
+    {
+      "fecha": "YYYY-MM-DD",   # cualquier día de la semana a planificar (por defecto hoy)
+      "cerrado": true|false,
+      "max_visitas": 3,
+      "guardar": true|false    # false = sólo previsualizar
+    }
+    Responde 202 con el id del trabajo; su resultado es
+    {"guardado", "cerrado", "visitas", "rutas": {"YYYY-MM-DD": {"AM": [...], "PM": [...]}}}.
+    """
+    return encolar("planificar-semana", request.get_json() or {})
+
+def _date_range():
+    """
+    (desde, hasta, error) desde ?desde / ?hasta (ISO, por defecto la semana actual).
+    error es una respuesta 400 lista para devolver, o None.
+    """
+    days = list(week_days().keys())
+    try:
+        desde = date.fromisoformat(request.args.get("desde") or days[0])
+        hasta = date.fromisoformat(request.args.get("hasta") or days[-1])
+    except ValueError:
+        return None, None, (jsonify({"ok": False, "error": "Fecha inválida"}), 400)
+    if hasta < desde:
+        return None, None, (jsonify({"ok": False, "error": "'hasta' es anterior a 'desde'"}), 400)
+    if (hasta - desde).days >= Settings.EXPORT_MAX_DIAS:
+        return None, None, (jsonify({"ok": False, "error": f"Rango máximo: {Settings.EXPORT_MAX_DIAS} días"}), 400)
+    return desde, hasta, None
+
+@ruteo_bp.route("/metricas")
+@login_required
+def metricas():
+    """
+    Km, duración estimada, paradas y venta cubierta de las rutas guardadas entre ?desde y
+    ?hasta (por defecto la semana actual), por ruta, por día y totales.
+    """
+    desde, hasta, error = _date_range()
+    if error:
+        return error
+    company = current_company_slug()
+    rutas = route_metrics(company, desde, hasta)
+
+    por_dia = {}
+    for r in rutas:
+        por_dia.setdefault(r["fecha"], []).append(r)
+    return jsonify({
+        "ok": True,
+        "desde": desde.isoformat(),
+        "hasta": hasta.isoformat(),
+        "velocidad_kmh": Settings.RUTA_VELOCIDAD_KMH,
+        "servicio_min": Settings.RUTA_SERVICIO_MIN,
+        "rutas": rutas,
+        "por_dia": {dia: summarize(rs) for dia, rs in por_dia.items()},
+        "totales": summarize(rutas),
+    })
 
 @ruteo_bp.route("/exportar")
 @login_required
 def exportar():
     """
-    Exporta todas las rutas guardadas (AM/PM) de la semana actual.
+    Encola la exportación de las rutas guardadas (AM/PM) entre ?desde y ?hasta (ISO, por
+    defecto la semana actual). ?formato=xlsx|csv, ?por_dia=1 -> una hoja por día (xlsx).
+    Responde 202 con el id del trabajo; el archivo se descarga de /jobs/<id>/resultado.
     """
-    days = list(week_days().keys())
-    rutas = (
-        db.session.query(Ruta)
-        .filter(Ruta.company_slug==Settings.PROJECT_SLUG, Ruta.fecha.in_(days))
-        .order_by(Ruta.fecha.asc(), Ruta.turno.asc())
-        .all()
-    )
-    buf = build_excel_bytes(rutas)
-    return send_file(buf, mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                     as_attachment=True, download_name="ruteo_semana.xlsx")
+    return encolar("exportar", request.args.to_dict())
@@ -0,0 +1,2 @@
+from flask import Blueprint
+tiles_bp = Blueprint("tiles", __name__)
@@ -0,0 +1,46 @@
+from flask import Response, abort, url_for
+from flask_login import login_required
+from . import tiles_bp
+from ...utils.http import compress, not_modified, preferred_encoding
+from ...utils.tiles import available_layers, get_layer, get_tile
+
+MVT_MIMETYPE = "application/vnd.mapbox-vector-tile"
+
+def tile_url_templates() -> dict:
+    """{capa: "/tiles/<capa>/{z}/{x}/{y}.mvt?v=<versión>"} para las capas disponibles."""
+    out = {}
+    for name, info in available_layers().items():
+        base = url_for("tiles.tile", layer=name, z=0, x=0, y=0)
+        out[name] = {
+            "url": base.replace("/0/0/0.mvt", "/{z}/{x}/{y}.mvt") + f"?v={info['version']}",
+            "minzoom": info["minzoom"],
+            "maxzoom": info["maxzoom"],
+        }
+    return out
+
+@tiles_bp.route("/<layer>/<int:z>/<int:x>/<int:y>.mvt")
+@login_required
+def tile(layer, z, x, y):
+    lyr = get_layer(layer)
+    if lyr is None or not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        abort(404)
+
+    etag = f"{lyr.version}-{z}-{x}-{y}"
+    headers = {
+        "ETag": f'"{etag}"',
+        # la URL lleva ?v=<versión de la capa>: si la capa cambia, cambia la URL
+        "Cache-Control": "private, max-age=86400",
+        "Vary": "Accept-Encoding",
+    }
+    if not_modified(etag):
+        return Response(status=304, headers=headers)
+
+    data = get_tile(lyr, z, x, y)
+    if not data:
+        return Response(status=204, headers=headers)
+
+    encoding = preferred_encoding()
+    resp = Response(compress(data, encoding), mimetype=MVT_MIMETYPE, headers=headers)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    return resp
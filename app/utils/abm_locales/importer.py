@@ -0,0 +1,237 @@
+"""
+Importación masiva de locales desde CSV/XLSX.
+
+Validación y normalización vectorizadas con pandas (misma semántica que los helpers
+del ABM: _to_float, _to_int, _to_decimal y _slugify), resolución de IDs contra la base
+con consultas por conjunto y upsert por lotes en una sola transacción.
+"""
+import zipfile
+from pathlib import Path
+import numpy as np
+from sqlalchemy import insert, select, update
+from ...database import db
+from ...models import Local, bump_data_version
+from ..areas import assign_areas
+from ..ruteo.geo import geohash_encode_many
+from ..text import normalize_search_series
+
+BATCH = 1000
+
+# encabezado (ya slugificado) -> columna
+ALIAS = {
+    "id": "id", "codigo": "id",
+    "name": "name", "nombre": "name", "nombre_sucursal": "name",
+    "city": "city", "ciudad": "city",
+    "lat": "lat", "latitud": "lat",
+    "lon": "lon", "lng": "lon", "longitud": "lon",
+    "rank": "rank", "ranking": "rank",
+    "venta_por_dia": "venta_por_dia", "venta": "venta_por_dia", "venta_dia": "venta_por_dia",
+    "active": "active", "activo": "active",
+}
+VERDADERO = {"1", "si", "true", "x", "s", "yes"}
+FALSO = {"0", "no", "false", "n"}
+
+class ArchivoInvalido(ValueError):
+    """El archivo no se puede leer o le faltan columnas obligatorias."""
+
+def slugify_series(s):
+    """_slugify vectorizado."""
+    return (
+        s.fillna("").astype(str).str.strip().str.lower()
+        .str.encode("ascii", "ignore").str.decode("ascii")
+        .str.replace(r"[^a-z0-9\s_-]", "", regex=True)
+        .str.replace(r"\s+", "_", regex=True)
+        .str.replace(r"_+", "_", regex=True)
+        .str.strip("_")
+    )
+
+def read_table(stream, filename: str, max_filas: int):
+    """DataFrame (object) con las columnas renombradas según ALIAS."""
+    import pandas as pd
+
+    ext = Path(filename or "").suffix.lower()
+    if ext not in (".xlsx", ".xlsm", ".csv", ".txt"):
+        raise ArchivoInvalido("Formato no soportado (usar .csv o .xlsx)")
+    try:
+        if ext in (".xlsx", ".xlsm"):
+            df = pd.read_excel(stream, dtype=object, engine="openpyxl", nrows=max_filas + 1)
+        else:
+            # sep=None detecta "," o ";" (export de Excel en es-PY)
+            df = pd.read_csv(stream, dtype=str, keep_default_na=False, sep=None, engine="python",
+                             encoding="utf-8-sig", nrows=max_filas + 1)
+    except (ValueError, UnicodeDecodeError, zipfile.BadZipFile) as e:
+        raise ArchivoInvalido(f"No se pudo leer el archivo: {e}") from e
+
+    if len(df) > max_filas:
+        raise ArchivoInvalido(f"El archivo supera el máximo de {max_filas} filas")
+    cols = slugify_series(pd.Series(df.columns.astype(str))).map(ALIAS)
+    df.columns = [c if isinstance(c, str) else f"_ignorar_{i}" for i, c in enumerate(cols)]
+    df = df.loc[:, ~df.columns.duplicated()]
+    faltan = [c for c in ("name", "lat", "lon") if c not in df.columns]
+    if faltan:
+        raise ArchivoInvalido("Faltan columnas obligatorias: " + ", ".join(faltan))
+    return df
+
+def _text(df, col):
+    import pandas as pd
+    if col not in df.columns:
+        return pd.Series("", index=df.index)
+    return df[col].where(df[col].notna(), "").astype(str).str.strip()
+
+def _is_number(s):
+    return s.map(lambda v: isinstance(v, (int, float, np.number)) and not isinstance(v, bool))
+
+def _to_float(df, col):
+    """Como _to_float: acepta coma decimal; None/NaN si no es número."""
+    import pandas as pd
+    raw = df[col] if col in df.columns else pd.Series("", index=df.index)
+    txt = _text(df, col).str.replace(",", ".", regex=False)
+    return pd.to_numeric(raw.where(_is_number(raw), txt), errors="coerce")
+
+def _to_decimal(df, col):
+    """Como _to_decimal: "1.234,56" -> 1234.56 (celdas numéricas de XLSX se usan tal cual)."""
+    import pandas as pd
+    raw = df[col] if col in df.columns else pd.Series("", index=df.index)
+    txt = _text(df, col).str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    return pd.to_numeric(raw.where(_is_number(raw), txt), errors="coerce"), txt.eq("") & ~_is_number(raw)
+
+def normalize(df, company_slug: str, next_rank: int):
+    """
+    -> (filas válidas como DataFrame, errores {fila_archivo: [mensajes]}).
+    La fila del archivo cuenta el encabezado (primera fila de datos = 2).
+    """
+    import pandas as pd
+
+    out = pd.DataFrame(index=df.index)
+    out["fila"] = df.index + 2
+    out["id"] = _text(df, "id")
+    out["name"] = _text(df, "name")
+    city = _text(df, "city")
+    out["city"] = city.where(city != "", None)
+    out["lat"] = _to_float(df, "lat")
+    out["lon"] = _to_float(df, "lon")
+
+    venta, venta_vacia = _to_decimal(df, "venta_por_dia")
+    out["venta_por_dia"] = venta.where(~venta_vacia, 0.0).round(2)
+
+    rank_txt = _text(df, "rank")
+    rank = _to_float(df, "rank")
+    rank_vacio = rank_txt.eq("") & rank.isna()
+    out["rank"] = rank
+
+    act = slugify_series(_text(df, "active"))  # "Sí" -> "s"
+    out["active"] = ~act.isin(FALSO)
+
+    errores = {}
+
+    def marcar(mask, msg):
+        for f in out.loc[mask, "fila"]:
+            errores.setdefault(int(f), []).append(msg)
+
+    marcar(out["name"] == "", "Nombre vacío")
+    marcar(out["lat"].isna() | ~out["lat"].between(-90, 90), "Lat inválida")
+    marcar(out["lon"].isna() | ~out["lon"].between(-180, 180), "Lon inválida")
+    marcar(out["venta_por_dia"].isna(), "Venta/día inválida")
+    marcar(~rank_vacio & (rank.isna() | (rank % 1 != 0)), "Rank inválido")
+    marcar(~act.isin(VERDADERO | FALSO | {""}), "Activo inválido (usar si/no)")
+    marcar(out["id"].str.len() > 64, "ID de más de 64 caracteres")
+    con_id = out["id"] != ""
+    marcar(con_id & out["id"].duplicated(keep="first"), "ID repetido en el archivo")
+
+    # rank faltante: siguientes al máximo actual, en el orden del archivo
+    faltantes = rank_vacio.to_numpy()
+    ranks = out["rank"].to_numpy(dtype=float, copy=True)
+    ranks[faltantes] = next_rank + np.arange(faltantes.sum())
+    out["rank"] = ranks
+
+    validas = out[~out["fila"].isin(errores.keys())].copy()
+    validas["rank"] = validas["rank"].astype(int)
+    validas["company_slug"] = company_slug
+    return validas, errores
+
+def _existing(ids: list) -> dict:
+    """{id: (company_slug, city)} de los IDs que ya existen (consultas por conjunto, de a BATCH)."""
+    out = {}
+    for i in range(0, len(ids), BATCH):
+        chunk = ids[i:i + BATCH]
+        for id_, company, city in db.session.execute(
+            select(Local.id, Local.company_slug, Local.city).where(Local.id.in_(chunk))
+        ):
+            out[id_] = (company, city)
+    return out
+
+def _generate_ids(names, prefix: str, reservados=()) -> list:
+    """
+    IDs "<prefix>_<nombre>" únicos (sufijos -1, -2 como _unique_local_id) con UNA consulta.
+    `reservados`: IDs explícitos del mismo archivo, que todavía no están en la base.
+    """
+    bases = [f"{prefix}_{s}" if s else f"{prefix}_local" for s in slugify_series(names)]
+    like = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "\\_%"
+    usados = set(db.session.execute(select(Local.id).where(Local.id.like(like, escape="\\"))).scalars())
+    usados.update(reservados)
+    out = []
+    for base in bases:
+        cand, i = base, 1
+        while cand in usados:
+            cand = f"{base}-{i}"
+            i += 1
+        usados.add(cand)
+        out.append(cand)
+    return out
+
+def upsert(validas, errores: dict, company_slug: str, id_prefix: str, columnas=None,
+           guardar: bool = True) -> dict:
+    """
+    Inserta/actualiza las filas válidas por lotes. Filas con ID: se actualizan si el local es
+    de la empresa (error si es de otra), si no se crean con ese ID. Sin ID: se genera.
+    En las actualizaciones sólo se tocan las `columnas` presentes en el archivo.
+    No hace commit.
+    """
+    con_id = validas["id"] != ""
+    existentes = _existing(validas.loc[con_id, "id"].tolist())
+
+    ajenos = validas["id"].map(lambda i: i in existentes and existentes[i][0] != company_slug)
+    for f in validas.loc[ajenos, "fila"]:
+        errores.setdefault(int(f), []).append("ID en uso por otra empresa")
+    validas = validas[~ajenos]
+    con_id = validas["id"] != ""
+
+    nuevos_gen = validas.loc[~con_id].copy()
+    if len(nuevos_gen):
+        nuevos_gen["id"] = _generate_ids(nuevos_gen["name"], id_prefix, reservados=validas.loc[con_id, "id"])
+    es_update = con_id & validas["id"].isin(existentes.keys())
+    nuevos = [validas.loc[con_id & ~es_update], nuevos_gen]
+    actualizar = validas.loc[es_update]
+
+    cols = ["id", "company_slug", "name", "city", "lat", "lon", "rank", "venta_por_dia", "active"]
+
+    def registros(df, cols):
+        if df.empty:
+            return []
+        df = df[cols].copy()
+        df["geohash"] = geohash_encode_many(df["lat"].to_numpy(), df["lon"].to_numpy())
+        # sin columna ciudad en el archivo, la búsqueda usa la ciudad ya guardada
+        ciudad = df["city"] if "city" in cols else df["id"].map(lambda i: existentes[i][1])
+        df["busqueda"] = normalize_search_series(df["name"], ciudad, df["id"])
+        codes = assign_areas(df["lat"].to_numpy(), df["lon"].to_numpy())
+        df["dpto_cod"], df["distrito_cod"], df["barrio_cod"] = codes["dpto"], codes["distrito"], codes["barrio"]
+        df = df.astype(object).where(df.notna(), None)
+        return df.to_dict("records")
+
+    cols_upd = [c for c in cols if c in ("id", "name", "lat", "lon") or columnas is None or c in columnas]
+    filas_ins = [r for df in nuevos for r in registros(df, cols)]
+    filas_upd = registros(actualizar, cols_upd)
+    if guardar:
+        for i in range(0, len(filas_ins), BATCH):
+            db.session.execute(insert(Local), filas_ins[i:i + BATCH])
+        for i in range(0, len(filas_upd), BATCH):
+            db.session.execute(update(Local), filas_upd[i:i + BATCH])
+        if filas_ins or filas_upd:
+            # el bulk no pasa por after_flush: invalidar map-data a mano
+            bump_data_version(company_slug)
+
+    return {
+        "insertados": len(filas_ins),
+        "actualizados": len(filas_upd),
+        "ids": [r["id"] for r in filas_ins],
+    }
@@ -0,0 +1,84 @@
+"""
+Áreas administrativas (departamento / distrito / barrio) de cada local por punto-en-polígono.
+
+Las capas salen de build/ sin simplificar (scripts/preprocess_layers*.py: *.full.geojson
+o su .parquet si está), así los bordes no se corren. Cada una se carga una vez por
+worker en un STRtree (se recarga si cambia el archivo) y se consulta en bloque para
+muchos puntos a la vez.
+"""
+import threading
+from pathlib import Path
+import numpy as np
+from config import Settings
+from .capas import file_version, read_features, source_path
+
+NIVELES = ("dpto", "distrito", "barrio")
+
+class AreaIndex:
+    def __init__(self, nivel: str, path: Path, campos):
+        import shapely
+        self.nivel = nivel
+        self.path = Path(path)
+        self.version = file_version(self.path)
+
+        self.geoms, props = read_features(self.path)
+        # código = concatenación de los campos presentes (p. ej. DPTO + DISTRITO)
+        self.codes = np.array([
+            "".join(str(p[c]) for c in campos if p.get(c) not in (None, "")) or None
+            for p in props
+        ], dtype=object)
+        self.tree = shapely.STRtree(self.geoms)
+
+    def lookup(self, lat, lon) -> np.ndarray:
+        """Código del polígono que contiene cada punto (None si ninguno)."""
+        import shapely
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        out = np.full(len(lat), None, dtype=object)
+        if len(lat) == 0 or len(self.geoms) == 0:
+            return out
+        pts = shapely.points(lon, lat)
+        punto, poly = self.tree.query(pts, predicate="intersects")
+        # un punto en el borde cae en dos polígonos: queda el primero
+        primero = np.unique(punto, return_index=True)[1]
+        out[punto[primero]] = self.codes[poly[primero]]
+        return out
+
+_indexes: dict[str, AreaIndex] = {}
+_lock = threading.Lock()
+
+def _path(nivel: str) -> Path | None:
+    cfg = Settings.AREAS_ADMIN.get(nivel)
+    if not cfg:
+        return None
+    p = source_path(Path(Settings.TILES_SOURCE_DIR) / cfg["archivo"])
+    return p if p.exists() else None
+
+def get_area_index(nivel: str) -> AreaIndex | None:
+    p = _path(nivel)
+    if p is None:
+        return None
+    with _lock:
+        idx = _indexes.get(nivel)
+        if idx is None or idx.version != file_version(p):
+            idx = _indexes[nivel] = AreaIndex(nivel, p, Settings.AREAS_ADMIN[nivel]["codigo"])
+        return idx
+
+def available_levels() -> list[str]:
+    return [n for n in NIVELES if _path(n) is not None]
+
+def assign_areas(lat, lon) -> dict:
+    """{"dpto": códigos, "distrito": ..., "barrio": ...} para arrays de lat/lon (None si falta la capa)."""
+    n = len(lat)
+    out = {}
+    for nivel in NIVELES:
+        idx = get_area_index(nivel)
+        out[nivel] = idx.lookup(lat, lon) if idx is not None else np.full(n, None, dtype=object)
+    return out
+
+def set_local_areas(l):
+    """Completa dpto_cod / distrito_cod / barrio_cod de un Local (sin commit)."""
+    codes = assign_areas([l.lat], [l.lon])
+    l.dpto_cod = codes["dpto"][0]
+    l.distrito_cod = codes["distrito"][0]
+    l.barrio_cod = codes["barrio"][0]
@@ -0,0 +1,98 @@
+"""Cachés en memoria del proceso (por worker)."""
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """Dict acotado con desalojo LRU, seguro entre threads."""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                return default
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+_MISSING = object()
+
+class TTLCache(LRUCache):
+    """LRUCache cuyas entradas vencen a los `ttl` segundos de guardadas."""
+
+    def __init__(self, maxsize: int = 128, ttl: float = 60.0):
+        super().__init__(maxsize)
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        item = super().get(key, _MISSING)
+        if item is _MISSING:
+            return default
+        guardado, value = item
+        if time.monotonic() - guardado > self.ttl:
+            self.pop(key)
+            return default
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, (time.monotonic(), value))
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+class TenantCache:
+    """
+    Una LRUCache por empresa (cada una con su propio tope) dentro de un LRU de empresas:
+    una empresa con mucho tráfico no desaloja las entradas de las demás, y las empresas
+    que no se usan hace rato liberan su memoria entera.
+    """
+
+    def __init__(self, maxsize: int = 16, max_empresas: int = 32):
+        self.maxsize = maxsize
+        self._empresas = LRUCache(maxsize=max_empresas)
+        self._lock = threading.Lock()
+
+    def for_company(self, company_slug: str) -> LRUCache:
+        cache = self._empresas.get(company_slug)
+        if cache is None:
+            with self._lock:
+                cache = self._empresas.get(company_slug)
+                if cache is None:
+                    cache = LRUCache(maxsize=self.maxsize)
+                    self._empresas[company_slug] = cache
+        return cache
+
+    def clear(self, company_slug: str | None = None):
+        if company_slug is None:
+            self._empresas.clear()
+        else:
+            self._empresas.pop(company_slug)
+
+    def __len__(self):
+        return len(self._empresas)
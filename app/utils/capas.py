@@ -0,0 +1,134 @@
+"""
+Archivos de capas de build/ (scripts/preprocess_layers*.py) servidos por la app.
+
+Por capa puede haber: <base>.lite.geojson(.gz), <base>.topo.json(.gz), <base>.fgb
+(FlatGeobuf con índice espacial: el cliente lee por HTTP Range sólo los features de la
+vista) y <base>.parquet (GeoParquet ordenado por Hilbert, con bbox por fila: lectura
+columnar del lado del servidor).
+
+Las URLs llevan el hash del contenido (/capas/<capa>/<hash>.<formato>), así se cachean
+como inmutables; al reconstruir una capa cambia el hash y con él la URL.
+"""
+import hashlib
+import json
+import threading
+from pathlib import Path
+from config import Settings
+from .cache import LRUCache
+
+# formato de la URL -> (sufijo en build/, mimetype)
+FORMATOS = {
+    "fgb": (".fgb", "application/flatgeobuf"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "topo.json": (".topo.json", "application/json"),
+    "geojson": (".lite.geojson", "application/geo+json"),
+}
+
+def capa_path(capa: str, formato: str) -> Path | None:
+    base = Settings.CAPAS.get(capa)
+    if base is None or formato not in FORMATOS:
+        return None
+    p = Path(Settings.TILES_SOURCE_DIR) / f"{base}{FORMATOS[formato][0]}"
+    return p if p.exists() else None
+
+# ---------- hash de contenido ----------
+_hashes = LRUCache(maxsize=256)
+_hash_lock = threading.Lock()
+
+def content_hash(path: Path) -> str:
+    """sha256 (16 hex) del archivo; se recalcula sólo si cambian mtime o tamaño."""
+    st = path.stat()
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    h = _hashes.get(key)
+    if h is None:
+        with _hash_lock:  # un solo hilo lee el archivo entero
+            h = _hashes.get(key)
+            if h is None:
+                sha = hashlib.sha256()
+                with open(path, "rb") as fh:
+                    for bloque in iter(lambda: fh.read(1 << 20), b""):
+                        sha.update(bloque)
+                h = sha.hexdigest()[:16]
+                _hashes[key] = h
+    return h
+
+def file_version(path: Path) -> str:
+    """Versión barata (mtime y tamaño, sin leer el archivo): para recargar índices en memoria."""
+    st = path.stat()
+    return hashlib.sha1(f"{st.st_mtime_ns}-{st.st_size}".encode()).hexdigest()[:10]
+
+def capa_url(capa: str, formato: str) -> str | None:
+    """URL inmutable del archivo de la capa, o None si no está en build/."""
+    from flask import url_for
+    p = capa_path(capa, formato)
+    if p is None:
+        return None
+    return url_for("capas.archivo", capa=capa, archivo=f"{content_hash(p)}.{formato}")
+
+def map_layer_urls() -> dict:
+    """
+    URLs de las capas livianas del mapa (las claves de SUPABASE_ASSETS): TopoJSON o GeoJSON
+    locales si están en build/; si no, el enlace externo de SUPABASE_ASSETS.
+    """
+    return {
+        capa: capa_url(capa, "topo.json") or capa_url(capa, "geojson") or externa
+        for capa, externa in Settings.SUPABASE_ASSETS.items()
+    }
+
+def fgb_urls() -> dict:
+    """{capa: {"url", "minzoom"}} de las capas con FlatGeobuf (lectura por bbox desde el mapa)."""
+    out = {}
+    for capa in Settings.CAPAS:
+        url = capa_url(capa, "fgb")
+        if url:
+            out[capa] = {"url": url, "minzoom": Settings.TILE_LAYERS.get(capa, {}).get("minzoom", 0)}
+    return out
+
+def layer_index() -> dict:
+    """{capa: {formato: url}} de todo lo disponible en build/."""
+    out = {}
+    for capa in Settings.CAPAS:
+        urls = {f: capa_url(capa, f) for f in FORMATOS}
+        urls = {f: u for f, u in urls.items() if u}
+        if urls:
+            out[capa] = urls
+    return out
+
+# ---------- lectura del lado del servidor ----------
+def _pyarrow():
+    try:
+        import pyarrow.parquet as pq
+        return pq
+    except ImportError:
+        return None
+
+def source_path(geojson_path: Path) -> Path:
+    """El GeoParquet hermano (<base>.parquet, sin simplificar) de un *.full.geojson si existe y hay pyarrow; si no, el mismo GeoJSON."""
+    geojson_path = Path(geojson_path)
+    base = geojson_path.name
+    for sufijo in (".lite.geojson", ".full.geojson", ".geojson"):
+        if base.endswith(sufijo):
+            base = base[: -len(sufijo)]
+            break
+    parquet = geojson_path.with_name(f"{base}.parquet")
+    return parquet if parquet.exists() and _pyarrow() is not None else geojson_path
+
+def read_features(path: Path):
+    """(geometrías shapely en lon/lat, [propiedades]) de un GeoJSON o GeoParquet (WKB)."""
+    import shapely
+    path = Path(path)
+    if path.suffix == ".parquet":
+        pq = _pyarrow()
+        tabla = pq.read_table(path)
+        geo = json.loads((tabla.schema.metadata or {}).get(b"geo", b"{}"))
+        col = geo.get("primary_column", "geometry")
+        geoms = shapely.from_wkb(tabla.column(col).to_pylist())
+        props = tabla.drop([c for c in (col, "bbox") if c in tabla.column_names]).to_pylist()
+        validas = [i for i, g in enumerate(geoms) if g is not None and not g.is_empty]
+        return geoms[validas], [props[i] for i in validas]
+
+    with open(path, "rb") as fh:
+        gj = json.load(fh)
+    feats = [f for f in gj.get("features", []) if f.get("geometry")]
+    geoms = shapely.from_geojson([json.dumps(f["geometry"]) for f in feats])
+    return geoms, [f.get("properties") or {} for f in feats]
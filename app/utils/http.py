@@ -0,0 +1,74 @@
+"""Helpers HTTP: serialización JSON rápida, ETag y compresión de respuestas cacheables."""
+import gzip
+import hashlib
+import json
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def strong_etag(*parts) -> str:
+    return hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+def preferred_encoding() -> str | None:
+    accept = request.accept_encodings
+    if brotli is not None and accept["br"]:
+        return "br"
+    if accept["gzip"]:
+        return "gzip"
+    return None
+
+def compress(body: bytes, encoding: str | None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+def not_modified(etag: str) -> bool:
+    return etag in request.if_none_match
+
+def cached_response(etag: str, build, cache: dict | None = None, *,
+                    mimetype: str = "application/json", max_age: int = 0) -> Response:
+    """
+    Respuesta con ETag fuerte y 304 si el cliente ya tiene esa versión.
+    `build()` genera el cuerpo (bytes) sólo si hace falta; `cache` (dict o LRU) guarda
+    el cuerpo ya comprimido por (etag, encoding) para no serializar ni comprimir de nuevo.
+    """
+    headers = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": f"private, max-age={max_age}, must-revalidate" if max_age else "private, no-cache",
+        "Vary": "Accept-Encoding, Cookie",
+    }
+    if not_modified(etag):
+        return Response(status=304, headers=headers)
+
+    encoding = preferred_encoding()
+    key = (etag, encoding)
+    body = cache.get(key) if cache is not None else None
+    if body is None:
+        raw = cache.get((etag, None)) if cache is not None else None
+        if raw is None:
+            raw = build()
+            if cache is not None:
+                cache[(etag, None)] = raw
+        body = compress(raw, encoding)
+        if cache is not None:
+            cache[key] = body
+
+    resp = Response(body, mimetype=mimetype, headers=headers)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    return resp
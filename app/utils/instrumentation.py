@@ -0,0 +1,185 @@
+"""
+Instrumentación por request: latencia por endpoint (histograma), cantidad de consultas
+SQL y tiempo de base (eventos del engine), log de requests lentos, cabecera
+Server-Timing y texto Prometheus para /metrics.
+
+Los contadores viven en memoria de cada worker: con varios workers de gunicorn cada
+scrape ve el proceso que lo atiende (los contadores son monótonos por proceso).
+
+Perfilado: un admin que manda `X-Profile: 1` obtiene un muestreo del stack del thread
+del request cada PROFILER_INTERVALO_MS, en formato "collapsed" (flamegraph.pl /
+speedscope), guardado en memoria y accesible por el id de la cabecera X-Profile-Id.
+"""
+import sys
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from config import Settings
+from .cache import LRUCache
+
+class Histogram:
+    """Histograma acumulativo (buckets en segundos o en unidades) por tupla de labels."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # labels -> [cuentas por bucket..., +Inf, suma]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, valor: float):
+        i = bisect_left(self.buckets, valor)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += valor
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {k: list(v) for k, v in self._series.items()}
+
+LATENCIA = Histogram(Settings.METRICS_BUCKETS_S)
+CONSULTAS = Histogram((0, 1, 2, 5, 10, 20, 50, 100, 200))
+DB_SEGUNDOS = Histogram(Settings.METRICS_BUCKETS_S)
+_lentos = Counter()
+_lentos_lock = threading.Lock()
+
+# ---------- SQL ----------
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    conn.info["_t_consulta"] = time.perf_counter()  # una conexión ejecuta de a una consulta
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    t0 = conn.info.pop("_t_consulta", None)
+    if t0 is not None and has_request_context() and "_perf" in g:
+        g._perf["consultas"] += 1
+        g._perf["db"] += time.perf_counter() - t0
+
+def watch_engine(engine):
+    if not event.contains(engine, "before_cursor_execute", _before_cursor):
+        event.listen(engine, "before_cursor_execute", _before_cursor)
+        event.listen(engine, "after_cursor_execute", _after_cursor)
+
+# ---------- perfilado por muestreo ----------
+class SamplingProfiler:
+    """Muestrea el stack de un thread en otro thread; stacks agregados en formato collapsed."""
+
+    def __init__(self, thread_id: int, intervalo_s: float):
+        self.thread_id = thread_id
+        self.intervalo_s = intervalo_s
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._t = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.intervalo_s):
+            frame = sys._current_frames().get(self.thread_id)
+            pila = []
+            while frame is not None:
+                pila.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if pila:
+                self.stacks[";".join(reversed(pila))] += 1
+
+    def start(self):
+        self._t.start()
+        return self
+
+    def stop(self) -> str:
+        self._stop.set()
+        self._t.join()
+        return "\n".join(f"{pila} {n}" for pila, n in self.stacks.most_common())
+
+perfiles = LRUCache(maxsize=32)
+
+def _quiere_perfil() -> bool:
+    if request.headers.get("X-Profile") != "1":
+        return False
+    from flask_login import current_user
+    return bool(getattr(current_user, "is_authenticated", False) and current_user.is_admin)
+
+# ---------- request ----------
+def _endpoint() -> str:
+    # sin endpoint (404) se agrupa todo en uno para no crear una serie por URL
+    return request.endpoint or "sin_ruta"
+
+def _before_request():
+    g._perf = {"t0": time.perf_counter(), "consultas": 0, "db": 0.0, "perfil": None}
+    if _quiere_perfil():
+        g._perf["perfil"] = SamplingProfiler(threading.get_ident(),
+                                             Settings.PROFILER_INTERVALO_MS / 1000.0).start()
+
+def _after_request(response):
+    perf = g.pop("_perf", None)
+    if perf is None:
+        return response
+    dur = time.perf_counter() - perf["t0"]
+    endpoint = _endpoint()
+    LATENCIA.observe((endpoint, request.method, str(response.status_code)), dur)
+    CONSULTAS.observe((endpoint,), perf["consultas"])
+    DB_SEGUNDOS.observe((endpoint,), perf["db"])
+
+    response.headers["Server-Timing"] = (
+        f'db;dur={perf["db"] * 1000:.1f};desc="{perf["consultas"]} consultas", app;dur={dur * 1000:.1f}'
+    )
+    if perf["perfil"] is not None:
+        pid = uuid.uuid4().hex[:12]
+        perfiles[pid] = perf["perfil"].stop()
+        response.headers["X-Profile-Id"] = pid
+
+    if dur * 1000 > Settings.SLOW_REQUEST_MS or perf["consultas"] > Settings.SLOW_REQUEST_CONSULTAS:
+        with _lentos_lock:
+            _lentos[endpoint] += 1
+        from flask import current_app
+        current_app.logger.warning(
+            "request lento: %s %s (%s) %.0f ms, %d consultas, %.0f ms en base",
+            request.method, request.full_path.rstrip("?"), endpoint, dur * 1000, perf["consultas"], perf["db"] * 1000,
+        )
+    return response
+
+def init_instrumentation(app):
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    with app.app_context():
+        from ..database import db
+        watch_engine(db.engine)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+# ---------- exposición ----------
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(nombres, valores, le: str | None = None) -> str:
+    pares = [f'{n}="{_escape(v)}"' for n, v in zip(nombres, valores)]
+    if le is not None:
+        pares.append(f'le="{le}"')
+    return "{" + ",".join(pares) + "}"
+
+def _render_hist(nombre: str, ayuda: str, hist: Histogram, nombres) -> list[str]:
+    out = [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} histogram"]
+    for labels, s in sorted(hist.snapshot().items()):
+        acum = 0
+        for b, n in zip(hist.buckets, s):
+            acum += n
+            out.append(f"{nombre}_bucket{_labels(nombres, labels, f'{b:g}')} {acum}")
+        acum += s[len(hist.buckets)]
+        out.append(f"{nombre}_bucket{_labels(nombres, labels, '+Inf')} {acum}")
+        out.append(f"{nombre}_sum{_labels(nombres, labels)} {s[-1]:.6f}")
+        out.append(f"{nombre}_count{_labels(nombres, labels)} {acum}")
+    return out
+
+def render_prometheus() -> str:
+    out = []
+    out += _render_hist("http_request_duration_seconds", "Latencia por endpoint.", LATENCIA,
+                        ("endpoint", "method", "status"))
+    out += _render_hist("http_request_db_queries", "Consultas SQL por request.", CONSULTAS, ("endpoint",))
+    out += _render_hist("http_request_db_seconds", "Tiempo en la base por request.", DB_SEGUNDOS, ("endpoint",))
+    out += ["# HELP http_slow_requests_total Requests sobre los umbrales de lentitud.",
+            "# TYPE http_slow_requests_total counter"]
+    with _lentos_lock:
+        out += [f"http_slow_requests_total{_labels(('endpoint',), (e,))} {n}" for e, n in sorted(_lentos.items())]
+    return "\n".join(out) + "\n"
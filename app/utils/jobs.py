@@ -0,0 +1,222 @@
+"""
+Trabajos en segundo plano sin broker: tabla jobs + un ProcessPoolExecutor por worker.
+
+El request valida, inserta la fila (pendiente) y encola el id en el pool; responde enseguida
+con el id. El proceso del pool (spawn, con su propia app y conexiones) corre la tarea
+registrada con @tarea, va guardando el progreso en la fila y al final deja el resultado:
+JSON chico en `resultado` y/o un archivo en JOBS_DIR, que vence a los JOBS_TTL_S.
+
+Cualquier worker de gunicorn puede responder el estado: todo está en la tabla. Si el
+worker que encoló muere, sus trabajos quedan sin terminar y purge_expired los pasa a
+error pasado JOBS_TIMEOUT_S.
+"""
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from pathlib import Path
+from sqlalchemy import create_engine, delete, func, select, update
+from sqlalchemy.exc import OperationalError
+from config import Settings
+from ..database import db
+from ..models import Job
+
+ACTIVOS = ("pendiente", "corriendo")
+PROGRESO_CADA_S = 1.0  # como mucho una escritura de progreso por segundo
+
+# tipo -> (fn(ctx, **params) -> dict | None, validar(params) -> params)
+TAREAS: dict = {}
+
+class LimiteTrabajos(RuntimeError):
+    """La empresa ya tiene JOBS_MAX_POR_EMPRESA trabajos activos."""
+
+def tarea(tipo: str, validar=None):
+    """
+    Registra una tarea. `validar(params)` corre en el request (puede usar current_user) y
+    devuelve los params limpios (JSON) o lanza ValueError; `fn(ctx, **params)` corre en el
+    pool y devuelve el `resultado` JSON (o None si sólo deja archivo).
+    """
+    def deco(fn):
+        TAREAS[tipo] = (fn, validar or (lambda params: params))
+        return fn
+    return deco
+
+_progreso_engine = None
+
+def _engine_progreso():
+    # conexión aparte: el progreso se confirma sin tocar la transacción de la tarea. En
+    # SQLite sin esperar el lock (lo tiene la lectura en curso de la propia tarea)
+    global _progreso_engine
+    if _progreso_engine is None:
+        url = db.engine.url
+        args = {"timeout": 0} if url.get_backend_name() == "sqlite" else {}
+        _progreso_engine = create_engine(url, connect_args=args, pool_size=1)
+    return _progreso_engine
+
+class Contexto:
+    """Lo que recibe la tarea: empresa y usuario, progreso y archivo de resultado."""
+
+    def __init__(self, job: Job):
+        self.job_id = job.id
+        self.company_slug = job.company_slug
+        self.creado_por = job.creado_por
+        self.archivo_path = None
+        self.nombre_archivo = None
+        self.mimetype = None
+        self._ultimo = 0.0
+
+    def progreso(self, fraccion: float, mensaje: str | None = None):
+        """Guarda el avance (0..1), como mucho una vez por PROGRESO_CADA_S."""
+        ahora = time.monotonic()
+        if ahora - self._ultimo < PROGRESO_CADA_S:
+            return
+        self._ultimo = ahora
+        valores = {"progreso": max(0.0, min(float(fraccion), 1.0))}
+        if mensaje is not None:
+            valores["mensaje"] = mensaje[:255]
+        try:
+            with _engine_progreso().begin() as conn:
+                conn.execute(update(Job).where(Job.id == self.job_id).values(**valores))
+        except OperationalError:
+            pass  # SQLite con la lectura de la tarea abierta: el progreso es informativo
+
+    def archivo(self, nombre: str, mimetype: str) -> Path:
+        """Ruta donde la tarea escribe su archivo de resultado (`nombre` es el de descarga)."""
+        carpeta = Path(Settings.JOBS_DIR)
+        carpeta.mkdir(parents=True, exist_ok=True)
+        self.archivo_path = carpeta / f"{self.job_id}{Path(nombre).suffix}"
+        self.nombre_archivo, self.mimetype = nombre, mimetype
+        return self.archivo_path
+
+# ---------- proceso del pool ----------
+_app = None
+
+def _init_proceso():
+    global _app
+    from .. import create_app
+    _app = create_app()
+
+def _terminar(job_id: str, estado: str, **valores):
+    ahora = datetime.utcnow()
+    db.session.execute(update(Job).where(Job.id == job_id).values(
+        estado=estado, finished_at=ahora, expires_at=ahora + timedelta(seconds=Settings.JOBS_TTL_S), **valores
+    ))
+    db.session.commit()
+
+def _ejecutar(job_id: str):
+    with _app.app_context():
+        job = db.session.get(Job, job_id)
+        if job is None or job.estado != "pendiente":
+            return
+        job.estado, job.started_at = "corriendo", datetime.utcnow()
+        db.session.commit()
+
+        fn, _ = TAREAS[job.tipo]
+        ctx = Contexto(job)
+        try:
+            resultado = fn(ctx, **job.params)
+        except Exception as e:
+            db.session.rollback()
+            _app.logger.exception("job %s (%s) falló", job_id, ctx.company_slug)
+            if ctx.archivo_path is not None:
+                ctx.archivo_path.unlink(missing_ok=True)
+            _terminar(job_id, "error", mensaje=str(e)[:255] or type(e).__name__)
+            return
+        db.session.rollback()  # lo que la tarea no haya confirmado no se guarda
+        _terminar(job_id, "listo", progreso=1.0, mensaje=None, resultado=resultado,
+                  archivo=str(ctx.archivo_path) if ctx.archivo_path else None,
+                  nombre_archivo=ctx.nombre_archivo, mimetype=ctx.mimetype)
+
+# ---------- worker web ----------
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def _get_pool(renovar: bool = False) -> ProcessPoolExecutor:
+    # uno por worker de gunicorn (con --preload el del proceso padre no sirve tras el fork)
+    global _pool, _pool_pid
+    with _pool_lock:
+        if renovar or _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=Settings.JOBS_WORKERS, initializer=_init_proceso,
+                                        mp_context=multiprocessing.get_context("spawn"))
+            _pool_pid = os.getpid()
+        return _pool
+
+def _submit(app, job_id: str):
+    try:
+        fut = _get_pool().submit(_ejecutar, job_id)
+    except BrokenProcessPool:
+        fut = _get_pool(renovar=True).submit(_ejecutar, job_id)
+
+    def terminado(f):
+        # el proceso murió o no pudo arrancar: la tarea no llegó a marcar el error
+        if f.exception() is not None:
+            with app.app_context():
+                _terminar(job_id, "error", mensaje=f"Proceso interrumpido: {f.exception()}"[:255])
+    fut.add_done_callback(terminado)
+
+_enqueue_lock = threading.Lock()
+
+def _bloquear_empresa(company_slug: str):
+    """
+    Hasta el commit/rollback, nadie más cuenta y agrega trabajos de la empresa: advisory
+    lock de la transacción en Postgres (entre workers). SELECT ... FOR UPDATE no alcanza:
+    con 0 activos no hay filas que bloquear. En SQLite (desarrollo) basta _enqueue_lock.
+    """
+    if db.engine.url.get_backend_name() == "postgresql":
+        db.session.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"jobs:{company_slug}"))))
+
+def enqueue(company_slug: str, tipo: str, params: dict, creado_por=None) -> Job:
+    """Inserta y encola el trabajo (con commit). LimiteTrabajos si la empresa está al tope."""
+    from flask import current_app
+    purge_expired()
+    with _enqueue_lock:
+        _bloquear_empresa(company_slug)
+        activos = db.session.execute(
+            select(func.count()).select_from(Job)
+            .where(Job.company_slug == company_slug, Job.estado.in_(ACTIVOS))
+        ).scalar()
+        if activos >= Settings.JOBS_MAX_POR_EMPRESA:
+            db.session.rollback()  # suelta el lock
+            raise LimiteTrabajos(f"Ya hay {activos} trabajos en curso; reintentá cuando terminen")
+
+        job = Job(id=uuid.uuid4().hex, company_slug=company_slug, tipo=tipo, params=params, creado_por=creado_por)
+        db.session.add(job)
+        db.session.commit()
+    _submit(current_app._get_current_object(), job.id)
+    return job
+
+def purge_expired(now: datetime | None = None) -> int:
+    """Da por perdidos los trabajos colgados y borra los vencidos (fila y archivo). Con commit."""
+    now = now or datetime.utcnow()
+    db.session.execute(
+        update(Job)
+        .where(Job.estado.in_(ACTIVOS), Job.created_at < now - timedelta(seconds=Settings.JOBS_TIMEOUT_S))
+        .values(estado="error", mensaje="Tiempo agotado", finished_at=now,
+                expires_at=now + timedelta(seconds=Settings.JOBS_TTL_S))
+    )
+    vencidos = db.session.execute(select(Job.id, Job.archivo).where(Job.expires_at < now)).all()
+    for _, archivo in vencidos:
+        if archivo:
+            Path(archivo).unlink(missing_ok=True)
+    if vencidos:
+        db.session.execute(delete(Job).where(Job.id.in_([job_id for job_id, _ in vencidos])))
+    db.session.commit()
+    return len(vencidos)
+
+def job_status(job: Job) -> dict:
+    from flask import url_for
+    fecha = lambda d: d.isoformat() + "Z" if d else None
+    out = {
+        "id": job.id, "tipo": job.tipo, "estado": job.estado, "progreso": job.progreso,
+        "mensaje": job.mensaje, "creado": fecha(job.created_at), "iniciado": fecha(job.started_at),
+        "terminado": fecha(job.finished_at), "vence": fecha(job.expires_at),
+        "estado_url": url_for("jobs.estado", job_id=job.id),
+    }
+    if job.estado == "listo":
+        out["resultado_url"] = url_for("jobs.resultado", job_id=job.id)
+    return out
@@ -0,0 +1,42 @@
+"""Paginación por keyset (cursor = valores de la última fila), sin OFFSET."""
+import base64
+import json
+from sqlalchemy import and_, or_
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str | None):
+    """Lista de valores del cursor, o None si falta o es inválido."""
+    if not token:
+        return None
+    try:
+        vals = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        return None
+    return vals if isinstance(vals, list) else None
+
+def keyset_order(col, id_col, desc: bool, reverse: bool = False):
+    """
+    ORDER BY (col, id) en la dirección pedida con NULLs al final.
+    reverse=True invierte todo (para ir a la página anterior).
+    """
+    if desc != reverse:
+        return [col.desc().nulls_first() if reverse else col.desc().nulls_last(), id_col.desc()]
+    return [col.asc().nulls_first() if reverse else col.asc().nulls_last(), id_col.asc()]
+
+def keyset_after(col, id_col, value, last_id, desc: bool, reverse: bool = False):
+    """
+    Filas posteriores a (value, last_id) en el orden de keyset_order (o anteriores si reverse).
+    """
+    mayor = (lambda a, b: a < b) if desc != reverse else (lambda a, b: a > b)
+    if not reverse:
+        # NULLs al final: después de un valor vienen los NULL; después de un NULL sólo NULLs
+        if value is None:
+            return and_(col.is_(None), mayor(id_col, last_id))
+        return or_(mayor(col, value), and_(col == value, mayor(id_col, last_id)), col.is_(None))
+    # orden invertido: los NULL vienen primero
+    if value is None:
+        return or_(col.is_not(None), mayor(id_col, last_id))
+    return and_(col.is_not(None), or_(mayor(col, value), and_(col == value, mayor(id_col, last_id))))
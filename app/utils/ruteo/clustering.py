@@ -0,0 +1,99 @@
+"""
+Clustering geográfico balanceado (vectorizado con NumPy).
+
+Las coordenadas se proyectan a km con una equirectangular local, suficiente para
+agrupar dentro de un país; las iteraciones recorren clusters, nunca locales.
+"""
+import numpy as np
+
+KM_POR_GRADO_LAT = 110.574
+KM_POR_GRADO_LON = 111.320
+
+def project_km(lat, lon, lat0: float | None = None) -> np.ndarray:
+    """(lat, lon) en grados -> (n, 2) en km alrededor de lat0."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if lat0 is None:
+        lat0 = float(lat.mean()) if lat.size else 0.0
+    return np.column_stack([lon * KM_POR_GRADO_LON * np.cos(np.radians(lat0)), lat * KM_POR_GRADO_LAT])
+
+def sq_dist(X: np.ndarray, C: np.ndarray) -> np.ndarray:
+    """Distancias euclídeas al cuadrado (n x k)."""
+    return ((X[:, None, :] - C[None, :, :]) ** 2).sum(axis=2)
+
+def kmeans_pp_init(X: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    n = X.shape[0]
+    C = np.empty((k, X.shape[1]), dtype=np.float64)
+    C[0] = X[rng.integers(n)]
+    d2 = ((X - C[0]) ** 2).sum(axis=1)
+    for j in range(1, k):
+        total = d2.sum()
+        idx = rng.integers(n) if total <= 0 else rng.choice(n, p=d2 / total)
+        C[j] = X[idx]
+        d2 = np.minimum(d2, ((X - C[j]) ** 2).sum(axis=1))
+    return C
+
+def capacitated_assign(cost: np.ndarray, capacity, weights=None) -> np.ndarray:
+    """
+    Asigna cada fila a una columna minimizando `cost` sin superar `capacity` (suma de `weights`).
+    Rondas de propuestas: cada pendiente propone a su mejor columna abierta; cada columna acepta
+    las más baratas que entren y se cierra si rechazó alguna. A lo sumo k+1 rondas.
+    Si no quedan columnas abiertas, los sobrantes van a su mejor opción (desborde).
+    Filas con costo infinito en todas las columnas quedan en -1.
+    """
+    n, k = cost.shape
+    w = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    cap = np.asarray(capacity, dtype=np.float64).copy()
+    labels = np.full(n, -1, dtype=np.intp)
+    viable = np.isfinite(cost).any(axis=1)
+
+    while True:
+        pend = np.flatnonzero((labels < 0) & viable)
+        if pend.size == 0:
+            break
+        sub = cost[pend].copy()
+        sub[:, cap <= 0] = np.inf
+        sin_lugar = ~np.isfinite(sub).any(axis=1)
+        if sin_lugar.all():
+            labels[pend] = np.argmin(cost[pend], axis=1)
+            break
+        pend, sub = pend[~sin_lugar], sub[~sin_lugar]
+        choice = np.argmin(sub, axis=1)
+        for j in np.unique(choice):
+            cand = pend[choice == j]
+            cand = cand[np.argsort(cost[cand, j], kind="stable")]
+            entra = np.cumsum(w[cand]) <= cap[j] + 1e-9
+            tomados = cand[entra]
+            labels[tomados] = j
+            cap[j] -= w[tomados].sum()
+            if not entra.all():
+                cap[j] = 0.0
+    return labels
+
+def balanced_kmeans(X: np.ndarray, k: int, weights=None, *, tolerancia: float = 0.05,
+                    iters: int = 25, seed: int = 0, init: np.ndarray | None = None):
+    """
+    K-means capacitado: clusters compactos cuya suma de `weights` no supera
+    (total / k) * (1 + tolerancia). Devuelve (labels, centroides).
+    """
+    n = X.shape[0]
+    if n == 0:
+        return np.empty(0, dtype=np.intp), np.empty((0, X.shape[1]))
+    k = max(1, min(k, n))
+    w = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    C = kmeans_pp_init(X, k, rng) if init is None else np.asarray(init, dtype=np.float64).copy()
+    cap = np.full(k, max(w.sum() / k * (1.0 + tolerancia), w.max()))
+
+    labels = None
+    for _ in range(iters):
+        nuevos = capacitated_assign(sq_dist(X, C), cap, w)
+        if labels is not None and np.array_equal(nuevos, labels):
+            break
+        labels = nuevos
+        sums = np.zeros_like(C)
+        np.add.at(sums, labels, X * w[:, None])
+        tot = np.bincount(labels, weights=w, minlength=k)
+        vacio = tot <= 0
+        C[~vacio] = sums[~vacio] / tot[~vacio, None]
+    return labels, C
@@ -0,0 +1,175 @@
+"""
+Edición incremental de rutas guardadas.
+
+Las paradas se manejan como [(detalle_id, local_id)] en orden de recorrido (detalle_id
+None = parada nueva). Después de aplicar las operaciones (o de emparejar una lista
+completa con la guardada) sólo se escriben las filas que cambian: UPDATE de `orden`
+para las que se corrieron, INSERT de las agregadas y DELETE de las quitadas. Subir o
+bajar una parada escribe dos filas, no la ruta entera.
+
+La concurrencia se resuelve con Ruta.version: cada escritura hace
+UPDATE ... SET version = version + 1 WHERE version = <leída>; si no toca ninguna fila,
+otro despachador guardó antes y la edición se rechaza (409).
+
+replace_week reescribe semanas enteras (PUT /semana, plan semanal) con la misma lógica:
+las rutas que siguen conservan su id y suben de versión, así una edición abierta sobre
+la semana anterior recibe 409 en vez de aplicarse sobre el contenido nuevo.
+"""
+from collections import defaultdict
+from sqlalchemy import bindparam, delete, insert, select, update
+from ...database import db
+from ...models import Ruta, RutaDetalle
+
+OPS = ("insert", "remove", "move")
+
+class OperacionInvalida(ValueError):
+    """Operación mal formada o fuera de rango para la ruta actual."""
+
+def load_stops(company_slug: str, ruta_id: int) -> list[tuple[int, str]]:
+    return [tuple(r) for r in db.session.execute(
+        select(RutaDetalle.id, RutaDetalle.local_id)
+        .where(RutaDetalle.company_slug == company_slug, RutaDetalle.ruta_id == ruta_id)
+        .order_by(RutaDetalle.orden)
+    ).all()]
+
+def _pos(op: dict, clave: str, maximo: int) -> int:
+    try:
+        pos = int(op[clave])
+    except (KeyError, TypeError, ValueError):
+        raise OperacionInvalida(f"{op.get('op')}: falta '{clave}' (entero)") from None
+    if not 1 <= pos <= maximo:
+        raise OperacionInvalida(f"{op.get('op')}: '{clave}' fuera de rango (1..{maximo})")
+    return pos
+
+def _verificar(op: dict, paradas: list, pos: int):
+    # remove/move con local_id: la parada en esa posición tiene que ser ese local
+    if op.get("local_id") is not None and str(op["local_id"]) != paradas[pos - 1][1]:
+        raise OperacionInvalida(f"{op['op']}: en la posición {pos} no está {op['local_id']}")
+
+def apply_ops(paradas: list, ops: list) -> list:
+    """
+    Aplica en orden (posiciones 1..N, según el estado después de la operación anterior):
+      {"op": "insert", "local_id": "x", "pos": p}   # p en 1..N+1, por defecto al final
+      {"op": "remove", "pos": p}
+      {"op": "move", "desde": p, "hasta": q}
+    """
+    out = list(paradas)
+    for op in ops:
+        if not isinstance(op, dict) or op.get("op") not in OPS:
+            raise OperacionInvalida(f"Operación inválida: {op!r} (válidas: {', '.join(OPS)})")
+        if op["op"] == "insert":
+            local_id = op.get("local_id")
+            if local_id in (None, ""):
+                raise OperacionInvalida("insert: falta 'local_id'")
+            local_id = str(local_id)
+            if any(l == local_id for _, l in out):
+                raise OperacionInvalida(f"insert: {local_id} ya está en la ruta")
+            pos = _pos(op, "pos", len(out) + 1) if op.get("pos") is not None else len(out) + 1
+            out.insert(pos - 1, (None, local_id))
+        elif op["op"] == "remove":
+            pos = _pos(op, "pos", len(out))
+            _verificar(op, out, pos)
+            del out[pos - 1]
+        else:
+            desde = _pos(op, "desde", len(out))
+            hasta = _pos(op, "hasta", len(out))
+            _verificar(op, out, desde)
+            out.insert(hasta - 1, out.pop(desde - 1))
+    return out
+
+def match_stops(paradas: list, local_ids: list) -> list:
+    """Lista completa de local_ids -> [(detalle_id, local_id)] reusando las filas guardadas del mismo local."""
+    libres = defaultdict(list)
+    for detalle_id, local_id in reversed(paradas):
+        libres[local_id].append(detalle_id)
+    return [(libres[l].pop() if libres[l] else None, l) for l in map(str, local_ids)]
+
+def write_stops(company_slug: str, ruta_id: int, antes: list, despues: list) -> int:
+    """Escribe la diferencia entre `antes` y `despues` (sin commit). Devuelve las filas escritas."""
+    orden_antes = {detalle_id: i for i, (detalle_id, _) in enumerate(antes, start=1)}
+    quedan = {detalle_id for detalle_id, _ in despues if detalle_id is not None}
+    borrar = [d for d in orden_antes if d not in quedan]
+    mover = [{"b_id": d, "b_orden": i} for i, (d, _) in enumerate(despues, start=1)
+             if d is not None and orden_antes.get(d) != i]
+    nuevas = [{"company_slug": company_slug, "ruta_id": ruta_id, "orden": i, "local_id": l}
+              for i, (d, l) in enumerate(despues, start=1) if d is None]
+
+    if borrar:
+        db.session.execute(delete(RutaDetalle).where(RutaDetalle.company_slug == company_slug,
+                                                     RutaDetalle.id.in_(borrar)))
+    if mover:
+        t = RutaDetalle.__table__
+        db.session.execute(update(t).where(t.c.id == bindparam("b_id")).values(orden=bindparam("b_orden")), mover)
+    if nuevas:
+        db.session.execute(insert(RutaDetalle), nuevas)
+    return len(borrar) + len(mover) + len(nuevas)
+
+def bump_version(company_slug: str, ruta_id: int, version: int, **valores) -> bool:
+    """
+    Compare-and-set de la versión (más `valores` sobre la ruta; invalida sus métricas).
+    False si la ruta no existe o ya no está en `version`. Sin commit.
+    """
+    res = db.session.execute(
+        update(Ruta)
+        .where(Ruta.id == ruta_id, Ruta.company_slug == company_slug, Ruta.version == version)
+        .values(version=Ruta.version + 1, metricas_version=None, **valores)
+    )
+    return res.rowcount == 1
+
+def replace_week(company: str, dias: list, plan: dict, cerrado: bool, depot_id, creado_por,
+                 opciones: dict | None = None) -> dict:
+    """
+    Deja las rutas de `dias` como `plan` {(fecha, turno): [local_id, ...]}. Las que ya
+    existen se actualizan en el lugar (mismo id, versión + 1, sólo las paradas que cambian),
+    las que faltan se crean y las de turnos que no están en el plan se borran.
+    `opciones` {(fecha, turno): {"cerrado", "depot_id"}} pisa los valores comunes por ruta.
+    Devuelve {(fecha, turno): ruta_id}. No hace commit: el llamador decide la transacción.
+    """
+    opciones = opciones or {}
+    existentes = {
+        (fecha, turno): ruta_id
+        for ruta_id, fecha, turno in db.session.execute(
+            select(Ruta.id, Ruta.fecha, Ruta.turno).where(Ruta.company_slug == company, Ruta.fecha.in_(dias))
+        )
+    }
+    sobran = [ruta_id for key, ruta_id in existentes.items() if key not in plan]
+    if sobran:
+        db.session.execute(delete(RutaDetalle).where(RutaDetalle.company_slug == company,
+                                                     RutaDetalle.ruta_id.in_(sobran)))
+        db.session.execute(delete(Ruta).where(Ruta.company_slug == company, Ruta.id.in_(sobran)))
+
+    def valores(key) -> dict:
+        op = opciones.get(key, {})
+        return {"cerrado": op.get("cerrado", cerrado), "depot_id": op.get("depot_id", depot_id)}
+
+    nuevas = {key: Ruta(company_slug=company, fecha=key[0], turno=key[1], creado_por=creado_por, **valores(key))
+              for key in plan if key not in existentes}
+    db.session.add_all(nuevas.values())
+    db.session.flush()
+
+    reusadas = [existentes[key] for key in plan if key in existentes]
+    if reusadas:
+        t = Ruta.__table__
+        db.session.execute(
+            update(t).where(t.c.id == bindparam("b_id")).values(
+                version=t.c.version + 1, metricas_version=None,
+                cerrado=bindparam("b_cerrado"), depot_id=bindparam("b_depot")),
+            [{"b_id": existentes[key], "b_cerrado": valores(key)["cerrado"], "b_depot": valores(key)["depot_id"]}
+             for key in plan if key in existentes],
+        )
+    guardadas = defaultdict(list)
+    if reusadas:
+        for ruta_id, detalle_id, local_id in db.session.execute(
+            select(RutaDetalle.ruta_id, RutaDetalle.id, RutaDetalle.local_id)
+            .where(RutaDetalle.company_slug == company, RutaDetalle.ruta_id.in_(reusadas))
+            .order_by(RutaDetalle.ruta_id, RutaDetalle.orden)
+        ):
+            guardadas[ruta_id].append((detalle_id, local_id))
+
+    rutas = {}
+    for key, paradas in plan.items():
+        ruta_id = existentes[key] if key in existentes else nuevas[key].id
+        antes = guardadas.get(ruta_id, [])
+        write_stops(company, ruta_id, antes, match_stops(antes, paradas))
+        rutas[key] = ruta_id
+    return rutas
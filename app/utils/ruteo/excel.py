@@ -1,26 +1,96 @@
+"""
+Exportación de rutas guardadas (XLSX / CSV) sin N+1 y sin armar todo en memoria.
+
+Una sola consulta (rutas + detalles + locales) leída por lotes; las filas van
+directo a un workbook openpyxl en modo write_only o a un CSV, escritos a archivo
+(utils/ruteo/tareas.py los corre como trabajo en segundo plano).
+"""
+import csv
 import io
-import pandas as pd
+import tempfile
+from sqlalchemy import and_, func, select
+from ...database import db
 from ...models import Ruta, RutaDetalle, Local
+from .metrics import duracion_min
+
+COLUMNAS = ["Fecha", "Turno", "N° Parada", "ID Sucursal", "Nombre Sucursal", "Lat", "Lon",
+            "Km Ruta", "Duración Ruta (min)", "Venta Ruta"]
+BATCH = 2000
+SPOOL_MAX_BYTES = 8 * 1024 * 1024  # por encima, el xlsx se escribe a disco
+
+def export_rows(company_slug: str, desde, hasta):
+    """
+    Filas (fecha, turno, orden, local_id, nombre, lat, lon, km, duración, venta) ordenadas,
+    leídas por lotes. Las métricas de ruta salen de la caché de Ruta: el llamador debe
+    refrescarlas antes (metrics.refresh_metrics).
+    """
+    stmt = (
+        select(Ruta.fecha, Ruta.turno, RutaDetalle.orden, RutaDetalle.local_id,
+               Local.name, Local.lat, Local.lon,
+               Ruta.metricas_km, Ruta.metricas_paradas, Ruta.metricas_venta)
+        .join(RutaDetalle, and_(RutaDetalle.company_slug == company_slug, RutaDetalle.ruta_id == Ruta.id))
+        .outerjoin(Local, and_(Local.company_slug == company_slug, Local.id == RutaDetalle.local_id))
+        .where(Ruta.company_slug == company_slug, Ruta.fecha >= desde, Ruta.fecha <= hasta)
+        .order_by(Ruta.fecha, Ruta.turno, RutaDetalle.orden)
+        .execution_options(yield_per=BATCH)
+    )
+    for fecha, turno, orden, local_id, name, lat, lon, km, n, venta in db.session.execute(stmt):
+        yield (fecha.isoformat(), turno, orden, local_id, name or "",
+               "" if lat is None else lat, "" if lon is None else lon,
+               "" if km is None else round(km, 2),
+               "" if km is None else round(duracion_min(km, n or 0)),
+               "" if venta is None else float(venta))
+
+def count_rows(company_slug: str, desde, hasta) -> int:
+    """Cantidad de filas que devuelve export_rows (para el progreso)."""
+    return db.session.execute(
+        select(func.count()).select_from(RutaDetalle)
+        .join(Ruta, and_(Ruta.id == RutaDetalle.ruta_id, Ruta.company_slug == company_slug))
+        .where(RutaDetalle.company_slug == company_slug, Ruta.fecha >= desde, Ruta.fecha <= hasta)
+    ).scalar()
+
+def write_xlsx(rows, por_dia: bool = False, out=None):
+    """
+    Workbook write_only con una hoja "Ruteo" o una hoja por día (por_dia=True), guardado
+    en `out` (ruta o archivo). Sin `out`, un archivo temporal posicionado al inicio.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    if not por_dia:
+        ws = wb.create_sheet("Ruteo")
+        ws.append(COLUMNAS)
+        for row in rows:
+            ws.append(row)
+    else:
+        ws, dia = None, None
+        for row in rows:
+            if row[0] != dia:
+                dia = row[0]
+                ws = wb.create_sheet(dia)
+                ws.append(COLUMNAS)
+            ws.append(row)
+        if ws is None:
+            wb.create_sheet("Ruteo").append(COLUMNAS)
+
+    if out is not None:
+        wb.save(out)
+        return out
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    wb.save(out)
+    out.seek(0)
+    return out
 
-def build_excel_bytes(rutas: list[Ruta]) -> io.BytesIO:
-    rows = []
-    for r in rutas:
-        for det in r.detalles:
-            loc = Local.query.get(det.local_id)
-            rows.append({
-                "Fecha": r.fecha.isoformat(),
-                "Turno": r.turno,
-                "N° Parada": det.orden,
-                "ID Sucursal": det.local_id,
-                "Nombre Sucursal": loc.name if loc else "",
-                "Lat": loc.lat if loc else "",
-                "Lon": loc.lon if loc else ""
-            })
-    df = pd.DataFrame(rows)
-    if df.empty:
-        df = pd.DataFrame(columns=["Fecha","Turno","N° Parada","ID Sucursal","Nombre Sucursal","Lat","Lon"])
-    buf = io.BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as xw:
-        df.to_excel(xw, index=False, sheet_name="Ruteo")
-    buf.seek(0)
-    return buf
+def iter_csv(rows):
+    """CSV (UTF-8 con BOM para Excel) en trozos de BATCH filas."""
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    buf.write("﻿")
+    w.writerow(COLUMNAS)
+    for i, row in enumerate(rows, 1):
+        w.writerow(row)
+        if i % BATCH == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
@@ -0,0 +1,106 @@
+"""
+Geohash (vectorizado) para indexar locales en la base y consultar por bbox.
+
+Un bbox se cubre con celdas de geohash; las celdas contiguas en orden Z se
+fusionan en rangos, así cada rango es un único scan sobre el índice
+(company_slug, geohash).
+"""
+import numpy as np
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_ARR = np.array(list(BASE32))
+GEOHASH_PRECISION = 9  # ~4.8 m x 4.8 m
+
+def _bits(precision: int) -> tuple[int, int]:
+    """(bits_lon, bits_lat) para una precisión (el primer bit es de longitud)."""
+    total = 5 * precision
+    return (total + 1) // 2, total // 2
+
+def _cell_ints(lat, lon, precision: int):
+    blon, blat = _bits(precision)
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -90.0, 90.0)
+    lon = np.clip(np.asarray(lon, dtype=np.float64), -180.0, 180.0)
+    x = np.minimum(((lon + 180.0) / 360.0 * (1 << blon)).astype(np.int64), (1 << blon) - 1)
+    y = np.minimum(((lat + 90.0) / 180.0 * (1 << blat)).astype(np.int64), (1 << blat) - 1)
+    return x, y
+
+def _interleave(x, y, precision: int):
+    """Entero de 5*precision bits con los bits de lon/lat intercalados (lon primero)."""
+    blon, blat = _bits(precision)
+    code = np.zeros(np.shape(x), dtype=np.int64)
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            bit = (x >> (blon - 1 - i // 2)) & 1
+        else:
+            bit = (y >> (blat - 1 - i // 2)) & 1
+        code = (code << 1) | bit
+    return code
+
+def _to_str(code, precision: int) -> np.ndarray:
+    code = np.atleast_1d(np.asarray(code, dtype=np.int64))
+    chars = [_BASE32_ARR[(code >> (5 * (precision - 1 - i))) & 31] for i in range(precision)]
+    out = chars[0]
+    for c in chars[1:]:
+        out = np.char.add(out, c)
+    return out
+
+def geohash_encode_many(lat, lon, precision: int = GEOHASH_PRECISION) -> np.ndarray:
+    x, y = _cell_ints(lat, lon, precision)
+    return _to_str(_interleave(x, y, precision), precision)
+
+def geohash_encode(lat, lon, precision: int = GEOHASH_PRECISION) -> str | None:
+    if lat is None or lon is None:
+        return None
+    return str(geohash_encode_many([lat], [lon], precision)[0])
+
+def precision_for_bbox(bbox, max_cells: int = 64) -> int:
+    """Mayor precisión cuya cobertura del bbox no supera `max_cells` celdas."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    for p in range(GEOHASH_PRECISION, 0, -1):
+        blon, blat = _bits(p)
+        nx = (max_lon - min_lon) / (360.0 / (1 << blon)) + 2
+        ny = (max_lat - min_lat) / (180.0 / (1 << blat)) + 2
+        if nx * ny <= max_cells:
+            return p
+    return 1
+
+def bbox_ranges(bbox, max_cells: int = 64) -> list[tuple[str, str]]:
+    """
+    Rangos [desde, hasta) de geohash que cubren el bbox (min_lon, min_lat, max_lon, max_lat).
+    Para filtrar: geohash >= desde AND geohash < hasta.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    p = precision_for_bbox(bbox, max_cells)
+    x0, y0 = _cell_ints(min_lat, min_lon, p)
+    x1, y1 = _cell_ints(max_lat, max_lon, p)
+    xs, ys = np.meshgrid(np.arange(x0, x1 + 1), np.arange(y0, y1 + 1))
+    codes = np.unique(_interleave(xs.ravel(), ys.ravel(), p))
+
+    # fusionar celdas consecutivas en orden Z
+    cortes = np.flatnonzero(np.diff(codes) != 1) + 1
+    inicios = np.concatenate([[codes[0]], codes[cortes]])
+    finales = np.concatenate([codes[cortes - 1], [codes[-1]]])
+    desde = _to_str(inicios, p)
+    ultimo = (1 << (5 * p)) - 1
+    hasta = [str(s) for s in _to_str(np.minimum(finales + 1, ultimo), p)]
+    hasta = [h if f < ultimo else "{" for h, f in zip(hasta, finales)]  # "{" > "z" en ASCII
+    return list(zip((str(d) for d in desde), hasta))
+
+def cluster_precision(zoom: int) -> int:
+    """Precisión de agrupamiento según zoom (zoom 6 -> 3 ... zoom 12 -> 6)."""
+    return max(2, min(7, (zoom - 1) // 2 + 1))
+
+def parse_bbox(raw: str | None):
+    """ "min_lon,min_lat,max_lon,max_lat" -> tupla de floats, o None si es inválido."""
+    if not raw:
+        return None
+    try:
+        vals = tuple(float(v) for v in raw.split(","))
+    except ValueError:
+        return None
+    if len(vals) != 4:
+        return None
+    min_lon, min_lat, max_lon, max_lat = vals
+    if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        return None
+    return vals
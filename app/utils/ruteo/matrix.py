@@ -0,0 +1,288 @@
+"""
+Matriz de distancias (km) de una ruta: locales y centros logísticos.
+
+Sin red vial (roads.py) se calcula al vuelo en línea recta: son k x k pares de la ruta,
+no hace falta guardar nada.
+
+Con red vial, por empresa se guardan en <Settings.CACHE_DIR>/matrices/<company_slug>/ los
+costos por calle de cada punto a sus vecinos, en forma dispersa (O(n·K), no n x n):
+  - meta.npz    : claves ("L:<local_id>" / "D:<depot_id>"), coordenadas de cada slot y
+                  versión del grafo con que se calcularon
+  - vecinos.npy : (capacidad x MATRIZ_VECINOS) int32, slots de los más cercanos dentro de
+                  MATRIZ_RADIO_KM (-1 = vacío)
+  - ida.npy / vuelta.npy : km por calle slot -> vecino y vecino -> slot (float32)
+todos abiertos con memmap. Cada alta/edición calcula sólo la fila del punto (dos Dijkstra
+acotados) y descarta las entradas que lo apuntaban; las bajas liberan el slot. En la
+matriz de una ruta, los pares lejanos (fuera de la fila de uno y otro) van en línea
+recta por FACTOR_DESVIO: un buen recorrido no los usa como tramo.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+from config import Settings
+from ..cache import LRUCache
+from .optimizer import haversine_cross
+from .roads import FACTOR_DESVIO, get_road_graph
+
+try:
+    import fcntl
+except ImportError:  # Windows (desarrollo local): sin lock entre procesos
+    fcntl = None
+
+def local_key(local_id) -> str:
+    return f"L:{local_id}"
+
+def depot_key(depot_id) -> str:
+    return f"D:{depot_id}"
+
+class RoadCostCache:
+    MIN_CAPACITY = 64
+    # nombre -> (dtype, valor de una entrada vacía)
+    ARRAYS = {"vecinos": (np.int32, -1), "ida": (np.float32, np.nan), "vuelta": (np.float32, np.nan)}
+
+    def __init__(self, company_slug: str, base_dir):
+        self.company_slug = company_slug
+        self.dir = Path(base_dir) / "matrices" / company_slug
+        self.meta_path = self.dir / "meta.npz"
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._version = None
+        self.red = ""
+        self.keys: list[str] = []
+        self.index: dict[str, int] = {}
+        self.coords = np.empty((0, 2), dtype=np.float64)
+        self.vecinos = self.ida = self.vuelta = None
+
+    def _path(self, nombre: str) -> Path:
+        return self.dir / f"{nombre}.npy"
+
+    # ---------- persistencia ----------
+    @contextmanager
+    def _file_lock(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.dir / ".lock", "a+") as fh:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _reload(self):
+        """Relee meta y arrays si otro worker los modificó."""
+        try:
+            st = self.meta_path.stat()
+        except FileNotFoundError:
+            if self._version is not None:
+                self._reset()
+            return
+        version = (st.st_mtime_ns, st.st_size)
+        if version == self._version:
+            return
+        with np.load(self.meta_path, allow_pickle=False) as meta:
+            if "red" not in meta.files:  # caché densa anterior: se descarta al escribir
+                self._reset()
+                return
+            self.keys = [str(k) for k in meta["keys"]]
+            self.coords = meta["coords"].astype(np.float64)
+            self.red = str(meta["red"])
+        self.index = {k: i for i, k in enumerate(self.keys) if k}
+        for nombre in self.ARRAYS:
+            setattr(self, nombre, np.load(self._path(nombre), mmap_mode="r+") if self.keys else None)
+        self._version = version
+
+    def _save_meta(self):
+        tmp = self.dir / "meta.tmp.npz"
+        np.savez(tmp, keys=np.array(self.keys, dtype=str), coords=self.coords, red=np.array(self.red))
+        os.replace(tmp, self.meta_path)
+        st = self.meta_path.stat()
+        self._version = (st.st_mtime_ns, st.st_size)
+
+    def _vigente(self, red: str) -> bool:
+        return self.red == red and (self.vecinos is None or self.vecinos.shape[1] == Settings.MATRIZ_VECINOS)
+
+    def _clear(self, red: str):
+        """Otro grafo (u otro MATRIZ_VECINOS, o la matriz densa anterior): se empieza de cero."""
+        self._reset()
+        for f in self.dir.glob("*.npy"):
+            f.unlink()
+        self.red = red
+
+    def _grow(self, needed: int):
+        cap = len(self.keys)
+        if needed <= cap:
+            return
+        new_cap = max(self.MIN_CAPACITY, needed, int(cap * 1.5))
+        for nombre, (dtype, vacio) in self.ARRAYS.items():
+            tmp = self.dir / f"{nombre}.tmp.npy"
+            nuevo = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype,
+                                              shape=(new_cap, Settings.MATRIZ_VECINOS))
+            nuevo[:] = vacio
+            if cap:
+                nuevo[:cap] = getattr(self, nombre)[:cap]
+            nuevo.flush()
+            del nuevo
+            setattr(self, nombre, None)
+            os.replace(tmp, self._path(nombre))
+            setattr(self, nombre, np.load(self._path(nombre), mmap_mode="r+"))
+        self.keys.extend([""] * (new_cap - cap))
+        self.coords = np.vstack([self.coords, np.full((new_cap - cap, 2), np.nan)])
+
+    def _flush(self):
+        for nombre in self.ARRAYS:
+            getattr(self, nombre).flush()
+
+    def _vaciar(self, slots):
+        """Borra las filas de `slots` y las entradas de otras filas que los apuntan (sin flush)."""
+        for nombre, (_, vacio) in self.ARRAYS.items():
+            getattr(self, nombre)[slots] = vacio
+        apuntan = np.isin(self.vecinos, slots)
+        if apuntan.any():
+            self.vecinos[apuntan] = -1
+
+    # ---------- API ----------
+    def ensure(self, points, red) -> np.ndarray:
+        """
+        `points`: iterable de (clave, lat, lon); `red`: RoadGraph. Calcula la fila de los que
+        falten o cuyas coordenadas cambiaron y devuelve el slot de cada uno.
+        """
+        points = list(points)
+        version = str(red.version)
+        with self._lock:
+            self._reload()
+            if not self._vigente(version) or self._stale(points):
+                with self._file_lock():
+                    self._reload()
+                    if not self._vigente(version):
+                        self._clear(version)
+                    self._upsert(self._stale(points), red)
+            return np.array([self.index[k] for k, _, _ in points], dtype=np.intp)
+
+    def _stale(self, points) -> list:
+        out = {}
+        for key, lat, lon in points:
+            i = self.index.get(key)
+            if i is None or self.coords[i, 0] != lat or self.coords[i, 1] != lon:
+                out[key] = (key, float(lat), float(lon))
+        return list(out.values())
+
+    def _upsert(self, points, red):
+        if not points:
+            return
+        libres = [i for i, k in enumerate(self.keys) if not k]
+        nuevos = sum(1 for k, _, _ in points if k not in self.index)
+        if nuevos > len(libres):
+            self._grow(len(self.keys) - len(libres) + nuevos)
+            libres = [i for i, k in enumerate(self.keys) if not k]
+        libres.reverse()
+
+        # primero todos los slots, así los puntos nuevos se ven entre sí como vecinos
+        slots = []
+        for key, lat, lon in points:
+            i = self.index.get(key)
+            if i is None:
+                i = libres.pop()
+                self.keys[i] = key
+                self.index[key] = i
+            self.coords[i] = (lat, lon)
+            slots.append(i)
+        self._vaciar(np.array(slots, dtype=np.intp))
+
+        activos = np.array(sorted(self.index.values()), dtype=np.intp)
+        K = Settings.MATRIZ_VECINOS
+        for i in slots:
+            lat, lon = self.coords[i]
+            km = haversine_cross([lat], [lon], self.coords[activos, 0], self.coords[activos, 1])[0]
+            cerca = np.flatnonzero((km <= Settings.MATRIZ_RADIO_KM) & (activos != i))
+            cerca = cerca[np.argsort(km[cerca], kind="stable")[:K]]
+            vecinos = activos[cerca]
+            ida, vuelta = red.one_to_many(lat, lon, self.coords[vecinos, 0], self.coords[vecinos, 1])
+            self.vecinos[i, :len(vecinos)] = vecinos
+            self.ida[i, :len(vecinos)] = ida
+            self.vuelta[i, :len(vecinos)] = vuelta
+        self._flush()
+        self._save_meta()
+
+    def remove(self, key: str):
+        with self._lock, self._file_lock():
+            self._reload()
+            i = self.index.pop(key, None)
+            if i is None:
+                return
+            self.keys[i] = ""
+            self.coords[i] = (np.nan, np.nan)
+            self._vaciar(np.array([i], dtype=np.intp))
+            self._flush()
+            self._save_meta()
+
+    def submatrix(self, points, red) -> np.ndarray:
+        """Matriz (k x k) en km para los puntos pedidos, en el mismo orden."""
+        idx = self.ensure(points, red)
+        k = len(idx)
+        with self._lock:
+            coords = self.coords[idx]
+            V = np.asarray(self.vecinos[idx])
+            ida, vuelta = np.asarray(self.ida[idx]), np.asarray(self.vuelta[idx])
+        dist = haversine_cross(coords[:, 0], coords[:, 1], coords[:, 0], coords[:, 1]) * FACTOR_DESVIO
+        # pares guardados: V[a, p] = slot de un vecino de a; si está en la ruta, su posición
+        orden = np.argsort(idx, kind="stable")
+        p = np.minimum(np.searchsorted(idx[orden], V), max(k - 1, 0))
+        ok = (V >= 0) & (idx[orden][p] == V)
+        filas, cols = np.nonzero(ok)[0], orden[p[ok]]
+        dist[filas, cols] = ida[ok]
+        dist[cols, filas] = vuelta[ok]
+        np.fill_diagonal(dist, 0.0)
+        return dist
+
+# una por empresa; las desalojadas sólo sueltan los memmaps (los archivos quedan en disco)
+_caches = LRUCache(maxsize=Settings.TENANT_CACHE_MAX)
+_caches_lock = threading.Lock()
+
+def get_matrix_cache(company_slug: str) -> RoadCostCache:
+    with _caches_lock:
+        cache = _caches.get(company_slug)
+        if cache is None:
+            cache = RoadCostCache(company_slug, Settings.CACHE_DIR)
+            _caches[company_slug] = cache
+        return cache
+
+def local_point(l) -> tuple:
+    return (local_key(l.id), float(l.lat), float(l.lon))
+
+def depot_point(d) -> tuple:
+    return (depot_key(d.id), float(d.lat), float(d.lon))
+
+def route_matrix(company_slug: str, depot, locales) -> np.ndarray:
+    """
+    Matriz con el depósito en el índice 0 y los locales en 1..n (mismo orden recibido).
+    Sin depósito, el nodo 0 queda a distancia 0 de todos (inicio libre).
+    Con red vial los km entre vecinos son por calle (caché dispersa); si no, en línea recta.
+    """
+    pts = ([depot_point(depot)] if depot is not None else []) + [local_point(l) for l in locales]
+    red = get_road_graph()
+    if red is not None:
+        dist = get_matrix_cache(company_slug).submatrix(pts, red)
+    else:
+        lat = [p[1] for p in pts]
+        lon = [p[2] for p in pts]
+        dist = haversine_cross(lat, lon, lat, lon)
+    if depot is None:
+        dist = np.pad(dist, ((1, 0), (1, 0)))
+    return dist
+
+def refresh_local(l):
+    """Recalcula la fila del local (o lo quita si quedó inactivo)."""
+    cache = get_matrix_cache(l.company_slug)
+    red = get_road_graph()
+    if l.active and red is not None:
+        cache.ensure([local_point(l)], red)
+    elif not l.active:
+        cache.remove(local_key(l.id))
+
+def drop_local(company_slug: str, local_id):
+    get_matrix_cache(company_slug).remove(local_key(local_id))
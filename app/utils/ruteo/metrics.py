@@ -0,0 +1,135 @@
+"""
+Métricas de rutas guardadas: km (por la red vial si hay grafo, si no gran círculo;
+CL -> paradas [-> CL]), paradas, venta cubierta y duración estimada (manejo + atención
+por parada).
+
+km, paradas y venta se cachean en la fila de Ruta junto con la versión de datos de la
+empresa. Las escrituras de rutas (guardar, PATCH, semana, plan) las recalculan en su
+transacción y la exportación guarda las de una empresa cuyos locales/CL cambiaron; la
+lectura (/ruteo/metricas) no escribe: calcula al vuelo las vencidas. La duración se
+deriva al leer, así cambiar la velocidad o el tiempo de atención no invalida nada.
+"""
+import numpy as np
+from sqlalchemy import and_, bindparam, or_, select, update
+from config import Settings
+from ...database import db
+from ...models import Depot, Local, Ruta, RutaDetalle, get_data_version
+from .optimizer import haversine_pairs
+from .roads import get_road_graph
+
+def duracion_min(km: float, paradas: int) -> float:
+    return km / Settings.RUTA_VELOCIDAD_KMH * 60.0 + paradas * Settings.RUTA_SERVICIO_MIN
+
+def compute_metrics(rutas, paradas, tramos_km=haversine_pairs) -> dict:
+    """
+    rutas: [(ruta_id, cerrado, depot_lat, depot_lon)]
+    paradas: [(ruta_id, lat, lon, venta)] en orden de recorrido
+    tramos_km(lat1, lon1, lat2, lon2): km de cada tramo (línea recta o RoadGraph.pairs)
+    -> {ruta_id: {"km", "paradas", "venta"}}
+    Los tramos de todas las rutas se calculan juntos en una sola pasada vectorizada.
+    """
+    pos = {r[0]: i for i, r in enumerate(rutas)}
+    por_ruta = [[] for _ in rutas]
+    venta = np.zeros(len(rutas))
+    cantidad = np.zeros(len(rutas), dtype=np.int64)
+    for ruta_id, lat, lon, v in paradas:
+        i = pos[ruta_id]
+        cantidad[i] += 1
+        venta[i] += float(v or 0)
+        if lat is not None and lon is not None:
+            por_ruta[i].append((lat, lon))
+
+    seq_r, seq_pt = [], []
+    for i, (_, cerrado, dlat, dlon) in enumerate(rutas):
+        pts = por_ruta[i]
+        if pts and dlat is not None and dlon is not None:
+            pts = [(dlat, dlon)] + pts + ([(dlat, dlon)] if cerrado else [])
+        seq_r.extend([i] * len(pts))
+        seq_pt.extend(pts)
+
+    km = np.zeros(len(rutas))
+    if len(seq_pt) > 1:
+        r = np.asarray(seq_r)
+        p = np.asarray(seq_pt, dtype=np.float64)
+        mismo = r[1:] == r[:-1]  # tramos dentro de la misma ruta
+        a, b = p[:-1][mismo], p[1:][mismo]
+        d = tramos_km(a[:, 0], a[:, 1], b[:, 0], b[:, 1])
+        km = np.bincount(r[:-1][mismo], weights=d, minlength=len(rutas))
+
+    return {
+        ruta[0]: {"km": float(km[i]), "paradas": int(cantidad[i]), "venta": float(venta[i])}
+        for i, ruta in enumerate(rutas)
+    }
+
+def _stale_metrics(company_slug: str, version: int, *filtros) -> dict:
+    """{ruta_id: {"km", "paradas", "venta"}} de las rutas vencidas que cumplen `filtros`."""
+    rutas = db.session.execute(
+        select(Ruta.id, Ruta.cerrado, Depot.lat, Depot.lon)
+        .outerjoin(Depot, and_(Depot.company_slug == company_slug, Depot.id == Ruta.depot_id))
+        .where(Ruta.company_slug == company_slug, *filtros,
+               or_(Ruta.metricas_version.is_(None), Ruta.metricas_version != version))
+    ).all()
+    if not rutas:
+        return {}
+    paradas = db.session.execute(
+        select(RutaDetalle.ruta_id, Local.lat, Local.lon, Local.venta_por_dia)
+        .outerjoin(Local, and_(Local.company_slug == company_slug, Local.id == RutaDetalle.local_id))
+        .where(RutaDetalle.company_slug == company_slug, RutaDetalle.ruta_id.in_([r[0] for r in rutas]))
+        .order_by(RutaDetalle.ruta_id, RutaDetalle.orden)
+    ).all()
+    red = get_road_graph()
+    return compute_metrics(rutas, paradas, red.pairs if red is not None else haversine_pairs)
+
+def refresh_metrics(company_slug: str, desde=None, hasta=None, ruta_ids=None) -> int:
+    """
+    Recalcula y guarda (sin commit) las métricas vencidas de las rutas del rango o de
+    `ruta_ids`. Lo llaman las escrituras de rutas y la exportación. Devuelve cuántas.
+    """
+    version = get_data_version(company_slug)
+    filtros = [Ruta.id.in_(ruta_ids)] if ruta_ids is not None else [Ruta.fecha >= desde, Ruta.fecha <= hasta]
+    metricas = _stale_metrics(company_slug, version, *filtros)
+    if not metricas:
+        return 0
+
+    stmt = update(Ruta.__table__).where(Ruta.__table__.c.id == bindparam("b_id")).values(
+        metricas_km=bindparam("b_km"), metricas_paradas=bindparam("b_n"),
+        metricas_venta=bindparam("b_venta"), metricas_version=bindparam("b_v"),
+    )
+    db.session.execute(stmt, [
+        {"b_id": ruta_id, "b_km": round(m["km"], 3), "b_n": m["paradas"], "b_venta": round(m["venta"], 2),
+         "b_v": version}
+        for ruta_id, m in metricas.items()
+    ])
+    return len(metricas)
+
+def route_metrics(company_slug: str, desde, hasta) -> list[dict]:
+    """
+    Métricas por ruta del rango, ordenadas por fecha y turno. Sólo lectura: las vencidas
+    (cambiaron los locales o el CL) se calculan al vuelo sin guardarlas.
+    """
+    frescas = _stale_metrics(company_slug, get_data_version(company_slug),
+                             Ruta.fecha >= desde, Ruta.fecha <= hasta)
+    filas = db.session.execute(
+        select(Ruta.id, Ruta.fecha, Ruta.turno, Ruta.cerrado,
+               Ruta.metricas_km, Ruta.metricas_paradas, Ruta.metricas_venta)
+        .where(Ruta.company_slug == company_slug, Ruta.fecha >= desde, Ruta.fecha <= hasta)
+        .order_by(Ruta.fecha, Ruta.turno)
+    ).all()
+    out = []
+    for ruta_id, fecha, turno, cerrado, km, n, venta in filas:
+        if ruta_id in frescas:
+            km, n, venta = frescas[ruta_id]["km"], frescas[ruta_id]["paradas"], frescas[ruta_id]["venta"]
+        out.append({"id": ruta_id, "fecha": fecha.isoformat(), "turno": turno, "cerrado": bool(cerrado),
+                    "km": round(km or 0.0, 3), "paradas": n or 0, "venta": float(venta or 0),
+                    "duracion_min": round(duracion_min(km or 0.0, n or 0), 1)})
+    return out
+
+def summarize(rutas: list[dict]) -> dict:
+    """Totales de una lista de route_metrics()."""
+    return {
+        "rutas": len(rutas),
+        "km": round(sum(r["km"] for r in rutas), 3),
+        "paradas": sum(r["paradas"] for r in rutas),
+        "venta": round(sum(r["venta"] for r in rutas), 2),
+        "duracion_min": round(sum(r["duracion_min"] for r in rutas), 1),
+    }
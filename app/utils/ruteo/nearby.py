@@ -0,0 +1,91 @@
+"""
+Búsqueda de locales cercanos (k vecinos y/o radio) con un KD-tree por empresa.
+
+Los puntos se guardan como vectores unitarios 3D: la distancia euclídea (cuerda) es
+monótona con la distancia sobre la esfera, así el árbol sirve sin proyectar. El árbol
+se reconstruye sólo cuando cambia la versión de datos de la empresa (altas, bajas o
+cambios de locales).
+"""
+import threading
+import numpy as np
+from sqlalchemy import select
+from config import Settings
+from ...database import db
+from ...models import Local, get_data_version
+from ..cache import LRUCache
+from .optimizer import R_TIERRA_KM
+
+def to_unit_xyz(lat, lon) -> np.ndarray:
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    c = np.cos(lat)
+    return np.column_stack([c * np.cos(lon), c * np.sin(lon), np.sin(lat)])
+
+def km_to_chord(km: float) -> float:
+    return 2.0 * np.sin(min(km / R_TIERRA_KM, np.pi) / 2.0)
+
+def chord_to_km(chord) -> np.ndarray:
+    return 2.0 * R_TIERRA_KM * np.arcsin(np.clip(np.asarray(chord) / 2.0, 0.0, 1.0))
+
+class StoreTree:
+    def __init__(self, version: int, ids, names, lat, lon):
+        from scipy.spatial import cKDTree
+        self.version = version
+        self.ids = np.asarray(ids, dtype=object)
+        self.names = np.asarray(names, dtype=object)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.tree = cKDTree(to_unit_xyz(self.lat, self.lon)) if len(self.ids) else None
+
+    def query(self, lat: float, lon: float, k: int | None = 10, radio_km: float | None = None,
+              excluir=()) -> list[dict]:
+        """Locales más cercanos a (lat, lon), ordenados por distancia (km)."""
+        if self.tree is None:
+            return []
+        x = to_unit_xyz([lat], [lon])[0]
+        excluir = set(excluir)
+        if k:
+            n = min(len(self.ids), k + len(excluir))
+            ub = km_to_chord(radio_km) if radio_km else np.inf
+            d, idx = self.tree.query(x, k=n, distance_upper_bound=ub)
+            d, idx = np.atleast_1d(d), np.atleast_1d(idx)
+            ok = np.isfinite(d)
+            d, idx = d[ok], idx[ok]
+        else:
+            idx = np.asarray(self.tree.query_ball_point(x, km_to_chord(radio_km)), dtype=np.intp)
+            d = np.linalg.norm(self.tree.data[idx] - x, axis=1) if len(idx) else np.empty(0)
+            orden = np.argsort(d, kind="stable")
+            d, idx = d[orden], idx[orden]
+
+        out = []
+        for dist, i in zip(chord_to_km(d), idx):
+            if self.ids[i] in excluir:
+                continue
+            out.append({"id": self.ids[i], "name": self.names[i], "lat": float(self.lat[i]),
+                        "lon": float(self.lon[i]), "distancia_km": round(float(dist), 3)})
+            if k and len(out) >= k:
+                break
+        return out
+
+_trees = LRUCache(maxsize=Settings.TENANT_CACHE_MAX)  # un árbol por empresa
+_build_lock = threading.Lock()
+
+def get_store_tree(company_slug: str) -> StoreTree:
+    """Árbol de los locales activos de la empresa (se reconstruye si cambió la versión de datos)."""
+    version = get_data_version(company_slug)
+    t = _trees.get(company_slug)
+    if t is not None and t.version == version:
+        return t
+    with _build_lock:
+        t = _trees.get(company_slug)
+        if t is not None and t.version == version:
+            return t
+        rows = db.session.execute(
+            select(Local.id, Local.name, Local.lat, Local.lon)
+            .where(Local.company_slug == company_slug, Local.active.is_(True))
+            .order_by(Local.id)
+        ).all()
+        ids, names, lats, lons = zip(*rows) if rows else ((), (), (), ())
+        t = StoreTree(version, ids, names, lats, lons)
+        _trees[company_slug] = t
+        return t
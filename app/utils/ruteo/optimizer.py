@@ -0,0 +1,137 @@
+import time
+import numpy as np
+
+R_TIERRA_KM = 6371.0088
+
+def haversine_cross(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Matriz (len1 x len2) de distancias en km (gran círculo), calculada de forma vectorizada."""
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lon1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lon2, dtype=np.float64))
+    dlat = lat1[:, None] - lat2[None, :]
+    dlon = lon1[:, None] - lon2[None, :]
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1)[:, None] * np.cos(lat2)[None, :] * np.sin(dlon / 2.0) ** 2
+    return 2.0 * R_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def haversine_pairs(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Distancia en km entre los pares (lat1[i], lon1[i]) -> (lat2[i], lon2[i])."""
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lon1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lon2, dtype=np.float64))
+    a = np.sin((lat1 - lat2) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon1 - lon2) / 2.0) ** 2
+    return 2.0 * R_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def haversine_matrix(lat, lon) -> np.ndarray:
+    """Matriz NxN de distancias en km (gran círculo)."""
+    return haversine_cross(lat, lon, lat, lon)
+
+def _extended_matrix(dist: np.ndarray, cerrado: bool) -> np.ndarray:
+    """
+    Agrega un nodo "fin" (índice n) a la matriz con depósito en 0 y paradas en 1..n-1.
+    Ruta cerrada: llegar al fin cuesta lo mismo que volver al depósito.
+    Ruta abierta: llegar al fin es gratis (termina en la última parada).
+    """
+    n = dist.shape[0]
+    ext = np.zeros((n + 1, n + 1), dtype=np.float64)
+    ext[:n, :n] = dist
+    if cerrado:
+        ext[:n, n] = dist[:, 0]
+        ext[n, :n] = dist[0, :]
+    return ext
+
+def path_length(dist: np.ndarray, order, cerrado: bool) -> float:
+    """Largo de depósito -> order... (-> depósito si cerrado). `order` son índices 1..n-1."""
+    if len(order) == 0:
+        return 0.0
+    p = np.asarray(order, dtype=np.intp)
+    total = dist[0, p[0]] + dist[p[:-1], p[1:]].sum()
+    if cerrado:
+        total += dist[p[-1], 0]
+    return float(total)
+
+def _nearest_neighbor(dist: np.ndarray) -> list[int]:
+    n = dist.shape[0]
+    visitado = np.zeros(n, dtype=bool)
+    visitado[0] = True
+    actual = 0
+    order = []
+    for _ in range(n - 1):
+        fila = np.where(visitado, np.inf, dist[actual])
+        actual = int(np.argmin(fila))
+        visitado[actual] = True
+        order.append(actual)
+    return order
+
+def _two_opt_pass(ext: np.ndarray, p: np.ndarray, limite: float) -> bool:
+    """Una pasada de 2-opt (mejor j para cada i). `p` = [0, ..., fin], se modifica in-place."""
+    m = len(p) - 1  # último índice (nodo fin)
+    mejoro = False
+    for i in range(1, m - 1):
+        if time.perf_counter() >= limite:
+            break
+        a, b = p[i - 1], p[i]
+        js = np.arange(i + 1, m)
+        c, d = p[js], p[js + 1]
+        delta = ext[a, c] + ext[b, d] - ext[a, b] - ext[c, d]
+        k = int(np.argmin(delta))
+        if delta[k] < -1e-9:
+            j = int(js[k])
+            p[i:j + 1] = p[i:j + 1][::-1].copy()
+            mejoro = True
+    return mejoro
+
+def _or_opt_pass(ext: np.ndarray, p: np.ndarray, limite: float, max_seg: int = 3) -> tuple[bool, np.ndarray]:
+    """Una pasada de Or-opt: mueve tramos de 1..max_seg paradas (opcionalmente invertidos)."""
+    mejoro = False
+    for L in range(1, max_seg + 1):
+        i = 1
+        while i + L < len(p) and time.perf_counter() < limite:  # el tramo nunca incluye el nodo fin
+            seg = p[i:i + L]
+            prev, nxt = p[i - 1], p[i + L]
+            s0, s1 = seg[0], seg[-1]
+            ganancia = ext[prev, s0] + ext[s1, nxt] - ext[prev, nxt]
+
+            q = np.concatenate([p[:i], p[i + L:]])
+            u, v = q[:-1], q[1:]
+            base = ext[u, v]
+            costo = ext[u, s0] + ext[s1, v] - base
+            costo_inv = ext[u, s1] + ext[s0, v] - base
+            # no reinsertar en el mismo lugar
+            costo[i - 1] = np.inf
+            costo_inv[i - 1] = np.inf
+
+            k = int(np.argmin(costo))
+            k_inv = int(np.argmin(costo_inv))
+            invertir = costo_inv[k_inv] < costo[k]
+            mejor = costo_inv[k_inv] if invertir else costo[k]
+            if mejor - ganancia < -1e-9:
+                k = k_inv if invertir else k
+                tramo = seg[::-1] if invertir else seg
+                p = np.concatenate([q[:k + 1], tramo, q[k + 1:]])
+                mejoro = True
+            else:
+                i += 1
+    return mejoro, p
+
+def optimize_order(dist: np.ndarray, cerrado: bool = False, tiempo_ms: int = 300) -> list[int]:
+    """
+    Ordena las paradas de una ruta. `dist` es la matriz (n x n) con el depósito en el índice 0
+    y las paradas en 1..n-1. Devuelve los índices de las paradas (1..n-1) en orden de visita.
+    Construcción por vecino más cercano + mejora 2-opt / Or-opt hasta agotar el tiempo.
+    """
+    n = dist.shape[0]
+    if n <= 2:
+        return list(range(1, n))
+    limite = time.perf_counter() + max(tiempo_ms, 0) / 1000.0
+
+    ext = _extended_matrix(dist, cerrado)
+    p = np.array([0] + _nearest_neighbor(dist) + [n], dtype=np.intp)
+
+    while time.perf_counter() < limite:
+        mejoro = _two_opt_pass(ext, p, limite)
+        mejoro_or, p = _or_opt_pass(ext, p, limite)
+        if not (mejoro or mejoro_or):
+            break
+    return [int(x) for x in p[1:-1]]
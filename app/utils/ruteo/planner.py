@@ -0,0 +1,119 @@
+"""
+Generador del plan semanal (Lunes a Sábado, AM/PM = 12 turnos).
+
+1) Frecuencia de visita por local según venta_por_dia (o rank si no hay ventas).
+2) K-means balanceado por visitas -> un grupo compacto por turno (visita principal).
+3) Visitas extra en otros días, espaciadas, al turno más cercano con lugar.
+4) Orden de cada turno con el optimizador (matriz desde la caché).
+"""
+import math
+from datetime import date, timedelta
+import numpy as np
+from .clustering import balanced_kmeans, capacitated_assign, project_km, sq_dist
+from .matrix import route_matrix
+from .optimizer import optimize_order
+
+TURNOS = ("AM", "PM")
+
+def week_days(d=None):
+    d = d or date.today()
+    # Lunes a Sábado (como tu UI)
+    monday = d - timedelta(days=(d.weekday() % 7))
+    days = [monday + timedelta(days=i) for i in range(6)]
+    out = {}
+    for di in days:
+        out[di.isoformat()] = {"weekday": ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"][di.weekday()]}
+    return out
+
+def parse_frecuencias(spec: str) -> list[tuple[float, int]]:
+    """ "0.10:3,0.30:2" -> [(0.10, 3), (0.30, 2)] (top 10% 3 visitas, top 30% 2 visitas)."""
+    out = []
+    for part in (spec or "").split(","):
+        if ":" not in part:
+            continue
+        q, v = part.split(":", 1)
+        out.append((float(q), int(v)))
+    return out
+
+def visit_frequency(venta, rank, umbrales, max_visitas: int = 6) -> np.ndarray:
+    """Visitas semanales por local (>= 1) según su percentil de ventas o de rank."""
+    venta = np.nan_to_num(np.asarray(venta, dtype=np.float64))
+    rank = np.asarray(rank, dtype=np.float64)
+    n = venta.size
+    f = np.ones(n, dtype=np.intp)
+    if n == 0:
+        return f
+    if (venta > 0).any():
+        score = venta
+    else:
+        score = -np.where(np.isnan(rank), np.inf, rank)  # rank 1 = mejor
+    orden = np.argsort(-score, kind="stable")
+    pos = np.empty(n, dtype=np.float64)
+    pos[orden] = np.arange(n)
+    q = pos / n
+    for corte, visitas in umbrales:
+        f = np.where(q < corte, np.maximum(f, visitas), f)
+    return np.clip(f, 1, max_visitas)
+
+def plan_week(stores: dict, n_dias: int, *, umbrales, max_visitas: int = 3, seed: int = 0) -> list[np.ndarray]:
+    """
+    `stores`: dict de arrays paralelos (lat, lon, rank, venta).
+    Devuelve una lista de n_dias * 2 arrays con los índices de locales por turno
+    (slot = dia * 2 + turno), sin ordenar.
+    """
+    n = len(stores["lat"])
+    k = n_dias * len(TURNOS)
+    if n == 0:
+        return [np.empty(0, dtype=np.intp) for _ in range(k)]
+
+    f = visit_frequency(stores["venta"], stores["rank"], umbrales, max_visitas=min(max_visitas, n_dias))
+    X = project_km(stores["lat"], stores["lon"])
+
+    # visita principal: grupos compactos balanceados por cantidad de visitas
+    labels, C = balanced_kmeans(X, k, weights=f, seed=seed)
+    if C.shape[0] < k:  # menos locales que turnos
+        C = np.vstack([C, np.repeat(C[-1:], k - C.shape[0], axis=0)])
+
+    capacidad = math.ceil(f.sum() / k)
+    restante = capacidad - np.bincount(labels, minlength=k).astype(np.float64)
+    slot_dia = np.arange(k) // len(TURNOS)
+    dias_usados = [slot_dia[labels]]
+    asignaciones = [(np.arange(n), labels)]
+    base = sq_dist(X, C)
+
+    # visitas extra: día objetivo espaciado desde el día principal, turno libre más cercano
+    for r in range(1, int(f.max())):
+        sel = np.flatnonzero(f > r)
+        if sel.size == 0:
+            break
+        paso = n_dias / f[sel]
+        objetivo = np.rint(dias_usados[0][sel] + r * paso).astype(np.intp) % n_dias
+        sep_dias = np.abs(slot_dia[None, :] - objetivo[:, None])
+        sep_dias = np.minimum(sep_dias, n_dias - sep_dias)
+
+        cost = base[sel] + 1e3 * sep_dias  # prioriza el día objetivo, desempata por distancia
+        for usados in dias_usados:
+            cost[slot_dia[None, :] == usados[sel, None]] = np.inf
+
+        extra = capacitated_assign(cost, np.maximum(restante, 0))
+        ok = extra >= 0
+        restante -= np.bincount(extra[ok], minlength=k)
+        usados_r = np.full(n, -1, dtype=np.intp)
+        usados_r[sel[ok]] = slot_dia[extra[ok]]
+        dias_usados.append(usados_r)
+        asignaciones.append((sel[ok], extra[ok]))
+
+    idx = np.concatenate([a for a, _ in asignaciones])
+    slot = np.concatenate([b for _, b in asignaciones])
+    orden = np.argsort(slot, kind="stable")
+    idx, slot = idx[orden], slot[orden]
+    cortes = np.searchsorted(slot, np.arange(k + 1))
+    return [idx[cortes[i]:cortes[i + 1]] for i in range(k)]
+
+def order_slot(company_slug: str, depot, locales: list, cerrado: bool, tiempo_ms: int) -> list:
+    """Ordena los locales de un turno con el optimizador (matriz de la caché)."""
+    if len(locales) < 2:
+        return list(locales)
+    dist = route_matrix(company_slug, depot, locales)
+    orden = optimize_order(dist, cerrado=cerrado, tiempo_ms=tiempo_ms)
+    return [locales[i - 1] for i in orden]
@@ -0,0 +1,425 @@
+"""
+Red vial offline a partir de un extracto OSM (.osm.pbf), sin acceso a la red.
+
+`flask red-vial-build extracto.osm.pbf` lee las vías transitables (pyosmium, opcional),
+las corta en los cruces y guarda un grafo dirigido compacto en Settings.RED_VIAL_ARCHIVO
+(.npz): nodos = cruces y extremos de vía, aristas en CSR con metros y segundos, y la
+geometría intermedia de cada arista aparte. Sólo queda la mayor componente fuertemente
+conexa, así todo punto "enganchado" a la red llega a todos los demás.
+
+En el servidor el grafo se carga una vez por worker (se recarga si cambia el archivo).
+Las consultas son Dijkstra multi-origen de scipy (en C) acotado: corre sobre el subgrafo
+del bbox de los puntos más un margen (RED_VIAL_MARGEN_KM), con los orígenes de a
+RED_VIAL_LOTE, y sólo se guarda la submatriz entre los puntos pedidos (LRU por conjunto de
+nodos). Un camino que sale del recorte cuesta al menos lo que separa origen y destino del
+borde (en línea recta, a la velocidad máxima del grafo); los costos que superan esa cota
+no están garantizados y esos orígenes se recalculan en el grafo entero con `limit` (el
+costo del recorte), de a pocos para acotar la memoria. El resultado es exacto.
+"""
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+import numpy as np
+from config import Settings
+from ..cache import LRUCache
+from ..capas import file_version
+from .nearby import chord_to_km, to_unit_xyz
+from .optimizer import haversine_pairs
+
+# velocidad por tipo de vía (km/h) cuando no hay maxspeed; lo que no está no es transitable
+VELOCIDADES_KMH = {
+    "motorway": 90, "motorway_link": 50, "trunk": 70, "trunk_link": 40,
+    "primary": 50, "primary_link": 35, "secondary": 40, "secondary_link": 30,
+    "tertiary": 35, "tertiary_link": 25, "unclassified": 30, "residential": 25,
+    "living_street": 10, "service": 15, "road": 25,
+}
+VELOCIDAD_ACCESO_KMH = 10.0  # del punto al nodo más cercano (estacionar, entrar a la cuadra)
+FACTOR_DESVIO = 1.3          # km por la red / km en línea recta, si un par no tiene camino
+MARGEN_FRACCION = 0.2        # margen del recorte: RED_VIAL_MARGEN_KM + esta fracción del lado del bbox
+RECORTE_MAX = 0.5            # si el recorte tiene más que esta fracción de los nodos, se usa el grafo entero
+LOTE_GRAFO_ENTERO = 4        # orígenes por corrida en el grafo entero (cada fila ocupa n_nodos floats)
+KM_POR_GRADO = 111.2
+PESOS = ("distancia", "tiempo")
+
+# ---------- construcción (offline) ----------
+def _sentido(tags) -> int:
+    """1 = sólo ida, -1 = sólo contramano, 0 = doble mano."""
+    oneway = (tags.get("oneway") or "").lower()
+    if oneway in ("yes", "true", "1"):
+        return 1
+    if oneway in ("-1", "reverse"):
+        return -1
+    if oneway == "no":
+        return 0
+    if tags.get("junction") in ("roundabout", "circular") or tags.get("highway") == "motorway":
+        return 1
+    return 0
+
+def _velocidad(tags) -> float:
+    m = re.match(r"\s*(\d+)", tags.get("maxspeed") or "")
+    if m and int(m.group(1)) > 0:
+        return float(m.group(1))
+    return float(VELOCIDADES_KMH[tags.get("highway")])
+
+def read_osm(path):
+    """Vías transitables del extracto: [(refs, lats, lons, velocidad_kmh, sentido)]."""
+    import osmium
+
+    ways = []
+    fp = osmium.FileProcessor(str(path)).with_locations().with_filter(osmium.filter.KeyFilter("highway"))
+    for obj in fp:
+        if not obj.is_way():
+            continue
+        tags = obj.tags
+        if tags.get("highway") not in VELOCIDADES_KMH or tags.get("area") == "yes":
+            continue
+        if tags.get("access") in ("no", "private") or "no" in (tags.get("motor_vehicle"), tags.get("motorcar")):
+            continue
+        nodos = [n for n in obj.nodes if n.location.valid()]
+        if len(nodos) < 2:
+            continue
+        ways.append(([n.ref for n in nodos], [n.location.lat for n in nodos], [n.location.lon for n in nodos],
+                     _velocidad(tags), _sentido(tags)))
+    return ways
+
+def build_graph(ways) -> dict:
+    """
+    ways: [(refs, lats, lons, velocidad_kmh, sentido)] -> arrays del .npz.
+    Cada vía se corta en los nodos que comparte con otra (cruces) y en sus extremos.
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    ways = [w for w in ways if len(w[0]) >= 2]
+    uso = Counter()
+    for refs, *_ in ways:
+        uso.update(refs)
+        uso[refs[0]] += 1
+        uso[refs[-1]] += 1
+
+    idx, nlat, nlon = {}, [], []
+    def nodo(ref, lat, lon):
+        if ref not in idx:
+            idx[ref] = len(nlat)
+            nlat.append(lat)
+            nlon.append(lon)
+        return idx[ref]
+
+    U, V, D, T, G = [], [], [], [], []
+    for refs, lats, lons, vel, sentido in ways:
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        cum = np.concatenate([[0.0], np.cumsum(haversine_pairs(lats[:-1], lons[:-1], lats[1:], lons[1:]) * 1000.0)])
+        cortes = [i for i, r in enumerate(refs) if uso[r] > 1]
+        for a, b in zip(cortes[:-1], cortes[1:]):
+            u, v = nodo(refs[a], lats[a], lons[a]), nodo(refs[b], lats[b], lons[b])
+            if u == v:
+                continue
+            d = max(cum[b] - cum[a], 0.1)
+            t = d / (vel / 3.6)
+            medio = np.column_stack([lats[a + 1:b], lons[a + 1:b]])
+            if sentido >= 0:
+                U.append(u); V.append(v); D.append(d); T.append(t); G.append(medio)
+            if sentido <= 0:
+                U.append(v); V.append(u); D.append(d); T.append(t); G.append(medio[::-1])
+
+    U, V = np.asarray(U, dtype=np.int64), np.asarray(V, dtype=np.int64)
+    D, T = np.asarray(D), np.asarray(T)
+    n = len(nlat)
+
+    # aristas paralelas: queda la más rápida
+    orden = np.lexsort((T, V, U))
+    clave = U[orden] * n + V[orden]
+    orden = orden[np.concatenate([[True], clave[1:] != clave[:-1]])] if len(orden) else orden
+
+    # mayor componente fuertemente conexa
+    _, comp = connected_components(csr_matrix((np.ones(len(orden)), (U[orden], V[orden])), shape=(n, n)),
+                                   directed=True, connection="strong")
+    mayor = np.bincount(comp).argmax()
+    nuevo = np.full(n, -1, dtype=np.int64)
+    keep = np.flatnonzero(comp == mayor)
+    nuevo[keep] = np.arange(len(keep))
+    orden = orden[(nuevo[U[orden]] >= 0) & (nuevo[V[orden]] >= 0)]
+
+    u, v = nuevo[U[orden]], nuevo[V[orden]]  # sigue ordenado por (u, v)
+    geoms = [G[e] for e in orden]
+    largos = np.array([len(g) for g in geoms], dtype=np.int64)
+    todas = np.concatenate(geoms) if largos.sum() else np.empty((0, 2))
+    return {
+        "lat": np.asarray(nlat)[keep], "lon": np.asarray(nlon)[keep],
+        "indptr": np.concatenate([[0], np.cumsum(np.bincount(u, minlength=len(keep)))]).astype(np.int64),
+        "indices": v.astype(np.int32),
+        "dist_m": D[orden].astype(np.float32), "tiempo_s": T[orden].astype(np.float32),
+        "geom_ptr": np.concatenate([[0], np.cumsum(largos)]).astype(np.int64),
+        "geom_lat": todas[:, 0].astype(np.float32), "geom_lon": todas[:, 1].astype(np.float32),
+    }
+
+# ---------- consultas ----------
+class RoadGraph:
+    def __init__(self, path):
+        from scipy.sparse import csr_matrix
+        from scipy.spatial import cKDTree
+        self.path = Path(path)
+        self.version = file_version(self.path)
+        with np.load(self.path) as z:
+            a = {k: z[k] for k in z.files}
+        self.lat, self.lon = a["lat"], a["lon"]
+        self.indptr, self.indices = a["indptr"], a["indices"]
+        self.dist_m, self.tiempo_s = a["dist_m"], a["tiempo_s"]
+        self.geom_ptr, self.geom_lat, self.geom_lon = a["geom_ptr"], a["geom_lat"], a["geom_lon"]
+        n = len(self.lat)
+        self.pesos = {
+            "distancia": csr_matrix((self.dist_m.astype(np.float64), self.indices, self.indptr), shape=(n, n)),
+            "tiempo": csr_matrix((self.tiempo_s.astype(np.float64), self.indices, self.indptr), shape=(n, n)),
+        }
+        self.tree = cKDTree(to_unit_xyz(self.lat, self.lon))
+        self.caja = (self.lat.min(), self.lat.max(), self.lon.min(), self.lon.max()) if n else (0.0,) * 4
+        rapidas = self.tiempo_s > 0
+        self.vmax_kmh = float((self.dist_m[rapidas] / self.tiempo_s[rapidas]).max() * 3.6) if rapidas.any() else 1.0
+        self._matrices = LRUCache(maxsize=Settings.RED_VIAL_CACHE_MATRICES)
+        self._traspuestos = {}  # peso -> grafo con las aristas invertidas (costos hacia un punto)
+
+    @property
+    def n_nodos(self) -> int:
+        return len(self.lat)
+
+    def snap(self, lat, lon) -> tuple[np.ndarray, np.ndarray]:
+        """(nodo más cercano, distancia en km) de cada punto."""
+        d, nodos = self.tree.query(to_unit_xyz(np.atleast_1d(lat), np.atleast_1d(lon)))
+        return np.asarray(nodos, dtype=np.int64), chord_to_km(d)
+
+    def _recorte(self, lat, lon, nodos) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (nodos ordenados del bbox de los puntos más el margen, y siempre los `nodos` pedidos;
+        km en línea recta de cada uno de `nodos` al borde del recorte).
+        """
+        lat, lon = np.atleast_1d(lat), np.atleast_1d(lon)
+        lat0, lat1, lon0, lon1 = lat.min(), lat.max(), lon.min(), lon.max()
+        cos = max(float(np.cos(np.radians((lat0 + lat1) / 2.0))), 0.1)
+        lado_km = max(lat1 - lat0, (lon1 - lon0) * cos) * KM_POR_GRADO
+        dlat = (Settings.RED_VIAL_MARGEN_KM + MARGEN_FRACCION * lado_km) / KM_POR_GRADO
+        dlon = dlat / cos
+        s, n, o, e = lat0 - dlat, lat1 + dlat, lon0 - dlon, lon1 + dlon
+        dentro = (self.lat >= s) & (self.lat <= n) & (self.lon >= o) & (self.lon <= e)
+        if dentro.sum() > RECORTE_MAX * self.n_nodos:
+            return np.arange(self.n_nodos), np.full(len(nodos), np.inf)
+        # cos del extremo más alejado del ecuador: los km al borde quedan por debajo (cota)
+        cos_min = max(float(np.cos(np.radians(max(abs(s), abs(n))))), 0.0)
+        la, lo = self.lat[nodos], self.lon[nodos]
+        # por un lado que ya pasa el extremo del grafo no se puede salir
+        lados = [(la - s) * KM_POR_GRADO if s > self.caja[0] else np.inf,
+                 (n - la) * KM_POR_GRADO if n < self.caja[1] else np.inf,
+                 (lo - o) * KM_POR_GRADO * cos_min if o > self.caja[2] else np.inf,
+                 (e - lo) * KM_POR_GRADO * cos_min if e < self.caja[3] else np.inf]
+        borde = np.minimum.reduce([np.broadcast_to(x, la.shape) for x in lados]) * 0.99
+        dentro[nodos] = True
+        return np.flatnonzero(dentro), np.maximum(borde, 0.0)
+
+    def _cota(self, peso: str, borde_km: np.ndarray) -> np.ndarray:
+        """Costo mínimo (metros o segundos) de salir del recorte y volver, por par (origen, destino)."""
+        km = borde_km[:, None] + borde_km[None, :]
+        return km * 1000.0 if peso == "distancia" else km / self.vmax_kmh * 3600.0
+
+    def _costos(self, peso: str, nodos: np.ndarray, lat, lon) -> np.ndarray:
+        """
+        Costos (metros o segundos) entre `nodos` (únicos, ordenados): matriz k x k float32.
+        Dijkstra sobre el recorte, con los orígenes en lotes; en caché por conjunto de nodos.
+        """
+        from scipy.sparse.csgraph import dijkstra
+        clave = (peso, nodos.tobytes())
+        C = self._matrices.get(clave)
+        if C is not None:
+            return C
+        sub, borde = self._recorte(lat, lon, nodos)
+        pos = np.searchsorted(sub, nodos)
+        G = self.pesos[peso] if len(sub) == self.n_nodos else self.pesos[peso][sub][:, sub]
+        k, lote = len(nodos), max(Settings.RED_VIAL_LOTE, 1)
+        C = np.empty((k, k), dtype=np.float64)
+        for i in range(0, k, lote):
+            C[i:i + lote] = np.atleast_2d(dijkstra(G, directed=True, indices=pos[i:i + lote]))[:, pos]
+        # costos sin garantía (o sin camino en el recorte): esas filas en el grafo entero, hasta
+        # el costo del recorte (el grafo es fuertemente conexo: siempre hay camino)
+        dudosas = np.flatnonzero((C > self._cota(peso, borde)).any(axis=1))
+        for i in range(0, len(dudosas), LOTE_GRAFO_ENTERO):
+            filas = dudosas[i:i + LOTE_GRAFO_ENTERO]
+            C[filas] = np.atleast_2d(dijkstra(self.pesos[peso], directed=True, indices=nodos[filas],
+                                              limit=C[filas].max()))[:, nodos]
+        C = C.astype(np.float32)
+        self._matrices[clave] = C
+        return C
+
+    def _to_units(self, costos: np.ndarray, acceso_km: np.ndarray, peso: str) -> np.ndarray:
+        """metros -> km o segundos -> minutos, más el acceso desde/hacia el nodo."""
+        if peso == "distancia":
+            return costos / 1000.0 + acceso_km
+        return costos / 60.0 + acceso_km / VELOCIDAD_ACCESO_KMH * 60.0
+
+    def _fallback(self, km_recta: np.ndarray, peso: str) -> np.ndarray:
+        km = km_recta * FACTOR_DESVIO
+        return km if peso == "distancia" else km / VELOCIDADES_KMH["residential"] * 60.0
+
+    def pairs(self, lat1, lon1, lat2, lon2, peso: str = "distancia") -> np.ndarray:
+        """Costo por la red (km o minutos) de cada par (lat1[i], lon1[i]) -> (lat2[i], lon2[i])."""
+        lat1, lon1 = np.atleast_1d(lat1), np.atleast_1d(lon1)
+        lat2, lon2 = np.atleast_1d(lat2), np.atleast_1d(lon2)
+        a, acc_a = self.snap(lat1, lon1)
+        b, acc_b = self.snap(lat2, lon2)
+        if len(a) == 0:
+            return np.empty(0)
+        uniq, inv = np.unique(np.concatenate([a, b]), return_inverse=True)
+        C = self._costos(peso, uniq, np.concatenate([lat1, lat2]), np.concatenate([lon1, lon2]))
+        costos = C[inv[:len(a)], inv[len(a):]].astype(np.float64)
+        out = self._to_units(costos, acc_a + acc_b, peso)
+        sin = ~np.isfinite(out)
+        if sin.any():
+            out[sin] = self._fallback(haversine_pairs(lat1[sin], lon1[sin], lat2[sin], lon2[sin]), peso)
+        return out
+
+    def _traspuesto(self, peso: str):
+        G = self._traspuestos.get(peso)
+        if G is None:
+            G = self._traspuestos[peso] = self.pesos[peso].T.tocsr()
+        return G
+
+    def one_to_many(self, lat, lon, lats, lons, peso: str = "distancia") -> tuple[np.ndarray, np.ndarray]:
+        """
+        (costo punto -> cada destino, costo cada destino -> punto) en km o minutos: un
+        Dijkstra acotado en el grafo y otro en el traspuesto, no la matriz entera.
+        """
+        from scipy.sparse.csgraph import dijkstra
+        lats, lons = np.atleast_1d(lats), np.atleast_1d(lons)
+        if len(lats) == 0:
+            return np.empty(0), np.empty(0)
+        todos_lat = np.concatenate([[float(lat)], lats])
+        todos_lon = np.concatenate([[float(lon)], lons])
+        nodos, acceso = self.snap(todos_lat, todos_lon)
+        sub, borde = self._recorte(todos_lat, todos_lon, nodos)
+        cota = self._cota(peso, borde)[0]
+        pos = np.searchsorted(sub, nodos)
+        out = []
+        for G in (self.pesos[peso], self._traspuesto(peso)):
+            d = dijkstra(G if len(sub) == self.n_nodos else G[sub][:, sub], directed=True, indices=pos[0])[pos]
+            if (d > cota).any():
+                d = dijkstra(G, directed=True, indices=nodos[0], limit=d.max())[nodos]
+            c = self._to_units(d[1:], acceso[0] + acceso[1:], peso)
+            sin = ~np.isfinite(c)
+            if sin.any():
+                c[sin] = self._fallback(haversine_pairs(todos_lat[0], todos_lon[0], lats[sin], lons[sin]), peso)
+            out.append(c)
+        return out[0], out[1]
+
+    def matrix(self, lat, lon, peso: str = "distancia") -> np.ndarray:
+        """Matriz NxN (km o minutos) por la red entre los puntos."""
+        from .optimizer import haversine_cross
+        nodos, acceso = self.snap(lat, lon)
+        n = len(nodos)
+        if n == 0:
+            return np.zeros((0, 0))
+        uniq, inv = np.unique(nodos, return_inverse=True)
+        R = self._costos(peso, uniq, lat, lon).astype(np.float64)[np.ix_(inv, inv)]
+        M = self._to_units(R, acceso[:, None] + acceso[None, :], peso)
+        sin = ~np.isfinite(M)
+        if sin.any():
+            M[sin] = self._fallback(haversine_cross(lat, lon, lat, lon), peso)[sin]
+        np.fill_diagonal(M, 0.0)
+        return M
+
+    def _edge(self, u: int, v: int) -> int:
+        ini = self.indptr[u]
+        return int(ini + np.flatnonzero(self.indices[ini:self.indptr[u + 1]] == v)[0])
+
+    def _caminos(self, lat, lon, nodos) -> dict:
+        """
+        {(a, b): [nodos del camino más rápido]} de cada tramo consecutivo, con el mismo
+        recorte, lotes y cota que _costos (si no alcanza: grafo entero, de a un origen).
+        """
+        from scipy.sparse.csgraph import dijkstra
+        sub, borde = self._recorte(lat, lon, nodos)
+        cota = self._cota("tiempo", borde)
+        G = self.pesos["tiempo"] if len(sub) == self.n_nodos else self.pesos["tiempo"][sub][:, sub]
+        tramos = list(dict.fromkeys(zip(nodos[:-1].tolist(), nodos[1:].tolist())))
+        fuentes = list(dict.fromkeys(a for a, _ in tramos))
+        idx = {int(x): i for i, x in enumerate(nodos)}  # posición de cada nodo para la cota
+
+        def seguir(pred, ini, fin):
+            seq = [fin]
+            while seq[-1] != ini and pred[seq[-1]] >= 0:
+                seq.append(int(pred[seq[-1]]))
+            return seq[::-1] if seq[-1] == ini else None
+
+        caminos, faltan = {}, []
+        lote = max(Settings.RED_VIAL_LOTE, 1)
+        for i in range(0, len(fuentes), lote):
+            grupo = fuentes[i:i + lote]
+            D, P = dijkstra(G, directed=True, indices=np.searchsorted(sub, grupo), return_predecessors=True)
+            D, P = np.atleast_2d(D), np.atleast_2d(P)
+            fila = {f: j for j, f in enumerate(grupo)}
+            for a, b in tramos:
+                if a not in fila:
+                    continue
+                pb = int(np.searchsorted(sub, b))
+                if D[fila[a], pb] > cota[idx[a], idx[b]]:
+                    faltan.append((a, b, D[fila[a], pb]))
+                else:
+                    caminos[(a, b)] = sub[seguir(P[fila[a]], int(np.searchsorted(sub, a)), pb)].tolist()
+        for a, b, limite in faltan:
+            _, pred = dijkstra(self.pesos["tiempo"], directed=True, indices=a, limit=limite,
+                               return_predecessors=True)
+            seq = seguir(pred, a, b)
+            if seq is not None:
+                caminos[(a, b)] = seq
+        return caminos
+
+    def route(self, lat, lon) -> list[dict]:
+        """
+        Tramos por la red (camino más rápido) entre puntos consecutivos:
+        [{"km", "min", "coords": [[lat, lon], ...]}]. Sin camino, el tramo es una recta.
+        """
+        lat, lon = np.atleast_1d(np.asarray(lat, dtype=np.float64)), np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        nodos, acceso = self.snap(lat, lon)
+        if len(nodos) < 2:
+            return []
+        caminos = self._caminos(lat, lon, nodos)
+
+        tramos = []
+        for i in range(len(nodos) - 1):
+            a = int(nodos[i])
+            seq = caminos.get((a, int(nodos[i + 1])))
+            if seq is None:
+                km = float(haversine_pairs(lat[i], lon[i], lat[i + 1], lon[i + 1]))
+                tramos.append({"km": round(km * FACTOR_DESVIO, 3),
+                               "min": round(float(self._fallback(np.array(km), "tiempo")), 2),
+                               "coords": [[lat[i], lon[i]], [lat[i + 1], lon[i + 1]]]})
+                continue
+            coords = [[float(lat[i]), float(lon[i])], [float(self.lat[a]), float(self.lon[a])]]
+            metros = segundos = 0.0
+            for u, v in zip(seq[:-1], seq[1:]):
+                e = self._edge(u, v)
+                metros += float(self.dist_m[e])
+                segundos += float(self.tiempo_s[e])
+                g0, g1 = self.geom_ptr[e], self.geom_ptr[e + 1]
+                coords.extend([float(y), float(x)] for y, x in zip(self.geom_lat[g0:g1], self.geom_lon[g0:g1]))
+                coords.append([float(self.lat[v]), float(self.lon[v])])
+            coords.append([float(lat[i + 1]), float(lon[i + 1])])
+            acc = float(acceso[i] + acceso[i + 1])
+            tramos.append({
+                "km": round(metros / 1000.0 + acc, 3),
+                "min": round(segundos / 60.0 + acc / VELOCIDAD_ACCESO_KMH * 60.0, 2),
+                "coords": coords,
+            })
+        return tramos
+
+_graph: RoadGraph | None = None
+_lock = threading.Lock()
+
+def get_road_graph() -> RoadGraph | None:
+    """Grafo del worker (None si no hay archivo o está desactivado)."""
+    global _graph
+    p = Path(Settings.RED_VIAL_ARCHIVO)
+    if not Settings.RED_VIAL_USAR or not p.exists():
+        return None
+    with _lock:
+        if _graph is None or _graph.version != file_version(p):
+            _graph = RoadGraph(p)
+        return _graph
@@ -0,0 +1,119 @@
+"""
+Trabajos de ruteo que corren en el pool de utils/jobs.py (exportar, planificar semana).
+
+Cada uno tiene su validador (corre en el request y deja params JSON) y la tarea, que
+recibe la empresa por el contexto: en el proceso del pool no hay request ni usuario.
+"""
+from datetime import date
+from config import Settings
+from ...database import db
+from ...models import Depot, Local
+from ..jobs import tarea
+from .edits import replace_week
+from .excel import count_rows, export_rows, iter_csv, write_xlsx
+from .metrics import refresh_metrics
+from .planner import TURNOS, order_slot, parse_frecuencias, plan_week, week_days
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def _con_progreso(ctx, rows, total: int, cada: int = 1000):
+    for i, row in enumerate(rows, 1):
+        if i % cada == 0:
+            ctx.progreso(i / max(total, 1), f"{i} de {total} filas")
+        yield row
+
+def validar_exportar(params: dict) -> dict:
+    dias = list(week_days())
+    try:
+        desde = date.fromisoformat(params.get("desde") or dias[0])
+        hasta = date.fromisoformat(params.get("hasta") or dias[-1])
+    except (TypeError, ValueError):
+        raise ValueError("Fecha inválida") from None
+    if hasta < desde:
+        raise ValueError("'hasta' es anterior a 'desde'")
+    if (hasta - desde).days >= Settings.EXPORT_MAX_DIAS:
+        raise ValueError(f"Rango máximo: {Settings.EXPORT_MAX_DIAS} días")
+    formato = str(params.get("formato") or "xlsx").lower()
+    if formato not in ("xlsx", "csv"):
+        raise ValueError("formato debe ser xlsx o csv")
+    return {"desde": desde.isoformat(), "hasta": hasta.isoformat(), "formato": formato,
+            "por_dia": params.get("por_dia") in (True, 1, "1", "true")}
+
+@tarea("exportar", validar=validar_exportar)
+def exportar(ctx, desde: str, hasta: str, formato: str, por_dia: bool):
+    """Rutas guardadas entre desde y hasta a XLSX (una hoja o una por día) o CSV."""
+    company = ctx.company_slug
+    desde, hasta = date.fromisoformat(desde), date.fromisoformat(hasta)
+    ctx.progreso(0, "Calculando métricas")
+    if refresh_metrics(company, desde, hasta):
+        db.session.commit()
+
+    total = count_rows(company, desde, hasta)
+    rows = _con_progreso(ctx, export_rows(company, desde, hasta), total)
+    nombre = f"ruteo_{desde.isoformat()}_{hasta.isoformat()}.{formato}"
+    if formato == "csv":
+        with open(ctx.archivo(nombre, "text/csv"), "wb") as fh:
+            for trozo in iter_csv(rows):
+                fh.write(trozo)
+    else:
+        write_xlsx(rows, por_dia=por_dia, out=ctx.archivo(nombre, XLSX_MIMETYPE))
+    return {"filas": total}
+
+def validar_planificar(params: dict) -> dict:
+    try:
+        base = date.fromisoformat(params["fecha"]) if params.get("fecha") else None
+    except (TypeError, ValueError):
+        raise ValueError("Fecha inválida") from None
+    dias = list(week_days(base))
+    try:
+        max_visitas = params.get("max_visitas")
+        max_visitas = Settings.PLAN_MAX_VISITAS if max_visitas in (None, "") else int(max_visitas)
+    except (TypeError, ValueError):
+        raise ValueError("max_visitas debe ser un entero") from None
+    if not 1 <= max_visitas <= len(dias):
+        raise ValueError(f"max_visitas debe estar entre 1 y {len(dias)}")
+    return {"dias": dias, "cerrado": bool(params.get("cerrado", False)),
+            "max_visitas": max_visitas, "guardar": bool(params.get("guardar", True))}
+
+@tarea("planificar-semana", validar=validar_planificar)
+def planificar_semana(ctx, dias: list, cerrado: bool, max_visitas: int, guardar: bool):
+    """
+    Asigna cada local activo a uno o más turnos (Lunes a Sábado, AM/PM), ordena cada
+    turno y, con guardar, reemplaza las rutas de la semana en una sola transacción.
+    """
+    company = ctx.company_slug
+    dias = [date.fromisoformat(d) for d in dias]
+    depot = Depot.query.filter_by(company_slug=company, active=True).first()
+    locs = Local.query.filter_by(company_slug=company, active=True).order_by(Local.id.asc()).all()
+    stores = {
+        "lat": [l.lat for l in locs],
+        "lon": [l.lon for l in locs],
+        "rank": [l.rank if l.rank is not None else float("nan") for l in locs],
+        "venta": [float(l.venta_por_dia or 0) for l in locs],
+    }
+    ctx.progreso(0, "Asignando turnos")
+    slots = plan_week(stores, len(dias), umbrales=parse_frecuencias(Settings.PLAN_FRECUENCIAS),
+                      max_visitas=max_visitas)
+
+    plan = {}
+    for s, idx in enumerate(slots):
+        ctx.progreso(s / len(slots), f"Ordenando turno {s + 1} de {len(slots)}")
+        key = (dias[s // len(TURNOS)], TURNOS[s % len(TURNOS)])
+        ordenados = order_slot(company, depot, [locs[i] for i in idx], cerrado,
+                               Settings.PLAN_TIEMPO_MS_POR_RUTA)
+        plan[key] = [l.id for l in ordenados]
+
+    if guardar:
+        replace_week(company, dias, plan, cerrado, depot.id if depot else None, ctx.creado_por)
+        refresh_metrics(company, dias[0], dias[-1])
+        db.session.commit()
+
+    rutas = {}
+    for (fecha, turno), ids in plan.items():
+        rutas.setdefault(fecha.isoformat(), {})[turno] = ids
+    return {
+        "guardado": guardar,
+        "cerrado": cerrado,
+        "visitas": sum(len(ids) for ids in plan.values()),
+        "rutas": rutas,
+    }
@@ -0,0 +1,136 @@
+"""
+Territorios: partición de los locales activos en K zonas compactas y balanceadas
+(por cantidad de paradas o por venta_por_dia), con k-means capacitado.
+
+Los locales nuevos se asignan de forma incremental al territorio más cercano que
+todavía tenga capacidad, sin recalcular la partición.
+"""
+import numpy as np
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+from ...database import db
+from ...models import Local, Territorio, bump_data_version
+from .clustering import (KM_POR_GRADO_LAT, KM_POR_GRADO_LON, balanced_kmeans, capacitated_assign,
+                         project_km, sq_dist)
+
+CRITERIOS = ("paradas", "venta")
+
+def _weights(criterio: str, ventas, minimo: float | None = None) -> np.ndarray:
+    if criterio == "venta":
+        w = np.asarray([float(v or 0) for v in ventas], dtype=np.float64)
+        # los locales sin venta pesan como el menor positivo (si no, se agrupan gratis);
+        # `minimo` fijo para pesar un subconjunto igual que a todos los de la empresa
+        if minimo is None:
+            minimo = w[w > 0].min() if (w > 0).any() else 1.0
+        return np.where(w > 0, w, minimo)
+    return np.ones(len(ventas), dtype=np.float64)
+
+def _unproject(C: np.ndarray, lat0: float) -> tuple[np.ndarray, np.ndarray]:
+    """Inversa de project_km (es lineal para un lat0 fijo)."""
+    return C[:, 1] / KM_POR_GRADO_LAT, C[:, 0] / (KM_POR_GRADO_LON * np.cos(np.radians(lat0)))
+
+def partition(lat, lon, weights, k: int, tolerancia: float = 0.05, seed: int = 0):
+    """-> (labels 0..k-1, lat_centroides, lon_centroides, capacidad por territorio)."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lat0 = float(lat.mean()) if lat.size else 0.0
+    X = project_km(lat, lon, lat0)
+    labels, C = balanced_kmeans(X, k, weights, tolerancia=tolerancia, seed=seed)
+    clat, clon = _unproject(C, lat0)
+    w = np.asarray(weights, dtype=np.float64)
+    capacidad = max(w.sum() / max(len(C), 1) * (1.0 + tolerancia), w.max()) if w.size else 0.0
+    return labels, clat, clon, capacidad
+
+def _active(company_slug: str, solo_sin_territorio: bool = False):
+    q = select(Local.id, Local.lat, Local.lon, Local.venta_por_dia).where(
+        Local.company_slug == company_slug, Local.active.is_(True)
+    ).order_by(Local.id)
+    if solo_sin_territorio:
+        q = q.where(Local.territorio.is_(None))
+    rows = db.session.execute(q).all()
+    return tuple(list(c) for c in zip(*rows)) if rows else ([], [], [], [])
+
+def _save_labels(ids, numeros):
+    stmt = update(Local.__table__).where(Local.__table__.c.id == bindparam("b_id")).values(
+        territorio=bindparam("b_t"))
+    lote = 1000
+    for i in range(0, len(ids), lote):
+        db.session.execute(stmt, [{"b_id": a, "b_t": b} for a, b in zip(ids[i:i + lote], numeros[i:i + lote])])
+
+def build_territories(company_slug: str, k: int, criterio: str = "paradas", tolerancia: float = 0.05,
+                      seed: int = 0) -> int:
+    """Recalcula la partición de la empresa y la guarda (sin commit). Devuelve cuántos territorios quedaron."""
+    ids, lats, lons, ventas = _active(company_slug)
+    db.session.execute(delete(Territorio).where(Territorio.company_slug == company_slug))
+    db.session.execute(update(Local).where(Local.company_slug == company_slug).values(territorio=None))
+    bump_data_version(company_slug)
+    if not ids:
+        return 0
+    w = _weights(criterio, ventas)
+    labels, clat, clon, cap = partition(lats, lons, w, k, tolerancia, seed)
+    db.session.execute(insert(Territorio), [
+        {"company_slug": company_slug, "numero": j + 1, "lat": float(clat[j]), "lon": float(clon[j]),
+         "criterio": criterio, "capacidad": float(cap)}
+        for j in range(len(clat))
+    ])
+    _save_labels(ids, [int(x) + 1 for x in labels])
+    return len(clat)
+
+def assign_pending(company_slug: str) -> int:
+    """
+    Asigna los locales activos sin territorio al más cercano con capacidad libre (sin commit).
+    Devuelve cuántos se asignaron (0 si la empresa no tiene territorios).
+    """
+    terr = db.session.execute(
+        select(Territorio.numero, Territorio.lat, Territorio.lon, Territorio.criterio, Territorio.capacidad)
+        .where(Territorio.company_slug == company_slug).order_by(Territorio.numero)
+    ).all()
+    if not terr:
+        return 0
+    ids, lats, lons, ventas = _active(company_slug, solo_sin_territorio=True)
+    if not ids:
+        return 0
+    numeros = np.array([t.numero for t in terr])
+    criterio = terr[0].criterio
+
+    # carga actual de cada territorio, con el mismo peso que la partición: en "venta", los
+    # locales sin venta cuentan como el menor positivo de toda la empresa (no sólo pendientes)
+    activos = (Local.company_slug == company_slug, Local.active.is_(True))
+    minimo = None
+    if criterio == "paradas":
+        peso = func.count()
+    else:
+        minimo = float(db.session.execute(
+            select(func.min(Local.venta_por_dia)).where(*activos, Local.venta_por_dia > 0)
+        ).scalar() or 1.0)
+        peso = func.sum(case((Local.venta_por_dia > 0, Local.venta_por_dia), else_=minimo))
+    cargas = dict(db.session.execute(
+        select(Local.territorio, peso)
+        .where(*activos, Local.territorio.is_not(None))
+        .group_by(Local.territorio)
+    ).all())
+    libre = np.array([(t.capacidad or 0) - float(cargas.get(t.numero, 0) or 0) for t in terr])
+
+    lat0 = float(np.mean([t.lat for t in terr]))
+    X = project_km(lats, lons, lat0)
+    C = project_km([t.lat for t in terr], [t.lon for t in terr], lat0)
+    labels = capacitated_assign(sq_dist(X, C), np.maximum(libre, 0), _weights(criterio, ventas, minimo))
+    _save_labels(ids, [int(numeros[j]) for j in labels])
+    bump_data_version(company_slug)
+    return len(ids)
+
+def territory_summary(company_slug: str) -> list[dict]:
+    """Territorios con cantidad de locales activos y venta sumada (una consulta agregada)."""
+    agg = {
+        t: (n, v) for t, n, v in db.session.execute(
+            select(Local.territorio, func.count(), func.sum(Local.venta_por_dia))
+            .where(Local.company_slug == company_slug, Local.active.is_(True))
+            .group_by(Local.territorio)
+        ).all()
+    }
+    terr = db.session.execute(
+        select(Territorio).where(Territorio.company_slug == company_slug).order_by(Territorio.numero)
+    ).scalars().all()
+    return [
+        {"numero": t.numero, "lat": t.lat, "lon": t.lon, "criterio": t.criterio,
+         "locales": int(agg.get(t.numero, (0, 0))[0]), "venta_por_dia": float(agg.get(t.numero, (0, 0))[1] or 0)}
+        for t in terr
+    ]
@@ -0,0 +1,19 @@
+"""Normalización de texto para búsquedas (sin acentos, minúsculas)."""
+import re
+import unicodedata
+
+def _sin_marcas(s: str) -> str:
+    # NFKD y fuera las marcas combinantes: "ñ" -> "n", "°" y demás símbolos quedan
+    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+
+def normalize_search(*parts) -> str:
+    """ "Ñandú", "Asunción" -> "nandu asuncion" (partes vacías se omiten)."""
+    s = " ".join(str(p) for p in parts if p not in (None, ""))
+    return re.sub(r"\s+", " ", _sin_marcas(s).lower()).strip()
+
+def normalize_search_series(*cols):
+    """normalize_search vectorizado sobre Series de pandas (mismo resultado)."""
+    s = cols[0].fillna("").astype(str)
+    for c in cols[1:]:
+        s = s + " " + c.fillna("").astype(str)
+    return s.map(_sin_marcas).str.lower().str.replace(r"\s+", " ", regex=True).str.strip()
@@ -0,0 +1,236 @@
+"""
+Servidor de Mapbox Vector Tiles (MVT) para las capas administrativas.
+
+Las capas salen de scripts/preprocess_layers*.py (carpeta build/), sin simplificar: el
+GeoParquet si está (y hay pyarrow), si no el *.full.geojson.
+Cada capa se carga una vez por worker, se proyecta a Web Mercator y se indexa con
+un STRtree; cada tile recorta (clip_by_rect) y simplifica en metros según el zoom.
+Los tiles generados se guardan en disco con desalojo LRU (por mtime).
+"""
+import os
+import threading
+from pathlib import Path
+import numpy as np
+from config import Settings
+from .capas import file_version, read_features, source_path
+
+EXTENT = 4096
+BUFFER = 64            # en unidades de tile (de 4096), evita cortes visibles entre tiles
+SIMPLIFY_PX = 0.5      # tolerancia de simplificación en píxeles de 256
+ORIGIN = 20037508.342789244  # mitad del ancho del mundo en Web Mercator (m)
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """(minx, miny, maxx, maxy) del tile en metros Web Mercator (esquema XYZ)."""
+    size = 2 * ORIGIN / (1 << z)
+    minx = -ORIGIN + x * size
+    maxy = ORIGIN - y * size
+    return minx, maxy - size, minx + size, maxy
+
+def lonlat_to_mercator(coords: np.ndarray) -> np.ndarray:
+    lon = coords[:, 0]
+    lat = np.clip(coords[:, 1], -85.05112878, 85.05112878)
+    x = lon * ORIGIN / 180.0
+    y = np.log(np.tan((90.0 + lat) * np.pi / 360.0)) * ORIGIN / np.pi
+    return np.column_stack([x, y])
+
+def tiles_for_bounds(bounds, z: int):
+    """Tiles (x, y) del zoom z que cubren bounds en metros Mercator."""
+    minx, miny, maxx, maxy = bounds
+    n = 1 << z
+    size = 2 * ORIGIN / n
+    x0 = max(0, int((minx + ORIGIN) // size))
+    x1 = min(n - 1, int((maxx + ORIGIN) // size))
+    y0 = max(0, int((ORIGIN - maxy) // size))
+    y1 = min(n - 1, int((ORIGIN - miny) // size))
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            yield x, y
+
+class TileLayer:
+    def __init__(self, name: str, path: Path, minzoom: int = 0, maxzoom: int = 16):
+        import shapely
+        self.name = name
+        self.path = Path(path)
+        self.minzoom = minzoom
+        self.maxzoom = maxzoom
+        self.version = file_version(self.path)
+
+        geoms, props = read_features(self.path)
+        self.geoms = shapely.transform(geoms, lonlat_to_mercator)
+        self.props = [
+            {k: v for k, v in p.items() if isinstance(v, (str, int, float, bool))}
+            for p in props
+        ]
+        self.is_points = bool(len(self.geoms)) and bool(
+            np.all(shapely.get_type_id(self.geoms) == shapely.GeometryType.POINT)
+        )
+        self.tree = shapely.STRtree(self.geoms)
+        self.bounds = tuple(shapely.total_bounds(self.geoms)) if len(self.geoms) else None
+
+    def render(self, z: int, x: int, y: int) -> bytes | None:
+        """Bytes MVT del tile, o None si no hay features."""
+        import shapely
+        import mapbox_vector_tile
+
+        if z < self.minzoom or z > self.maxzoom:
+            return None
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        pad = (maxx - minx) * BUFFER / EXTENT
+        idx = self.tree.query(shapely.box(minx - pad, miny - pad, maxx + pad, maxy + pad))
+        if idx.size == 0:
+            return None
+        idx.sort()
+
+        geoms = self.geoms[idx]
+        if not self.is_points:
+            geoms = shapely.clip_by_rect(geoms, minx - pad, miny - pad, maxx + pad, maxy + pad)
+            tol = (maxx - minx) / 256.0 * SIMPLIFY_PX
+            geoms = shapely.simplify(geoms, tol, preserve_topology=True)
+        keep = ~shapely.is_empty(geoms)
+        if not keep.any():
+            return None
+
+        features = [
+            {"geometry": g, "properties": self.props[i]}
+            for g, i in zip(geoms[keep], idx[keep])
+        ]
+        return mapbox_vector_tile.encode(
+            [{"name": self.name, "features": features}],
+            default_options={"extents": EXTENT, "quantize_bounds": (minx, miny, maxx, maxy)},
+        )
+
+class DiskTileCache:
+    """Tiles en <dir>/<capa>/<versión>/<z>/<x>/<y>.mvt, acotado a max_bytes (LRU por mtime)."""
+
+    def __init__(self, base_dir, max_bytes: int):
+        self.dir = Path(base_dir)
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _path(self, layer: TileLayer, z, x, y) -> Path:
+        return self.dir / layer.name / layer.version / str(z) / str(x) / f"{y}.mvt"
+
+    def get(self, layer, z, x, y) -> bytes | None:
+        p = self._path(layer, z, x, y)
+        try:
+            data = p.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(p)  # marca de uso para el LRU
+        except OSError:
+            pass
+        return data
+
+    def put(self, layer, z, x, y, data: bytes):
+        p = self._path(layer, z, x, y)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, p)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _files(self):
+        return [p for p in self.dir.rglob("*.mvt") if p.is_file()]
+
+    def _scan_size(self) -> int:
+        return sum(p.stat().st_size for p in self._files())
+
+    def _evict(self):
+        """Borra los tiles menos usados hasta quedar en el 90% del máximo."""
+        files = []
+        for p in self._files():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort()
+        total = sum(f[1] for f in files)
+        objetivo = self.max_bytes * 0.9
+        for _, size, p in files:
+            if total <= objetivo:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._size = total
+
+_layers: dict[str, TileLayer] = {}
+_layers_lock = threading.Lock()
+_disk_cache = None
+
+def layer_path(name: str) -> Path | None:
+    cfg = Settings.TILE_LAYERS.get(name)
+    if not cfg:
+        return None
+    p = source_path(Path(Settings.TILES_SOURCE_DIR) / cfg["archivo"])
+    return p if p.exists() else None
+
+def get_layer(name: str) -> TileLayer | None:
+    """Capa cargada (se recarga si cambió el archivo de origen)."""
+    p = layer_path(name)
+    if p is None:
+        return None
+    with _layers_lock:
+        lyr = _layers.get(name)
+        if lyr is None or lyr.version != file_version(p):
+            cfg = Settings.TILE_LAYERS[name]
+            lyr = _layers[name] = TileLayer(name, p, cfg.get("minzoom", 0), cfg.get("maxzoom", 16))
+        return lyr
+
+def get_disk_cache() -> DiskTileCache:
+    global _disk_cache
+    if _disk_cache is None:
+        _disk_cache = DiskTileCache(Path(Settings.CACHE_DIR) / "tiles", Settings.TILES_CACHE_MAX_MB * 1024 * 1024)
+    return _disk_cache
+
+def get_tile(layer: TileLayer, z: int, x: int, y: int) -> bytes | None:
+    cache = get_disk_cache()
+    data = cache.get(layer, z, x, y)
+    if data is not None:
+        return data or None  # archivo vacío = tile sin features
+    data = layer.render(z, x, y)
+    cache.put(layer, z, x, y, data or b"")
+    return data
+
+def seed(layer: TileLayer, zmin: int, zmax: int, bounds=None, progress=None) -> int:
+    """Genera y cachea los tiles de la capa entre zmin y zmax. Devuelve cuántos tiles tienen datos."""
+    import shapely
+    bounds = bounds or layer.bounds
+    if bounds is None:
+        return 0
+    hechos = 0
+    for z in range(max(zmin, layer.minzoom), min(zmax, layer.maxzoom) + 1):
+        for x, y in tiles_for_bounds(bounds, z):
+            if layer.tree.query(shapely.box(*tile_bounds(z, x, y))).size == 0:
+                continue
+            if get_tile(layer, z, x, y):
+                hechos += 1
+        if progress:
+            progress(z, hechos)
+    return hechos
+
+def bbox_to_mercator(bbox) -> tuple:
+    """(min_lon, min_lat, max_lon, max_lat) -> bounds en metros Mercator."""
+    pts = lonlat_to_mercator(np.array([[bbox[0], bbox[1]], [bbox[2], bbox[3]]], dtype=np.float64))
+    return pts[0, 0], pts[0, 1], pts[1, 0], pts[1, 1]
+
+def available_layers() -> dict:
+    """{capa: {"version", "minzoom", "maxzoom"}} de las capas con archivo en build/, sin cargarlas."""
+    out = {}
+    for name, cfg in Settings.TILE_LAYERS.items():
+        p = layer_path(name)
+        if p is not None:
+            out[name] = {"version": file_version(p), "minzoom": cfg.get("minzoom", 0),
+                         "maxzoom": cfg.get("maxzoom", 16)}
+    return out
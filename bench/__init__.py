@@ -0,0 +1,9 @@
+"""
+Benchmarks de ruteo y ABM de locales.
+
+  python -m bench.generate --locales 10000 --meses 3 --reset   # datos sintéticos
+  python -m bench.run                                           # corrida (JSON en bench/results/)
+  python -m bench.run --concurrencia 8 --duracion 20 --comparar bench/results/<anterior>.json
+
+Usan la base de DATABASE_URL (SQLite o un Postgres local), nunca la de producción.
+"""
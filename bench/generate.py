@@ -0,0 +1,162 @@
+"""
+Genera una empresa sintética para benchmarks: locales repartidos por Paraguay (más
+densos en las ciudades grandes), centros logísticos y meses de historial de rutas.
+
+Uso:
+  python -m bench.generate --locales 10000 --meses 3 --reset
+  python -m bench.generate --locales 100000 --paradas 20 --company bench
+"""
+import argparse
+import time
+from datetime import date, timedelta
+import numpy as np
+
+# (ciudad, lat, lon, dispersión km, peso); el resto del peso va a zonas rurales
+CIUDADES = [
+    ("Asunción", -25.2637, -57.5759, 6, 0.28), ("San Lorenzo", -25.3397, -57.5088, 4, 0.07),
+    ("Luque", -25.2700, -57.4872, 4, 0.06), ("Capiatá", -25.3552, -57.4454, 4, 0.05),
+    ("Lambaré", -25.3468, -57.6065, 3, 0.04), ("Fernando de la Mora", -25.3200, -57.5400, 3, 0.04),
+    ("Ciudad del Este", -25.5097, -54.6111, 6, 0.10), ("Encarnación", -27.3306, -55.8667, 5, 0.07),
+    ("Pedro Juan Caballero", -22.5472, -55.7333, 4, 0.03), ("Coronel Oviedo", -25.4450, -56.4400, 3, 0.03),
+    ("Concepción", -23.4064, -57.4344, 3, 0.02), ("Villarrica", -25.7500, -56.4333, 3, 0.02),
+    ("Caaguazú", -25.4667, -55.9833, 3, 0.02),
+]
+RURAL_BBOX = (-27.2, -58.0, -22.6, -54.7)  # región oriental
+TIPOS = ["Despensa", "Almacén", "Autoservicio", "Minimercado", "Kiosco", "Super", "Bodega"]
+APELLIDOS = ["Benítez", "González", "Martínez", "Giménez", "Villalba", "Ramírez", "Núñez", "Ortiz",
+             "Duarte", "Acosta", "Cáceres", "Ayala", "Báez", "Franco", "Rojas", "Sanabria"]
+LOTE = 5000
+
+def synthetic_locales(n: int, rng) -> dict:
+    """Columnas (lat, lon, city, name, venta, rank) de n locales."""
+    pesos = np.array([c[4] for c in CIUDADES])
+    pesos = np.append(pesos, max(1.0 - pesos.sum(), 0.0))
+    origen = rng.choice(len(pesos), size=n, p=pesos / pesos.sum())
+
+    lat, lon = np.empty(n), np.empty(n)
+    city = np.empty(n, dtype=object)
+    for j, (nombre, clat, clon, km, _) in enumerate(CIUDADES):
+        m = origen == j
+        k = int(m.sum())
+        lat[m] = clat + rng.normal(0, km / 111.0, k)
+        lon[m] = clon + rng.normal(0, km / (111.0 * np.cos(np.radians(clat))), k)
+        city[m] = nombre
+    m = origen == len(CIUDADES)
+    lat[m] = rng.uniform(RURAL_BBOX[0], RURAL_BBOX[2], int(m.sum()))
+    lon[m] = rng.uniform(RURAL_BBOX[1], RURAL_BBOX[3], int(m.sum()))
+    city[m] = None
+
+    venta = np.round(rng.lognormal(13.0, 0.9, n), -3)  # ~450.000 Gs/día de mediana
+    rank = np.empty(n, dtype=np.int64)
+    rank[np.argsort(-venta, kind="stable")] = np.arange(1, n + 1)
+    name = [f"{TIPOS[a]} {APELLIDOS[b]} {i}" for i, (a, b) in
+            enumerate(zip(rng.integers(0, len(TIPOS), n), rng.integers(0, len(APELLIDOS), n)))]
+    return {"lat": lat, "lon": lon, "city": city, "name": name, "venta": venta, "rank": rank}
+
+def _reset(company: str):
+    from sqlalchemy import delete, select
+    from app.database import db
+    from app.models import Depot, Local, Ruta, RutaDetalle, Territorio
+    rutas = select(Ruta.id).where(Ruta.company_slug == company)
+    db.session.execute(delete(RutaDetalle).where(RutaDetalle.ruta_id.in_(rutas)))
+    db.session.execute(delete(Ruta).where(Ruta.company_slug == company))
+    db.session.execute(delete(Territorio).where(Territorio.company_slug == company))
+    db.session.execute(delete(Local).where(Local.company_slug == company))
+    db.session.execute(delete(Depot).where(Depot.company_slug == company))
+
+def generate(company: str, n_locales: int, meses: int, paradas: int, seed: int = 0) -> dict:
+    import pandas as pd
+    from sqlalchemy import insert, select
+    from app.database import db
+    from app.models import Depot, Local, Ruta, RutaDetalle, User, bump_data_version
+    from app.utils import areas
+    from app.utils.ruteo.geo import geohash_encode_many
+    from app.utils.text import normalize_search_series
+
+    rng = np.random.default_rng(seed)
+    cols = synthetic_locales(n_locales, rng)
+    ids = [f"{company}_b{i:06d}" for i in range(n_locales)]
+    gh = geohash_encode_many(cols["lat"], cols["lon"])
+    busqueda = normalize_search_series(pd.Series(cols["name"]), pd.Series(cols["city"]), pd.Series(ids))
+    codes = areas.assign_areas(cols["lat"], cols["lon"])
+
+    filas = [
+        {"id": ids[i], "company_slug": company, "name": cols["name"][i], "city": cols["city"][i],
+         "lat": float(cols["lat"][i]), "lon": float(cols["lon"][i]), "rank": int(cols["rank"][i]),
+         "venta_por_dia": float(cols["venta"][i]), "active": bool(rng.random() > 0.03),
+         "geohash": str(gh[i]), "busqueda": busqueda.iat[i], "dpto_cod": codes["dpto"][i],
+         "distrito_cod": codes["distrito"][i], "barrio_cod": codes["barrio"][i]}
+        for i in range(n_locales)
+    ]
+    for i in range(0, len(filas), LOTE):
+        db.session.execute(insert(Local), filas[i:i + LOTE])
+
+    depots = [("CL Central", -25.3000, -57.5900, True), ("CL Este", -25.5000, -54.6500, False),
+              ("CL Sur", -27.3200, -55.8800, False)]
+    db.session.execute(insert(Depot), [
+        {"company_slug": company, "name": nombre, "lat": la, "lon": lo, "active": act}
+        for nombre, la, lo, act in depots
+    ])
+    depot_id = db.session.execute(
+        select(Depot.id).where(Depot.company_slug == company, Depot.active.is_(True)).limit(1)
+    ).scalar()
+    admin_id = db.session.execute(select(User.id).order_by(User.id).limit(1)).scalar()
+
+    # historial: Lunes a Sábado, AM/PM, paradas sorteadas con peso por venta
+    hoy = date.today()
+    inicio = hoy - timedelta(days=30 * meses)
+    dias = [inicio + timedelta(days=d) for d in range((hoy - inicio).days) if (inicio + timedelta(days=d)).weekday() < 6]
+    claves = [(d, t) for d in dias for t in ("AM", "PM")]
+    p = cols["venta"] / cols["venta"].sum()
+    rutas_ids = []
+    for i in range(0, len(claves), LOTE):
+        res = db.session.execute(
+            insert(Ruta).returning(Ruta.id, sort_by_parameter_order=True),
+            [{"company_slug": company, "fecha": d, "turno": t, "cerrado": bool(rng.random() < 0.5),
+              "depot_id": depot_id, "creado_por": admin_id} for d, t in claves[i:i + LOTE]],
+        )
+        rutas_ids.extend(res.scalars().all())
+
+    detalles = []
+    k = min(paradas, n_locales)
+    for ruta_id in rutas_ids:
+        elegidos = rng.choice(n_locales, size=k, replace=False, p=p)
+        detalles.extend({"company_slug": company, "ruta_id": ruta_id, "orden": j, "local_id": ids[x]}
+                        for j, x in enumerate(elegidos, 1))
+        if len(detalles) >= LOTE:
+            db.session.execute(insert(RutaDetalle), detalles)
+            detalles = []
+    if detalles:
+        db.session.execute(insert(RutaDetalle), detalles)
+
+    bump_data_version(company)
+    db.session.commit()
+    return {"locales": n_locales, "depots": len(depots), "rutas": len(rutas_ids), "paradas": len(rutas_ids) * k}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Datos sintéticos para benchmarks.")
+    ap.add_argument("--locales", type=int, default=10000, help="Cantidad de locales (1000, 10000, 100000...).")
+    ap.add_argument("--meses", type=int, default=3, help="Meses de historial de rutas.")
+    ap.add_argument("--paradas", type=int, default=15, help="Paradas por ruta.")
+    ap.add_argument("--company", default=None, help="Empresa (por defecto PROJECT_SLUG).")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--reset", action="store_true", help="Borrar antes los datos de la empresa.")
+    args = ap.parse_args(argv)
+
+    from app import create_app
+    from app.models import init_db
+    from config import Settings
+
+    app = create_app()
+    company = args.company or Settings.PROJECT_SLUG
+    with app.app_context():
+        init_db()
+        if args.reset:
+            _reset(company)
+        t0 = time.perf_counter()
+        res = generate(company, args.locales, args.meses, args.paradas, args.seed)
+    print(f"{company}: {res['locales']} locales, {res['rutas']} rutas, {res['paradas']} paradas "
+          f"en {time.perf_counter() - t0:.1f}s")
+
+if __name__ == "__main__":
+    main()
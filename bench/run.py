@@ -0,0 +1,298 @@
+"""
+Corre los escenarios contra la app con el test client de Flask (sin red ni servidor) y
+guarda un JSON con p50/p95, consultas SQL por request y memoria, para comparar corridas.
+
+Uso:
+  python -m bench.run                                  # todos los escenarios, 30 repeticiones
+  python -m bench.run -e map_data -e exportar -n 50
+  python -m bench.run --concurrencia 8 --duracion 20   # además, carga concurrente mezclada
+  python -m bench.run --comparar bench/results/anterior.json
+"""
+import argparse
+import json
+import platform
+import random
+import resource
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import numpy as np
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+ESPERADOS = {200, 302, 304}
+
+# ---------- contador de consultas por thread ----------
+_local = threading.local()
+
+def _contar(*_):
+    _local.consultas = getattr(_local, "consultas", 0) + 1
+
+def _consultas() -> int:
+    return getattr(_local, "consultas", 0)
+
+# ---------- escenarios ----------
+class Contexto:
+    """Datos de la empresa que los escenarios sortean (ids, términos de búsqueda, etag)."""
+
+    def __init__(self, app):
+        from sqlalchemy import select
+        from app.database import db
+        from app.models import Local, User
+        from config import Settings
+        self.app = app
+        self.settings = Settings
+        with app.app_context():
+            self.ids = db.session.execute(
+                select(Local.id).where(Local.company_slug == Settings.PROJECT_SLUG, Local.active.is_(True))
+            ).scalars().all()
+            self.terminos = [n.split()[1] for n in db.session.execute(
+                select(Local.name).where(Local.company_slug == Settings.PROJECT_SLUG).limit(200)
+            ).scalars() if len(n.split()) > 1] or ["a"]
+            self.user_id = db.session.execute(select(User.id).order_by(User.id).limit(1)).scalar()
+        self.etag = None
+
+    def client(self, logueado: bool = True):
+        c = self.app.test_client()
+        if logueado:
+            with c.session_transaction() as s:
+                s["_user_id"] = str(self.user_id)
+                s["_fresh"] = True
+        return c
+
+def esc_login(ctx, c, rng):
+    return ctx.app.test_client().post("/login", data={
+        "username": ctx.settings.DEFAULT_ADMIN_EMAIL, "password": ctx.settings.DEFAULT_ADMIN_PASSWORD})
+
+def esc_map_data(ctx, c, rng):
+    return c.get("/ruteo/map-data?formato=columnar")
+
+def esc_map_data_304(ctx, c, rng):
+    if ctx.etag is None:
+        ctx.etag = c.get("/ruteo/map-data?formato=columnar").headers.get("ETag")
+    return c.get("/ruteo/map-data?formato=columnar", headers={"If-None-Match": ctx.etag or ""})
+
+def esc_list_locales(ctx, c, rng):
+    return c.get("/locales/")
+
+def esc_list_locales_busqueda(ctx, c, rng):
+    return c.get(f"/locales/?q={rng.choice(ctx.terminos)}&orden=venta&dir=desc")
+
+def esc_guardar(ctx, c, rng):
+    # fechas futuras: no pisa el historial generado
+    fecha = date.today() + timedelta(days=rng.randint(30, 400))
+    return c.post("/ruteo/guardar", json={
+        "fecha": fecha.isoformat(), "turno": rng.choice(["AM", "PM"]), "cerrado": False,
+        "paradas": rng.sample(ctx.ids, min(15, len(ctx.ids))),
+    })
+
+def _esperar_trabajo(c, r, intervalo_s: float = 0.05):
+    """
+    Sigue un trabajo encolado (202) hasta su resultado: mide la espera de punta a punta.
+    Las consultas del proceso del pool no entran en el conteo del worker.
+    """
+    if r.status_code != 202:
+        return r
+    url = r.get_json()["estado_url"]
+    while True:
+        estado = c.get(url).get_json()
+        if estado.get("estado") in ("listo", "error"):
+            break
+        time.sleep(intervalo_s)
+    r = c.get(f"{url}/resultado")
+    r.get_data()
+    return r
+
+def esc_exportar(ctx, c, rng):
+    hasta = date.today()
+    return _esperar_trabajo(c, c.get(f"/ruteo/exportar?desde={(hasta - timedelta(days=30)).isoformat()}&hasta={hasta.isoformat()}"))
+
+def esc_exportar_csv(ctx, c, rng):
+    hasta = date.today()
+    return _esperar_trabajo(c, c.get(f"/ruteo/exportar?formato=csv&desde={(hasta - timedelta(days=30)).isoformat()}&hasta={hasta.isoformat()}"))
+
+ESCENARIOS = {
+    "login": esc_login,
+    "map_data": esc_map_data,
+    "map_data_304": esc_map_data_304,
+    "list_locales": esc_list_locales,
+    "list_locales_busqueda": esc_list_locales_busqueda,
+    "guardar": esc_guardar,
+    "exportar": esc_exportar,
+    "exportar_csv": esc_exportar_csv,
+}
+
+# ---------- medición ----------
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return float("nan")
+
+def _pico_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # KB en Linux
+
+def _medir(fn, ctx, c, rng):
+    q0 = _consultas()
+    t0 = time.perf_counter()
+    try:
+        r = fn(ctx, c, rng)
+        ok = r.status_code in ESPERADOS
+    except Exception:
+        ok = False
+    return (time.perf_counter() - t0) * 1000.0, _consultas() - q0, ok
+
+def _resumen(lat_ms, consultas, errores) -> dict:
+    a = np.asarray(lat_ms) if lat_ms else np.array([np.nan])
+    q = np.asarray(consultas) if consultas else np.array([0])
+    return {
+        "n": len(lat_ms), "errores": errores,
+        "p50_ms": round(float(np.percentile(a, 50)), 2), "p95_ms": round(float(np.percentile(a, 95)), 2),
+        "max_ms": round(float(a.max()), 2),
+        "consultas_media": round(float(q.mean()), 2), "consultas_max": int(q.max()),
+    }
+
+def run_secuencial(ctx, nombres, n: int, warmup: int, seed: int) -> dict:
+    out = {}
+    for nombre in nombres:
+        fn = ESCENARIOS[nombre]
+        rng = random.Random(seed)
+        c = ctx.client()
+        for _ in range(warmup):
+            _medir(fn, ctx, c, rng)
+        rss0 = _rss_mb()
+        lat, qs, err = [], [], 0
+        for _ in range(n):
+            ms, q, ok = _medir(fn, ctx, c, rng)
+            lat.append(ms)
+            qs.append(q)
+            err += not ok
+        out[nombre] = _resumen(lat, qs, err) | {
+            "rss_mb": round(_rss_mb(), 1), "rss_delta_mb": round(_rss_mb() - rss0, 1),
+            "rss_pico_mb": round(_pico_rss_mb(), 1),
+        }
+        r = out[nombre]
+        print(f"  {nombre:24s} p50 {r['p50_ms']:8.1f} ms  p95 {r['p95_ms']:8.1f} ms  "
+              f"{r['consultas_media']:6.1f} consultas  {r['errores']} errores")
+    return out
+
+def run_concurrente(ctx, nombres, hilos: int, duracion_s: float, seed: int) -> dict:
+    """`hilos` threads con escenarios sorteados durante `duracion_s`; latencias por escenario."""
+    res = defaultdict(lambda: ([], [], [0]))
+    lock = threading.Lock()
+    fin = time.perf_counter() + duracion_s
+
+    def worker(i):
+        rng = random.Random(seed + i)
+        c = ctx.client()
+        while time.perf_counter() < fin:
+            nombre = rng.choice(nombres)
+            ms, q, ok = _medir(ESCENARIOS[nombre], ctx, c, rng)
+            with lock:
+                lat, qs, err = res[nombre]
+                lat.append(ms)
+                qs.append(q)
+                err[0] += not ok
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(hilos)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total_s = time.perf_counter() - t0
+
+    por = {nombre: _resumen(lat, qs, err[0]) for nombre, (lat, qs, err) in res.items()}
+    todas = [ms for lat, _, _ in res.values() for ms in lat]
+    total = sum(r["n"] for r in por.values())
+    print(f"  {hilos} hilos, {total} requests en {total_s:.1f}s = {total / total_s:.1f} req/s")
+    return {
+        "hilos": hilos, "duracion_s": round(total_s, 2), "requests": total,
+        "req_s": round(total / total_s, 2),
+        "p50_ms": round(float(np.percentile(todas, 50)), 2) if todas else None,
+        "p95_ms": round(float(np.percentile(todas, 95)), 2) if todas else None,
+        "errores": sum(r["errores"] for r in por.values()),
+        "rss_pico_mb": round(_pico_rss_mb(), 1),
+        "escenarios": por,
+    }
+
+def comparar(actual: dict, anterior: dict):
+    print(f"\nvs {anterior.get('fecha')} ({anterior.get('git') or '?'}):")
+    for nombre, r in actual["escenarios"].items():
+        prev = anterior.get("escenarios", {}).get(nombre)
+        if not prev:
+            continue
+        def delta(k):
+            a, b = r[k], prev[k]
+            return f"{(a - b) / b * 100:+6.1f}%" if b else "   n/a"
+        print(f"  {nombre:24s} p50 {delta('p50_ms')}  p95 {delta('p95_ms')}  "
+              f"consultas {r['consultas_media']:.1f} (antes {prev['consultas_media']:.1f})")
+
+def _git() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parents[1], timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de endpoints de ruteo y locales.")
+    ap.add_argument("-e", "--escenario", action="append", choices=sorted(ESCENARIOS),
+                    help="Escenario a correr (repetible). Por defecto, todos.")
+    ap.add_argument("-n", type=int, default=30, help="Repeticiones medidas por escenario.")
+    ap.add_argument("--warmup", type=int, default=3, help="Repeticiones previas sin medir.")
+    ap.add_argument("--concurrencia", type=int, default=0, help="Hilos del modo concurrente (0 = no correrlo).")
+    ap.add_argument("--duracion", type=float, default=10.0, help="Segundos del modo concurrente.")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--salida", default=None, help="JSON de resultados (por defecto bench/results/<fecha>-<git>.json).")
+    ap.add_argument("--comparar", default=None, help="JSON de una corrida anterior.")
+    args = ap.parse_args(argv)
+
+    from sqlalchemy import event, func, select
+    from app import create_app
+    from app.database import db
+    from app.models import Local, Ruta
+    from config import Settings
+
+    app = create_app()
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", _contar)
+        locales = db.session.execute(select(func.count()).select_from(Local)
+                                     .where(Local.company_slug == Settings.PROJECT_SLUG)).scalar()
+        rutas = db.session.execute(select(func.count()).select_from(Ruta)
+                                   .where(Ruta.company_slug == Settings.PROJECT_SLUG)).scalar()
+        backend = db.engine.url.get_backend_name()
+    if not locales:
+        raise SystemExit("No hay locales: correr antes python -m bench.generate")
+
+    ctx = Contexto(app)
+    nombres = args.escenario or list(ESCENARIOS)
+    print(f"{Settings.PROJECT_SLUG}: {locales} locales, {rutas} rutas")
+    resultado = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "git": _git(),
+        "python": platform.python_version(),
+        "db": backend,
+        "locales": locales,
+        "rutas": rutas,
+        "n": args.n,
+        "escenarios": run_secuencial(ctx, nombres, args.n, args.warmup, args.seed),
+    }
+    if args.concurrencia > 0:
+        resultado["concurrente"] = run_concurrente(ctx, nombres, args.concurrencia, args.duracion, args.seed)
+    resultado["rss_pico_mb"] = round(_pico_rss_mb(), 1)
+
+    salida = Path(args.salida) if args.salida else \
+        RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{resultado['git'] or 'local'}.json"
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    salida.write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+    print(f"\n-> {salida}")
+
+    if args.comparar:
+        comparar(resultado, json.loads(Path(args.comparar).read_text()))
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
 import os
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
 
 class Settings:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")
@@ -6,13 +9,103 @@ class Settings:
     SQLALCHEMY_ECHO = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Desarrollo: crear tablas y admin al arrancar (en producción: `flask init-db` en el release)
+    AUTO_INIT_DB = os.getenv("AUTO_INIT_DB", "0") == "1"
+
     PROJECT_SLUG = os.getenv("PROJECT_SLUG", "tenant")
     PROJECT_NAME = os.getenv("PROJECT_NAME", "Tenant")
     BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
 
+    # Multi-tenant: "host=empresa,host2=empresa2" para los usuarios de plataforma (User.plataforma)
+    # y las páginas públicas (cualquier otro usuario logueado siempre ve la suya). Cachés en memoria
+    # por empresa: cuántas empresas se mantienen (LRU) y entradas de map-data por empresa
+    TENANT_HOSTS = {
+        h.strip().lower(): c.strip()
+        for h, _, c in (par.partition("=") for par in os.getenv("TENANT_HOSTS", "").split(","))
+        if h.strip() and c.strip()
+    }
+    TENANT_CACHE_MAX = int(os.getenv("TENANT_CACHE_MAX", "32"))
+    MAP_DATA_CACHE_POR_EMPRESA = int(os.getenv("MAP_DATA_CACHE_POR_EMPRESA", "8"))
+
     DEFAULT_ADMIN_EMAIL = os.getenv("DEFAULT_ADMIN_EMAIL", "admin@example.com")
     DEFAULT_ADMIN_PASSWORD = os.getenv("DEFAULT_ADMIN_PASSWORD", "admin")
 
+    # Admins (perfilado por request, /metrics sin token): emails separados por coma
+    ADMIN_EMAILS = [e.strip().lower() for e in os.getenv("ADMIN_EMAILS", DEFAULT_ADMIN_EMAIL).split(",") if e.strip()]
+
+    # Usuario de la sesión: caché por worker (segundos de vigencia y máximo de usuarios)
+    USER_CACHE_TTL_S = float(os.getenv("USER_CACHE_TTL_S", "60"))
+    USER_CACHE_MAX = int(os.getenv("USER_CACHE_MAX", "1024"))
+
+    # Instrumentación: buckets de latencia (s), umbrales de request lento, token de /metrics
+    # (Authorization: Bearer ...) e intervalo del perfilador por muestreo (X-Profile: 1)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+    METRICS_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+    SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "1000"))
+    SLOW_REQUEST_CONSULTAS = int(os.getenv("SLOW_REQUEST_CONSULTAS", "30"))
+    PROFILER_INTERVALO_MS = float(os.getenv("PROFILER_INTERVALO_MS", "5"))
+
+    # Cachés en disco (matriz de distancias, etc.)
+    CACHE_DIR = os.getenv("CACHE_DIR", str(BASE_DIR / "instance" / "cache"))
+
+    # Costos por calle guardados por punto (matrix.py, con red vial): cuántos vecinos y dentro
+    # de qué radio (km); los pares más lejanos se estiman en línea recta
+    MATRIZ_VECINOS = int(os.getenv("MATRIZ_VECINOS", "40"))
+    MATRIZ_RADIO_KM = float(os.getenv("MATRIZ_RADIO_KM", "5"))
+
+    # Ruteo: presupuesto de tiempo del optimizador (ms) y máximo permitido por request
+    OPTIMIZADOR_TIEMPO_MS = int(os.getenv("OPTIMIZADOR_TIEMPO_MS", "300"))
+    OPTIMIZADOR_TIEMPO_MAX_MS = int(os.getenv("OPTIMIZADOR_TIEMPO_MAX_MS", "800"))
+
+    # Mapa: bajo este zoom /ruteo/stores agrupa en clusters; sobre este total de locales
+    # el mapa pide sólo los de la vista
+    STORES_CLUSTER_ZOOM = int(os.getenv("STORES_CLUSTER_ZOOM", "13"))
+    STORES_VIEWPORT_MIN = int(os.getenv("STORES_VIEWPORT_MIN", "3000"))
+
+    # /ruteo/cercanos: máximo de locales por respuesta
+    CERCANOS_MAX = int(os.getenv("CERCANOS_MAX", "200"))
+
+    # Red vial offline (flask red-vial-build extracto.osm.pbf): archivo del grafo, si se usa
+    # para distancias/tiempos, matrices entre puntos cacheadas por worker, orígenes por corrida
+    # de Dijkstra y margen (km) del recorte alrededor de los puntos
+    RED_VIAL_ARCHIVO = os.getenv("RED_VIAL_ARCHIVO", str(BASE_DIR / "build" / "red_vial.npz"))
+    RED_VIAL_USAR = os.getenv("RED_VIAL_USAR", "1") == "1"
+    RED_VIAL_CACHE_MATRICES = int(os.getenv("RED_VIAL_CACHE_MATRICES", "128"))
+    RED_VIAL_LOTE = int(os.getenv("RED_VIAL_LOTE", "32"))
+    RED_VIAL_MARGEN_KM = float(os.getenv("RED_VIAL_MARGEN_KM", "3"))
+    RED_VIAL_MAX_PUNTOS = int(os.getenv("RED_VIAL_MAX_PUNTOS", "200"))
+
+    # Métricas de rutas: velocidad media (km/h) y tiempo de atención por parada (min)
+    RUTA_VELOCIDAD_KMH = float(os.getenv("RUTA_VELOCIDAD_KMH", "25"))
+    RUTA_SERVICIO_MIN = float(os.getenv("RUTA_SERVICIO_MIN", "10"))
+
+    # Territorios: máximo de particiones por empresa
+    TERRITORIOS_MAX = int(os.getenv("TERRITORIOS_MAX", "50"))
+
+    # Plan semanal: "percentil:visitas" (top 10% -> 3 visitas, top 30% -> 2), tope y tiempo por ruta
+    PLAN_FRECUENCIAS = os.getenv("PLAN_FRECUENCIAS", "0.10:3,0.30:2")
+    PLAN_MAX_VISITAS = int(os.getenv("PLAN_MAX_VISITAS", "3"))
+    PLAN_TIEMPO_MS_POR_RUTA = int(os.getenv("PLAN_TIEMPO_MS_POR_RUTA", "150"))
+
+    # ABM locales: filas por página del listado
+    LOCALES_POR_PAGINA = int(os.getenv("LOCALES_POR_PAGINA", "50"))
+
+    # Importación masiva de locales: máximo de filas por archivo
+    IMPORT_MAX_FILAS = int(os.getenv("IMPORT_MAX_FILAS", "20000"))
+
+    # Exportación de rutas: rango máximo (días) por pedido
+    EXPORT_MAX_DIAS = int(os.getenv("EXPORT_MAX_DIAS", "400"))
+
+    # Trabajos en segundo plano (exportar, planificar semana; /jobs): procesos del pool por
+    # worker de gunicorn, trabajos activos por empresa, vigencia del resultado (s), tiempo tras
+    # el que un trabajo sin terminar se da por perdido (s) y carpeta de los archivos
+    JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+    JOBS_MAX_POR_EMPRESA = int(os.getenv("JOBS_MAX_POR_EMPRESA", "2"))
+    JOBS_TTL_S = int(os.getenv("JOBS_TTL_S", "3600"))
+    JOBS_TIMEOUT_S = int(os.getenv("JOBS_TIMEOUT_S", "1800"))
+    JOBS_DIR = os.getenv("JOBS_DIR", str(BASE_DIR / "instance" / "jobs"))
+
     SUPABASE_ASSETS = {
         "departamentos": "https://rrywkemhyzcfsznxgwpp.supabase.co/storage/v1/object/public/data/departamentos.lite.geojson",
         "distritos":     "https://rrywkemhyzcfsznxgwpp.supabase.co/storage/v1/object/public/data/distritos.lite.geojson",
@@ -20,3 +113,35 @@ class Settings:
         #"manzanas":      "https://rrywkemhyzcfsznxgwpp.supabase.co/storage/v1/object/public/data/manzanas.lite.geojson",
         #"unidades":      "https://rrywkemhyzcfsznxgwpp.supabase.co/storage/v1/object/public/data/unidades_economicas.lite.geojson",
     }
+
+    # Capas servidas por la app desde build/ (/capas/<capa>/<hash>.<formato>): nombre base de
+    # los archivos de scripts/preprocess_layers*.py. SUPABASE_ASSETS queda para las que no estén
+    CAPAS = {
+        "departamentos": "departamentos",
+        "distritos":     "distritos",
+        "barrios":       "barloc_2025",
+        "manzanas":      "manzanas",
+        "unidades":      "unidades_economicas",
+    }
+
+    # Vector tiles (MVT) generados a partir de build/ (scripts/preprocess_layers*.py). Desde la
+    # geometría sin simplificar (*.full.geojson, o su .parquet si está): cada tile simplifica
+    # según su zoom y lo que ya quitó la versión lite no se recupera
+    TILES_SOURCE_DIR = os.getenv("TILES_SOURCE_DIR", str(BASE_DIR / "build"))
+    TILES_CACHE_MAX_MB = int(os.getenv("TILES_CACHE_MAX_MB", "512"))
+    TILE_LAYERS = {
+        "departamentos": {"archivo": "departamentos.full.geojson",        "minzoom": 5,  "maxzoom": 12},
+        "distritos":     {"archivo": "distritos.full.geojson",            "minzoom": 7,  "maxzoom": 14},
+        "barrios":       {"archivo": "barloc_2025.full.geojson",          "minzoom": 10, "maxzoom": 16},
+        "manzanas":      {"archivo": "manzanas.full.geojson",             "minzoom": 13, "maxzoom": 16},
+        "unidades":      {"archivo": "unidades_economicas.full.geojson",  "minzoom": 12, "maxzoom": 16},
+    }
+
+    # Áreas administrativas de cada local (flask locales-areas): capa de build/ sin simplificar
+    # (*.full.geojson, o su .parquet si está) y campos que forman el código (se
+    # concatenan los presentes). Las *.lite están simplificadas: corren los bordes
+    AREAS_ADMIN = {
+        "dpto":     {"archivo": "departamentos.full.geojson", "codigo": ["DPTO"]},
+        "distrito": {"archivo": "distritos.full.geojson",     "codigo": ["DPTO", "DISTRITO"]},
+        "barrio":   {"archivo": "barloc_2025.full.geojson",   "codigo": ["DPTO", "DISTRITO", "BARLOC"]},
+    }
@@ -2,4 +2,7 @@ from app import create_app
 app = create_app()
 
 if __name__ == "__main__":
+    from app.models import init_db
+    with app.app_context():
+        init_db()
     app.run(host="0.0.0.0", port=8000, debug=True)
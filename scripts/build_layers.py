@@ -0,0 +1,141 @@
+# scripts/build_layers.py
+"""
+Build de capas a partir de scripts/layers_manifest.json.
+
+- Corre las capas en paralelo (un proceso por capa, hasta --jobs).
+- Saltea las capas cuyo zip, parámetros y código de conversión no cambiaron desde
+  el último build (caché en build/.build_cache.json) y cuyas salidas siguen en build/.
+
+Uso:
+  python scripts/build_layers.py                 # todas las capas del manifiesto
+  python scripts/build_layers.py manzanas        # sólo algunas
+  python scripts/build_layers.py --force --jobs 2
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data"
+OUT_DIR = BASE_DIR / "build"
+MANIFEST = SCRIPTS_DIR / "layers_manifest.json"
+CACHE_FILE = OUT_DIR / ".build_cache.json"
+CONVERTER = SCRIPTS_DIR / "preprocess_layers_advanced.py"
+# código que determina las salidas: el conversor y los módulos que importa
+CONVERTER_DEPS = (CONVERTER, SCRIPTS_DIR / "topology.py")
+
+def _sha256(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while True:
+            b = fh.read(chunk)
+            if not b:
+                break
+            h.update(b)
+    return h.hexdigest()
+
+def _load_json(path: Path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return default
+
+def _save_cache(cache: dict):
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(cache, fh, indent=2, sort_keys=True)
+    os.replace(tmp, CACHE_FILE)
+
+def layer_key(layer: dict, zip_hash: str, code_hash: str) -> str:
+    """Hash de todo lo que determina la salida: zip, parámetros y código del conversor."""
+    payload = json.dumps(
+        {"zip": zip_hash, "params": layer.get("params", {}), "code": code_hash},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def expected_outputs(layer: dict) -> list[Path]:
+    name = layer["name"]
+    outs = [OUT_DIR / f"{name}.full.geojson", OUT_DIR / f"{name}.lite.geojson"]
+    params = layer.get("params", {})
+    if params.get("topojson_output"):
+        outs.append(OUT_DIR / f"{name}.topo.json")
+    if params.get("gzip_output", True):
+        outs += [OUT_DIR / f"{p.name}.gz" for p in outs if p.name.endswith((".lite.geojson", ".topo.json"))]
+    if params.get("flatgeobuf_output", True):
+        outs.append(OUT_DIR / f"{name}.fgb")
+    if params.get("geoparquet_output", True):
+        outs.append(OUT_DIR / f"{name}.parquet")
+    return outs
+
+def _build_one(layer: dict) -> tuple[str, float]:
+    """Se ejecuta en un proceso del pool."""
+    from preprocess_layers_advanced import convert_zip
+    t0 = time.perf_counter()
+    convert_zip(DATA_DIR / layer["zip"], layer["name"], **layer.get("params", {}))
+    return layer["name"], time.perf_counter() - t0
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Build paralelo e incremental de capas.")
+    ap.add_argument("capas", nargs="*", help="Nombres del manifiesto (por defecto, todas).")
+    ap.add_argument("--manifest", type=Path, default=MANIFEST)
+    ap.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--force", action="store_true", help="Reconstruir aunque no haya cambios.")
+    args = ap.parse_args(argv)
+
+    manifest = _load_json(args.manifest, {"layers": []})
+    layers = manifest.get("layers", [])
+    if args.capas:
+        desconocidas = set(args.capas) - {l["name"] for l in layers}
+        if desconocidas:
+            ap.error(f"Capas no definidas en el manifiesto: {', '.join(sorted(desconocidas))}")
+        layers = [l for l in layers if l["name"] in args.capas]
+
+    cache = _load_json(CACHE_FILE, {})
+    code_hash = hashlib.sha256("".join(_sha256(p) for p in CONVERTER_DEPS).encode()).hexdigest()
+
+    pendientes = {}
+    for layer in layers:
+        zip_path = DATA_DIR / layer["zip"]
+        if not zip_path.exists():
+            print(f"⚠️  {layer['name']}: falta {zip_path.name}, se omite.")
+            continue
+        key = layer_key(layer, _sha256(zip_path), code_hash)
+        al_dia = cache.get(layer["name"]) == key and all(p.exists() for p in expected_outputs(layer))
+        if al_dia and not args.force:
+            print(f"⏭️  {layer['name']}: sin cambios.")
+            continue
+        pendientes[layer["name"]] = (layer, key)
+
+    if not pendientes:
+        print("Todo al día.")
+        return 0
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    errores = 0
+    jobs = max(1, min(args.jobs, len(pendientes)))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futs = {pool.submit(_build_one, layer): name for name, (layer, _) in pendientes.items()}
+        for fut in as_completed(futs):
+            name = futs[fut]
+            try:
+                _, secs = fut.result()
+            except Exception as e:
+                errores += 1
+                print(f"❌ {name}: {e}")
+                continue
+            cache[name] = pendientes[name][1]
+            _save_cache(cache)  # se guarda por capa: un fallo no invalida las demás
+            print(f"✅ {name} ({secs:.1f}s)")
+
+    return 1 if errores else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,6 +5,7 @@ import tempfile
 from pathlib import Path
 import geopandas as gpd
 from shapely.errors import TopologicalError
+from preprocess_layers_advanced import write_indexed_outputs
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = BASE_DIR / "data"
@@ -48,7 +49,13 @@ def convert_zip(zip_path: Path, name: str, simplify: float = 0.0006):
 
         print(f"  ✅ {full.name} y {lite.name} generados.")
 
+        # FlatGeobuf / GeoParquet sobre la versión completa
+        write_indexed_outputs(gdf, name)
+
 if __name__ == "__main__":
+    # Las capas y sus parámetros ahora viven en scripts/layers_manifest.json:
+    #   python scripts/build_layers.py [capa ...]
+    print("Usá scripts/build_layers.py (build paralelo e incremental desde layers_manifest.json).")
     #convert_zip(DATA_DIR / "Departamentos_Paraguay_INE_2022.zip", "departamentos", 0.0012)
     #convert_zip(DATA_DIR / "Distritos_Paraguay_INE_2022.zip", "distritos", 0.0009)
     #convert_zip(DATA_DIR / "Manzanas_Paraguay_INE_20221.zip", "manzanas", 0.0006)
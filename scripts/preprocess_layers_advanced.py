@@ -5,11 +5,13 @@ import geopandas as gpd
 from shapely.errors import TopologicalError
 from shapely.geometry import Polygon, MultiPolygon, Point
 from shapely import set_precision
+from topology import to_topology
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = BASE_DIR / "data"
 OUT_DIR  = BASE_DIR / "build"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
+GEOPARQUET_ROW_GROUP = 20_000  # filas por row group: el bbox de cada grupo permite saltearlo
 
 def _to_wgs84(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     if gdf.crs is None:
@@ -61,6 +63,24 @@ def _dedupe_points_by_grid(gdf: gpd.GeoDataFrame, grid=1e-5) -> gpd.GeoDataFrame
     gdf = gdf.drop(columns=["_snap"])
     return gdf
 
+def write_indexed_outputs(gdf: gpd.GeoDataFrame, name: str, *, flatgeobuf: bool = True, geoparquet: bool = True):
+    """
+    Siempre con la geometría sin simplificar (los dos scripts de preprocess):
+    <name>.fgb: FlatGeobuf con índice espacial (R-tree Hilbert); el cliente lee por HTTP
+    Range sólo los features del bbox.
+    <name>.parquet: GeoParquet ordenado por curva de Hilbert, con columna bbox por fila
+    (GeoParquet 1.1), para lectura columnar y filtros por bbox que saltean row groups.
+    """
+    if flatgeobuf:
+        gdf.to_file(OUT_DIR / f"{name}.fgb", driver="FlatGeobuf", SPATIAL_INDEX="YES")
+    if geoparquet:
+        ordenado = gdf.iloc[gdf.hilbert_distance().argsort()] if len(gdf) else gdf
+        ordenado.to_parquet(OUT_DIR / f"{name}.parquet", index=False, compression="zstd",
+                            write_covering_bbox=True, row_group_size=GEOPARQUET_ROW_GROUP)
+    hechos = [f"{name}.fgb"] * flatgeobuf + [f"{name}.parquet"] * geoparquet
+    if hechos:
+        print(f"✅ {' y '.join(hechos)} generados.")
+
 def convert_zip(
     zip_path: Path,
     name: str,
@@ -72,7 +92,11 @@ def convert_zip(
     part_area_min: float = 0.0,
     is_points: bool = False,
     dedupe_grid: float = 1e-5,
-    gzip_output: bool = True
+    gzip_output: bool = True,
+    topojson_output: bool = False,
+    flatgeobuf_output: bool = True,
+    geoparquet_output: bool = True,
+    quantization: int = 100_000
 ):
     print(f"Procesando {zip_path.name}…")
     with tempfile.TemporaryDirectory() as td:
@@ -101,18 +125,33 @@ def convert_zip(
         )
         gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
 
-    # 4) simplificar (para polígonos/líneas)
-    if not is_points and simplify_tol > 0:
-        gdf["geometry"] = gdf["geometry"].simplify(simplify_tol, preserve_topology=True)
-
-    # 5) dedupe por grilla (para puntos densos)
+    # 3b) (opcional) TopoJSON: bordes compartidos una sola vez, cada arco simplificado una vez
+    if topojson_output and not is_points:
+        topo = to_topology(gdf, name, simplify_tol=simplify_tol, quantization=quantization)
+        topo_path = OUT_DIR / f"{name}.topo.json"
+        with open(topo_path, "w", encoding="utf-8") as fh:
+            json.dump(topo, fh, separators=(",", ":"), ensure_ascii=False)
+        if gzip_output:
+            with open(topo_path, "rb") as fin, gzip.open(OUT_DIR / f"{name}.topo.json.gz", "wb", compresslevel=9) as fout:
+                fout.write(fin.read())
+        print(f"✅ {topo_path.name} generado ({len(topo['arcs'])} arcos).")
+
+    # 3c) dedupe por grilla (para puntos densos)
     if is_points:
         gdf = _dedupe_points_by_grid(gdf, grid=dedupe_grid)
 
-    # FULL (por si querés guardar una versión de referencia)
+    # FULL: geometría sin simplificar, referencia para cálculos (punto-en-polígono)
     full_path = OUT_DIR / f"{name}.full.geojson"
     gdf.to_file(full_path, driver="GeoJSON")
 
+    # 4) FlatGeobuf / GeoParquet (lectura por bbox y columnar) de la geometría completa, igual
+    # que scripts/preprocess_layers.py: el mismo nombre tiene siempre el mismo contenido
+    write_indexed_outputs(gdf, name, flatgeobuf=flatgeobuf_output, geoparquet=geoparquet_output)
+
+    # 5) simplificar (para polígonos/líneas): sólo la versión liviana
+    if not is_points and simplify_tol > 0:
+        gdf["geometry"] = gdf["geometry"].simplify(simplify_tol, preserve_topology=True)
+
     # LITE
     lite_path = OUT_DIR / f"{name}.lite.geojson"
     gdf.to_file(lite_path, driver="GeoJSON")
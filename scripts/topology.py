@@ -0,0 +1,155 @@
+# scripts/topology.py
+"""
+Salida topológica (formato TopoJSON) para capas de polígonos.
+
+1) Cuantiza las coordenadas a una grilla entera (quantization x quantization).
+2) Detecta nodos: puntos compartidos por anillos con vecinos distintos.
+3) Corta los anillos en los nodos -> arcos; los bordes compartidos quedan UNA vez.
+4) Simplifica cada arco una sola vez (extremos fijos: los vecinos siguen encajando).
+5) Escribe los arcos con deltas enteros.
+
+Se decodifica en el navegador con topojson-client (topojson.feature).
+"""
+import numpy as np
+from shapely.geometry import LineString, MultiPolygon, Polygon
+
+def _rings_of(geom):
+    """[[anillo_exterior, agujero, ...], ...] por polígono (coordenadas float)."""
+    if geom is None or geom.is_empty:
+        return []
+    polys = geom.geoms if isinstance(geom, MultiPolygon) else [geom] if isinstance(geom, Polygon) else []
+    out = []
+    for p in polys:
+        out.append([np.asarray(p.exterior.coords)[:, :2]] + [np.asarray(r.coords)[:, :2] for r in p.interiors])
+    return out
+
+def _quantize_ring(coords: np.ndarray, x0, y0, kx, ky) -> np.ndarray | None:
+    q = np.column_stack([np.rint((coords[:, 0] - x0) / kx), np.rint((coords[:, 1] - y0) / ky)]).astype(np.int64)
+    if len(q) > 1 and (q[0] == q[-1]).all():
+        q = q[:-1]  # el anillo se guarda abierto
+    if len(q) == 0:
+        return None
+    keep = np.ones(len(q), dtype=bool)
+    keep[1:] = (np.diff(q, axis=0) != 0).any(axis=1)
+    q = q[keep]
+    if len(q) > 1 and (q[0] == q[-1]).all():
+        q = q[:-1]
+    return q if len(q) >= 3 else None
+
+def _find_junctions(rings: list[np.ndarray]) -> set:
+    """Puntos (clave entera) que aparecen con pares de vecinos distintos."""
+    if not rings:
+        return set()
+    pts, pares_a, pares_b = [], [], []
+    for r in rings:
+        k = (r[:, 0] << 32) | r[:, 1]
+        prev, nxt = np.roll(k, 1), np.roll(k, -1)
+        pts.append(k)
+        pares_a.append(np.minimum(prev, nxt))
+        pares_b.append(np.maximum(prev, nxt))
+    pts = np.concatenate(pts)
+    trip = np.unique(np.column_stack([pts, np.concatenate(pares_a), np.concatenate(pares_b)]), axis=0)
+    claves, cuenta = np.unique(trip[:, 0], return_counts=True)
+    return set(claves[cuenta > 1].tolist())
+
+def _ring_arcs(r: np.ndarray, junctions: set) -> list[np.ndarray]:
+    keys = ((r[:, 0] << 32) | r[:, 1]).tolist()
+    cortes = [i for i, k in enumerate(keys) if k in junctions]
+    if not cortes:
+        # anillo sin nodos: arranca en el menor punto para que anillos iguales coincidan
+        i0 = int(np.lexsort((r[:, 1], r[:, 0]))[0])
+        r = np.roll(r, -i0, axis=0)
+        return [np.vstack([r, r[:1]])]
+    r = np.roll(r, -cortes[0], axis=0)
+    cortes = [c - cortes[0] for c in cortes] + [len(r)]
+    cerrado = np.vstack([r, r[:1]])
+    return [cerrado[a:b + 1] for a, b in zip(cortes[:-1], cortes[1:])]
+
+class _ArcStore:
+    def __init__(self):
+        self.arcs: list[np.ndarray] = []
+        self.index: dict[bytes, int] = {}
+
+    def ref(self, arc: np.ndarray) -> int:
+        fwd = arc.tobytes()
+        if fwd in self.index:
+            return self.index[fwd]
+        rev = arc[::-1]
+        if rev.tobytes() in self.index:
+            return ~self.index[rev.tobytes()]
+        if (arc[0] == arc[-1]).all():
+            # anillo cerrado: también puede coincidir recorrido al revés desde el mismo punto
+            rev_ring = np.vstack([arc[:1], arc[-2::-1]])
+            if rev_ring.tobytes() in self.index:
+                return ~self.index[rev_ring.tobytes()]
+        i = len(self.arcs)
+        self.arcs.append(arc)
+        self.index[fwd] = i
+        return i
+
+def _simplify_arc(arc: np.ndarray, tol: float) -> np.ndarray:
+    if tol <= 0 or len(arc) <= 2:
+        return arc
+    s = np.rint(np.asarray(LineString(arc).simplify(tol, preserve_topology=True).coords)).astype(np.int64)
+    cerrado = (arc[0] == arc[-1]).all()
+    if cerrado and len(s) < 4:
+        return arc  # no colapsar anillos chicos
+    return s
+
+def _plain(v):
+    """Valores de pandas/numpy -> tipos serializables en JSON."""
+    if hasattr(v, "item"):
+        v = v.item()
+    if isinstance(v, float) and np.isnan(v):
+        return None
+    return v
+
+def _delta(arc: np.ndarray) -> list:
+    d = arc.copy()
+    d[1:] = np.diff(arc, axis=0)
+    return d.tolist()
+
+def to_topology(gdf, name: str, *, simplify_tol: float = 0.0, quantization: int = 100_000) -> dict:
+    """
+    GeoDataFrame de polígonos (EPSG:4326) -> dict TopoJSON con un objeto `name`.
+    `simplify_tol` en grados, como en convert_zip.
+    """
+    minx, miny, maxx, maxy = gdf.total_bounds
+    kx = (maxx - minx) / (quantization - 1) or 1.0
+    ky = (maxy - miny) / (quantization - 1) or 1.0
+
+    props_cols = [c for c in gdf.columns if c != gdf.geometry.name]
+    features = []   # (props, [[anillos cuantizados] por polígono])
+    all_rings = []
+    for geom, props in zip(gdf.geometry, gdf[props_cols].to_dict("records")):
+        polys = []
+        for rings in _rings_of(geom):
+            q = [_quantize_ring(r, minx, miny, kx, ky) for r in rings]
+            if q[0] is None:
+                continue
+            q = [r for r in q if r is not None]
+            polys.append(q)
+            all_rings.extend(q)
+        features.append((props, polys))
+
+    junctions = _find_junctions(all_rings)
+    store = _ArcStore()
+    geometries = []
+    for props, polys in features:
+        arcs_geom = [[[store.ref(a) for a in _ring_arcs(r, junctions)] for r in poly] for poly in polys]
+        clean = {k: _plain(v) for k, v in props.items()}
+        if not arcs_geom:
+            geometries.append({"type": None, "properties": clean})
+        elif len(arcs_geom) == 1:
+            geometries.append({"type": "Polygon", "arcs": arcs_geom[0], "properties": clean})
+        else:
+            geometries.append({"type": "MultiPolygon", "arcs": arcs_geom, "properties": clean})
+
+    tol_q = simplify_tol / min(kx, ky) if simplify_tol > 0 else 0.0
+    arcs = [_delta(_simplify_arc(a, tol_q)) for a in store.arcs]
+    return {
+        "type": "Topology",
+        "transform": {"scale": [kx, ky], "translate": [float(minx), float(miny)]},
+        "objects": {name: {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": arcs,
+    }
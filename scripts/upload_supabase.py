@@ -10,10 +10,18 @@ supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 BUCKET = "inventa-assets"
 OUT_DIR = pathlib.Path("build")
 
-for file in OUT_DIR.glob("*.lite.geojson"):
+CONTENT_TYPES = {
+    ".lite.geojson": "application/geo+json",
+    ".topo.json": "application/json",   # TopoJSON (arcos compartidos), ver scripts/topology.py
+}
+
+for file in sorted(OUT_DIR.iterdir()):
+    content_type = next((ct for suf, ct in CONTENT_TYPES.items() if file.name.endswith(suf)), None)
+    if content_type is None:
+        continue
     with open(file, "rb") as f:
         path = f"data/{file.name}"
-        supabase.storage.from_(BUCKET).upload(path, f, {"content-type": "application/geo+json"})
+        supabase.storage.from_(BUCKET).upload(path, f, {"content-type": content_type})
         public_url = supabase.storage.from_(BUCKET).get_public_url(path)
         print("Subido:", file.name)
         print("URL:", public_url)
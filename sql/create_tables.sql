@@ -5,6 +5,7 @@ CREATE TABLE IF NOT EXISTS usuarios (
   is_active BOOLEAN DEFAULT TRUE,
   created_at TIMESTAMPTZ DEFAULT now()
 );
+CREATE INDEX IF NOT EXISTS idx_usuarios_email_lower ON usuarios (lower(email));
 
 CREATE TABLE IF NOT EXISTS centros_logisticos (
   id SERIAL PRIMARY KEY,
@@ -25,7 +26,14 @@ CREATE TABLE IF NOT EXISTS locales (
   rank INT,
   venta_por_dia NUMERIC(14,2),
   active BOOLEAN DEFAULT TRUE,
-  created_at TIMESTAMPTZ DEFAULT now()
+  created_at TIMESTAMPTZ DEFAULT now(),
+  geohash TEXT
+);
+
+CREATE TABLE IF NOT EXISTS versiones_datos (
+  company_slug TEXT PRIMARY KEY,
+  version INT NOT NULL DEFAULT 1,
+  updated_at TIMESTAMPTZ DEFAULT now()
 );
 
 CREATE TABLE IF NOT EXISTS rutas (
@@ -49,3 +57,93 @@ CREATE TABLE IF NOT EXISTS rutas_detalles (
 
 CREATE INDEX IF NOT EXISTS idx_locales_company ON locales(company_slug);
 CREATE INDEX IF NOT EXISTS idx_rutas_company_fecha ON rutas(company_slug, fecha);
+
+-- Bases existentes: columna geohash (luego: flask locales-geohash para completarla)
+ALTER TABLE locales ADD COLUMN IF NOT EXISTS geohash TEXT;
+CREATE INDEX IF NOT EXISTS idx_locales_company_geohash ON locales(company_slug, geohash);
+
+-- Listado paginado: texto de búsqueda normalizado (luego: flask locales-busqueda)
+ALTER TABLE locales ADD COLUMN IF NOT EXISTS busqueda TEXT;
+CREATE INDEX IF NOT EXISTS idx_locales_company_busqueda ON locales(company_slug, busqueda);
+CREATE INDEX IF NOT EXISTS idx_locales_company_name_id ON locales(company_slug, name, id);
+CREATE INDEX IF NOT EXISTS idx_locales_company_rank_id ON locales(company_slug, rank, id);
+CREATE INDEX IF NOT EXISTS idx_locales_company_venta_id ON locales(company_slug, venta_por_dia, id);
+-- Búsqueda por subcadena (LIKE '%texto%') con trigramas
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_locales_busqueda_trgm ON locales USING gin (busqueda gin_trgm_ops);
+
+-- Áreas administrativas (luego: flask locales-areas)
+ALTER TABLE locales ADD COLUMN IF NOT EXISTS dpto_cod TEXT;
+ALTER TABLE locales ADD COLUMN IF NOT EXISTS distrito_cod TEXT;
+ALTER TABLE locales ADD COLUMN IF NOT EXISTS barrio_cod TEXT;
+CREATE INDEX IF NOT EXISTS idx_locales_company_dpto ON locales(company_slug, dpto_cod);
+CREATE INDEX IF NOT EXISTS idx_locales_company_distrito ON locales(company_slug, distrito_cod);
+CREATE INDEX IF NOT EXISTS idx_locales_company_barrio ON locales(company_slug, barrio_cod);
+
+-- Territorios (particiones balanceadas de locales)
+CREATE TABLE IF NOT EXISTS territorios (
+  id SERIAL PRIMARY KEY,
+  company_slug TEXT NOT NULL,
+  numero INT NOT NULL,
+  lat DOUBLE PRECISION NOT NULL,
+  lon DOUBLE PRECISION NOT NULL,
+  criterio TEXT NOT NULL DEFAULT 'paradas',
+  capacidad DOUBLE PRECISION,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  CONSTRAINT uq_territorios_company_numero UNIQUE (company_slug, numero)
+);
+ALTER TABLE locales ADD COLUMN IF NOT EXISTS territorio INT;
+CREATE INDEX IF NOT EXISTS idx_locales_company_territorio ON locales(company_slug, territorio);
+
+-- Métricas cacheadas por ruta (km, paradas, venta); se recalculan si cambia la versión de datos
+ALTER TABLE rutas ADD COLUMN IF NOT EXISTS metricas_km DOUBLE PRECISION;
+ALTER TABLE rutas ADD COLUMN IF NOT EXISTS metricas_paradas INT;
+ALTER TABLE rutas ADD COLUMN IF NOT EXISTS metricas_venta NUMERIC(16,2);
+ALTER TABLE rutas ADD COLUMN IF NOT EXISTS metricas_version INT;
+
+-- Multi-tenant en un solo deploy: empresa del usuario. Los usuarios existentes quedan en la
+-- empresa del deploy ('tenant' = PROJECT_SLUG por defecto; ajustar si el deploy usa otro).
+-- Usuario de plataforma (empresa según el host) sólo con plataforma = TRUE
+ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS company_slug TEXT;
+UPDATE usuarios SET company_slug = 'tenant' WHERE company_slug IS NULL;
+ALTER TABLE usuarios ALTER COLUMN company_slug SET NOT NULL;
+ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS plataforma BOOLEAN NOT NULL DEFAULT FALSE;
+-- Índices compuestos que empiezan por company_slug (reemplazan a los de una sola columna)
+CREATE INDEX IF NOT EXISTS idx_locales_company_active_id ON locales(company_slug, active, id);
+DROP INDEX IF EXISTS idx_locales_company;
+DROP INDEX IF EXISTS ix_locales_company_slug;
+CREATE INDEX IF NOT EXISTS idx_rutas_company_fecha_turno ON rutas(company_slug, fecha, turno);
+DROP INDEX IF EXISTS idx_rutas_company_fecha;
+DROP INDEX IF EXISTS ix_rutas_company_slug;
+-- rutas_detalles: copia de la empresa de la ruta
+ALTER TABLE rutas_detalles ADD COLUMN IF NOT EXISTS company_slug TEXT;
+UPDATE rutas_detalles d SET company_slug = r.company_slug FROM rutas r
+ WHERE d.ruta_id = r.id AND d.company_slug IS NULL;
+ALTER TABLE rutas_detalles ALTER COLUMN company_slug SET NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_rutas_detalles_company_ruta ON rutas_detalles(company_slug, ruta_id, orden);
+CREATE INDEX IF NOT EXISTS idx_rutas_detalles_company_local ON rutas_detalles(company_slug, local_id);
+
+-- Edición incremental de rutas (PATCH /ruteo/rutas/<id>): versión para control optimista
+ALTER TABLE rutas ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 1;
+
+-- Trabajos en segundo plano (exportar, planificar semana): estado, progreso y resultado
+CREATE TABLE IF NOT EXISTS jobs (
+  id TEXT PRIMARY KEY,
+  company_slug TEXT NOT NULL,
+  tipo TEXT NOT NULL,
+  params JSONB NOT NULL DEFAULT '{}',
+  estado TEXT NOT NULL DEFAULT 'pendiente',
+  progreso DOUBLE PRECISION NOT NULL DEFAULT 0,
+  mensaje TEXT,
+  resultado JSONB,
+  archivo TEXT,
+  nombre_archivo TEXT,
+  mimetype TEXT,
+  creado_por INT REFERENCES usuarios(id),
+  created_at TIMESTAMPTZ DEFAULT now(),
+  started_at TIMESTAMPTZ,
+  finished_at TIMESTAMPTZ,
+  expires_at TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_company_estado ON jobs(company_slug, estado);
+CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs(expires_at);